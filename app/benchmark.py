@@ -0,0 +1,358 @@
+"""
+End-to-end benchmark of ingest, retrieval and chat, fully offline.
+
+The configured LLM and embeddings are replaced by the deterministic FakeLLMProvider and
+the feature-hashing HashEmbeddings of benchmark_providers, and synthetic PDF corpora are
+generated, so runs need neither an API key nor a model download and are comparable across
+langchain upgrades and vector store backends. Every (backend, corpus size) pair runs in a fresh subprocess with
+its own data directory, so peak RSS is measured per run.
+
+    cd app && python benchmark.py --backends FAISS CHROMA --corpus-pages 50 500 \\
+        --output benchmark_results.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+
+### Synthetic corpus ###
+
+_SYLLABLES = ["ka", "lo", "mi", "ne", "ru", "sa", "ti", "vo", "ze", "qua", "bri", "dor"]
+
+
+def vocabulary(size: int = 2000, seed: int = 0) -> List[str]:
+    """
+    :return: `size` distinct pseudo words
+    """
+    rng = random.Random(seed)
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(_SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+def synthetic_page(rng: random.Random, words: List[str], num_lines: int = 40) -> List[str]:
+    """
+    :return: text lines of one page, a numbered heading followed by sentences
+    """
+    lines = [f"{rng.randint(1, 9)}.{rng.randint(1, 9)} {rng.choice(words).capitalize()}"]
+    for _ in range(num_lines):
+        sentence = " ".join(rng.choice(words) for _ in range(rng.randint(6, 14)))
+        lines.append(f"{sentence.capitalize()}.")
+    return lines
+
+
+def synthetic_pdf(pages: List[List[str]]) -> bytes:
+    """
+    Write a minimal text PDF (Helvetica, one content stream per page) without any
+    PDF library, lines must not contain parentheses or backslashes
+    :param pages: text lines per page
+    :return: PDF file content
+    """
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        "<< /Type /Pages /Kids [{}] /Count {} >>".format(
+            " ".join(f"{3 + 2 * i} 0 R" for i in range(len(pages))), len(pages)
+        ),
+    ]
+    font = 3 + 2 * len(pages)
+    for i, lines in enumerate(pages):
+        text = " ".join(f"({line}) Tj T*" for line in lines)
+        stream = f"BT /F1 9 Tf 11 TL 40 760 Td {text} ET"
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 {font} 0 R >> >> /Contents {4 + 2 * i} 0 R >>"
+        )
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+    objects.append("<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    content, offsets = b"%PDF-1.4\n", []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(content))
+        content += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(content)
+    content += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    content += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode("latin-1")
+    content += (
+        f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\n"
+        f"startxref\n{xref}\n%%EOF\n"
+    ).encode("latin-1")
+    return content
+
+
+def synthetic_corpus(
+    num_pages: int, pages_per_doc: int, seed: int = 0
+) -> List[bytes]:
+    """
+    :return: PDFs holding `num_pages` pages in total
+    """
+    rng, words = random.Random(seed), vocabulary(seed=seed)
+    sizes = [pages_per_doc] * (num_pages // pages_per_doc)
+    if num_pages % pages_per_doc:
+        sizes.append(num_pages % pages_per_doc)
+    return [
+        synthetic_pdf([synthetic_page(rng, words) for _ in range(size)])
+        for size in sizes
+    ]
+
+
+def synthetic_queries(num_queries: int, seed: int = 1) -> List[str]:
+    """
+    :return: distinct queries over the corpus vocabulary, so no query is served from cache
+    """
+    rng, words = random.Random(seed), vocabulary()
+    queries = set()
+    while len(queries) < num_queries:
+        queries.add(f"What is {' '.join(rng.sample(words, 4))}?")
+    return sorted(queries)
+
+
+### Measurements ###
+
+
+def latency_summary(seconds: List[float]) -> Dict[str, float]:
+    """
+    :return: mean / p50 / p95 / p99 / max in milliseconds
+    """
+    if not seconds:
+        return {}
+    ms = np.asarray(seconds) * 1000
+    return {
+        "mean_ms": round(float(ms.mean()), 3),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "max_ms": round(float(ms.max()), 3),
+    }
+
+
+def peak_rss_mb() -> Dict[str, float]:
+    """
+    Children only count once reaped, shut the process pools down with wait=True first.
+    :return: peak resident set size of this process and of its largest child, in MiB
+    """
+    # ru_maxrss is reported in KiB on Linux and in bytes on macOS
+    unit = 1 if sys.platform == "darwin" else 1024
+    return {
+        "peak_rss_mb": round(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * unit / 2**20, 1
+        ),
+        "peak_child_rss_mb": round(
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * unit / 2**20, 1
+        ),
+    }
+
+
+def run_benchmark(
+    backend: str, num_pages: int, pages_per_doc: int, num_queries: int
+) -> Dict[str, Any]:
+    """
+    Benchmark one backend on one corpus size, inside a run subprocess whose environment
+    already points every data path to a fresh directory
+    :return: import / warm-up time, ingest throughput, retrieval / chat latency and peak RSS
+    """
+    from fastapi.testclient import TestClient
+
+    from benchmark_providers import OfflineEmbeddings, OfflineLLMModels
+    from settings import settings
+    from utils.enums import Rerankers, VectorStores
+
+    settings.update(
+        LLM=OfflineLLMModels.FAKE,
+        EMBEDDINGS=OfflineEmbeddings.HASH,
+        VECTOR_STORE=VectorStores[backend],
+        RERANKER=Rerankers.NONE,
+    )
+    import main
+
+    corpus = synthetic_corpus(num_pages, pages_per_doc)
+    queries = synthetic_queries(num_queries)
+    result: Dict[str, Any] = {
+        "backend": backend,
+        "num_pages": num_pages,
+        "num_docs": len(corpus),
+    }
+
+    with TestClient(main.route) as client:
+        # requests wait for the warm-up, keep it out of the ingest timing
+        while (ready := client.get("/ready")).status_code != 200:
+            if ready.json()["status"] == "failed":
+                raise RuntimeError(f"Warm-up failed: {ready.json()['error']}")
+            time.sleep(0.05)
+        result["startup"] = {
+            "import_seconds": ready.json()["import_seconds"],
+            "warmup_seconds": ready.json()["warmup_seconds"],
+        }
+
+        num_chunks, start = 0, time.perf_counter()
+        for number, pdf in enumerate(corpus):
+            response = client.post(
+                "/upload-pdf",
+                files={"file": (f"doc_{number:05d}.pdf", pdf, "application/pdf")},
+                data={"domain": "benchmark"},
+            )
+            response.raise_for_status()
+            num_chunks += response.json()["num_added"]
+        ingest_seconds = time.perf_counter() - start
+        result["ingest"] = {
+            "seconds": round(ingest_seconds, 3),
+            "num_chunks": num_chunks,
+            "pages_per_second": round(num_pages / ingest_seconds, 2),
+            "chunks_per_second": round(num_chunks / ingest_seconds, 2),
+        }
+
+        async def retrieve_all() -> List[float]:
+            retriever, latencies = main.registry.get_retriever(), []
+            for query in queries:
+                start = time.perf_counter()
+                await retriever.aretrieve(query, rephrase=False)
+                latencies.append(time.perf_counter() - start)
+            return latencies
+
+        result["retrieval"] = latency_summary(asyncio.run(retrieve_all()))
+
+        for rephrase in (False, True):
+            latencies = []
+            for query in queries:
+                start = time.perf_counter()
+                response = client.post(
+                    "/chat-with-pdf:latest",
+                    data={"query": f"{query} {rephrase}", "rephrase": str(rephrase).lower()},
+                )
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - start)
+            result["chat_rephrase" if rephrase else "chat"] = latency_summary(latencies)
+
+        # reap the pool processes, so their peak RSS is part of RUSAGE_CHILDREN
+        main.workers.shutdown(wait=True)
+        main.chat.loader.shutdown()
+
+    result.update(peak_rss_mb())
+    return result
+
+
+def run_in_subprocess(
+    backend: str, num_pages: int, pages_per_doc: int, num_queries: int
+) -> Dict[str, Any]:
+    """
+    :return: result of run_benchmark in a fresh interpreter and data directory,
+        or the error of a failed run
+    """
+    workdir = tempfile.mkdtemp(prefix="chatpdf-benchmark-")
+    result_path = os.path.join(workdir, "result.json")
+    env = dict(
+        os.environ,
+        VECTOR_DB_PATH=os.path.join(workdir, "vector_store"),
+        SQLITE_DB_URL=f"sqlite:///{os.path.join(workdir, 'sqlite', 'record_manager.sql')}",
+        # every run embeds from scratch and answers every query uncached
+        EMBEDDING_CACHE_DIR="",
+        ANSWER_CACHE_ENABLED="false",
+    )
+    os.makedirs(os.path.join(workdir, "sqlite"))
+    command = [
+        sys.executable,
+        os.path.abspath(__file__),
+        "--run",
+        json.dumps([backend, num_pages, pages_per_doc, num_queries]),
+        "--output",
+        result_path,
+    ]
+    try:
+        completed = subprocess.run(
+            command,
+            cwd=workdir,
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+        if completed.returncode != 0:
+            return {
+                "backend": backend,
+                "num_pages": num_pages,
+                "error": completed.stderr.strip().splitlines()[-1:],
+            }
+        with open(result_path) as result_file:
+            return json.load(result_file)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def environment() -> Dict[str, Any]:
+    """
+    :return: versions identifying the run, for comparing result files
+    """
+    from importlib.metadata import PackageNotFoundError, version
+
+    packages = {}
+    for package in ("langchain", "langchain-community", "faiss-cpu", "chromadb", "pypdf"):
+        try:
+            packages[package] = version(package)
+        except PackageNotFoundError:
+            packages[package] = None
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+        ).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "git_commit": commit,
+        "packages": packages,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark")
+    parser.add_argument("--backends", nargs="+", default=["FAISS", "CHROMA"])
+    parser.add_argument("--corpus-pages", type=int, nargs="+", default=[50, 500])
+    parser.add_argument("--pages-per-doc", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--run", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        with open(args.output, "w") as output:
+            json.dump(run_benchmark(*json.loads(args.run)), output)
+        sys.exit(0)
+
+    results = []
+    for backend in args.backends:
+        for num_pages in args.corpus_pages:
+            print(f"Benchmarking {backend} on {num_pages} pages", file=sys.stderr)
+            results.append(
+                run_in_subprocess(backend, num_pages, args.pages_per_doc, args.queries)
+            )
+            print(json.dumps(results[-1]), file=sys.stderr)
+
+    with open(args.output, "w") as output:
+        json.dump(
+            {
+                "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "environment": environment(),
+                "config": {k: v for k, v in vars(args).items() if k != "run"},
+                "results": results,
+            },
+            output,
+            indent=2,
+        )
+    print(f"Results written to {args.output}", file=sys.stderr)
@@ -0,0 +1,122 @@
+"""
+Offline providers of the benchmark: a deterministic chat model and feature-hashing
+embeddings, so benchmark runs need neither an API key nor a model download.
+They are selected through their own provider enums and are never part of the
+application's provider choices.
+"""
+
+import hashlib
+import json
+import re
+from typing import Any, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from services.embeddings import BaseEmbeddings
+from services.llms import BaseLLMProvider
+from utils.enums import ProviderEnum
+
+
+class DeterministicChatModel(BaseChatModel):
+    """
+    Offline chat model: answers the response prompt with a valid ChatResponse JSON
+    citing the first document and every other prompt (query rephrasing) with lines
+    derived from a hash of the prompt, without any network call.
+    """
+
+    num_lines: int = 5
+
+    @property
+    def _llm_type(self) -> str:
+        return "deterministic"
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        prompt = "\n".join(str(message.content) for message in messages)
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        if "doc_ids" in prompt:
+            text = json.dumps(
+                {"response": f"Deterministic answer {digest[:12]}", "doc_ids": [1]}
+            )
+        else:
+            words = prompt.split()[-8:]
+            text = "\n".join(
+                " ".join(words[i:] + words[:i] + [digest[i : i + 6]])
+                for i in range(self.num_lines)
+            )
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+
+class FakeLLMProvider(BaseLLMProvider):
+    provider_name = "Fake"
+    model_name = "deterministic"
+
+    @classmethod
+    def get_llm(cls) -> DeterministicChatModel:
+        """
+        This method returns the offline DeterministicChatModel.
+        """
+        return DeterministicChatModel()
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Offline feature-hashing embeddings: every word is hashed to a signed bucket of a
+    fixed-size vector, so texts sharing words are similar. Deterministic and fast,
+    no model download.
+    """
+
+    def __init__(self, size: int = 384):
+        """
+        :param size: vector dimension
+        """
+        self.size = size
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.size, dtype=np.float32)
+        for word in re.findall(r"\w+", text.lower()):
+            bucket = int.from_bytes(
+                hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest(), "little"
+            )
+            vector[bucket % self.size] += 1.0 if bucket >> 63 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+class HashEmbeddings(BaseEmbeddings):
+    @classmethod
+    def get_embeddings(cls) -> Embeddings:
+        """
+        This method returns the offline HashingEmbeddings behind the embedding cache
+        """
+        embeddings = HashingEmbeddings()
+        return cls.with_cache(
+            embeddings, model_name=f"hashing:{embeddings.size}", query_as_document=True
+        )
+
+
+class OfflineLLMModels(ProviderEnum):
+    """Offline LLM Model Providers of the benchmark"""
+
+    FAKE = "benchmark_providers:FakeLLMProvider"
+
+
+class OfflineEmbeddings(ProviderEnum):
+    """Offline Embedding Model Providers of the benchmark"""
+
+    HASH = "benchmark_providers:HashEmbeddings"
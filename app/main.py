@@ -1,31 +1,209 @@
+import time
+
+# import time of the application module, reported by /ready and /metrics
+_import_start = time.perf_counter()
+
+import asyncio
+import json
 import os
-import pprint
-from typing import List, Optional, Type
-from fastapi import FastAPI, File, Form, HTTPException, UploadFile
-from langchain.chains import LLMChain, RetrievalQA
-from langchain.indexes import index
-from langchain.retrievers.multi_query import MultiQueryRetriever
-from langchain.schema import Document
-from langchain_core.messages import BaseMessage
+import uuid
+import zipfile
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List, Optional, Tuple
+from fastapi import FastAPI, File, Form, HTTPException, Request, UploadFile
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from langchain_core.output_parsers import PydanticOutputParser
 from langchain_core.prompts import PromptTemplate
 
 
 from utils.prompts import response_prompt_template
-from services.llms import GeminiLLMProvider
 from settings import settings
-from utils.helpers import ChatService, convert_docs_to_text, parse_to_pydantic
+from utils.helpers import (
+    ChatService,
+    build_context,
+    convert_docs_to_text,
+    extract_partial_response,
+    parse_to_pydantic,
+    resolve_citations,
+)
+from utils.registry import ProviderRegistry
+from utils.bulk import BulkIngestor
+from utils.jobs import IngestJobRunner, IngestJobStore, JobStatus
+from utils.variables import (
+    ANSWER_CACHE_ENABLED,
+    BULK_INGEST_BATCH_SIZE,
+    BULK_INGEST_CONCURRENCY,
+    BULK_MAX_FILES,
+    BULK_MAX_UNCOMPRESSED_BYTES,
+    BULK_SPOOL_DIR,
+    INGEST_JOB_WORKERS,
+    INGEST_PROCESS_WORKERS,
+    IO_THREAD_WORKERS,
+    JOB_MAX_ATTEMPTS,
+    JOB_STALE_SECONDS,
+    JOBS_DB_PATH,
+    JOBS_SPOOL_DIR,
+    MAX_PENDING_REQUESTS,
+    MAX_QUEUED_JOBS,
+    REPHRASE_QUERIES_DEFAULT,
+    REQUEST_TRACING,
+    TRACE_ID_HEADER,
+    STREAMING_INGEST,
+    UPLOAD_SPOOL_DIR,
+)
+from utils.workers import QueueFullError, WorkerPool
+
+from utils.loggers import logger, trace_id
+from utils.metrics import REQUEST_SECONDS, STARTUP_SECONDS, metrics, stage
+from utils.models import (
+    BulkFileResult,
+    BulkUploadResponse,
+    ChatResponse,
+    IngestJobResponse,
+    PDFUploadResponse,
+    RetrievalFilter,
+    ShardDropResponse,
+    ShardInfo,
+)
 
-from utils.loggers import logger
-from utils.models import ChatResponse, PDFUploadResponse
+workers = WorkerPool(
+    process_workers=INGEST_PROCESS_WORKERS,
+    thread_workers=IO_THREAD_WORKERS,
+    max_pending=MAX_PENDING_REQUESTS,
+)
+registry = ProviderRegistry(settings=settings, run_io=workers.run_io)
 
 chat = ChatService(
     llm=settings.get("LLM"),
     embeddings=settings.get("EMBEDDINGS"),
     vectorstore=settings.get("VECTOR_STORE"),
+    registry=registry,
+    loader=settings.get("LOADER"),
+    chunker=settings.get("CHUNKER"),
 )
 
-route = FastAPI()
+bulk_ingestor = BulkIngestor(
+    chat=chat,
+    workers=workers,
+    spool_dir=BULK_SPOOL_DIR,
+    concurrency=BULK_INGEST_CONCURRENCY,
+    batch_size=BULK_INGEST_BATCH_SIZE,
+    max_files=BULK_MAX_FILES,
+    max_uncompressed_bytes=BULK_MAX_UNCOMPRESSED_BYTES,
+)
+
+job_store = IngestJobStore(db_path=JOBS_DB_PATH)
+job_runner = IngestJobRunner(
+    store=job_store,
+    chat=chat,
+    workers=workers,
+    concurrency=INGEST_JOB_WORKERS,
+    stale_after=JOB_STALE_SECONDS,
+    streaming=STREAMING_INGEST,
+    max_attempts=JOB_MAX_ATTEMPTS,
+)
+
+IMPORT_SECONDS = time.perf_counter() - _import_start
+STARTUP_SECONDS.set(IMPORT_SECONDS, phase="import")
+logger.info(f"Application imported in {IMPORT_SECONDS:.2f}s")
+
+
+# probes answered while the worker warms up, every other request waits for the warm-up
+PROBE_PATHS = {"/", "/ready", "/metrics"}
+
+startup_report = {"status": "warming_up", "error": None, "warmup_seconds": {}}
+_warm_up_task: Optional[asyncio.Task] = None
+
+
+async def _warm_up() -> None:
+    """Warm-up phase: load the providers and run a dummy embedding, start the ingest
+    worker processes, then report ready and start the job runner."""
+    start = time.perf_counter()
+    try:
+        await workers.run_io(registry.startup)
+        pool_start = time.perf_counter()
+        await workers.warm_up(
+            ChatService.__module__, chat.loader.__module__, chat.chunker.__module__
+        )
+        pool_seconds = time.perf_counter() - pool_start
+    except Exception as e:
+        logger.error(f"Warm-up failed: {str(e)}")
+        startup_report.update(status="failed", error=str(e))
+    else:
+        STARTUP_SECONDS.set(pool_seconds, phase="process_pool")
+        phases = {**registry.warmup_seconds, "process_pool": pool_seconds}
+        startup_report.update(
+            status="ready",
+            warmup_seconds={phase: round(seconds, 3) for phase, seconds in phases.items()},
+        )
+        logger.info(f"Worker ready, warmed up in {time.perf_counter() - start:.2f}s")
+    STARTUP_SECONDS.set(time.perf_counter() - start, phase="warmup")
+    # queued jobs wait for the warm-up like requests do
+    await job_runner.start()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Warm up the shared providers in the background, so the worker is live at once and
+    reports ready on /ready when warmed up; release them on shutdown."""
+    global _warm_up_task
+    workers.startup()
+    _warm_up_task = asyncio.create_task(_warm_up())
+    yield
+    _warm_up_task.cancel()
+    await asyncio.gather(_warm_up_task, return_exceptions=True)
+    await job_runner.stop()
+    workers.shutdown()
+    chat.loader.shutdown()
+    registry.shutdown()
+
+
+route = FastAPI(lifespan=lifespan)
+metrics.add_collector(registry.cache_metrics)
+
+
+@route.middleware("http")
+async def wait_for_warm_up(request: Request, call_next):
+    """Hold requests until the providers are warmed up, a failed warm-up lets them through
+    to load the providers on first use."""
+    if request.url.path not in PROBE_PATHS and _warm_up_task is not None:
+        await asyncio.shield(_warm_up_task)
+    return await call_next(request)
+
+
+@route.middleware("http")
+async def observe_request(request: Request, call_next):
+    """Time every request by route and tag its logs with a trace id,
+    taken from the trace id header when the caller sends one."""
+    token = None
+    if REQUEST_TRACING:
+        token = trace_id.set(request.headers.get(TRACE_ID_HEADER) or uuid.uuid4().hex)
+    start, status = time.perf_counter(), 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        if token is not None:
+            response.headers[TRACE_ID_HEADER] = trace_id.get()
+        return response
+    finally:
+        matched = request.scope.get("route")
+        REQUEST_SECONDS.observe(
+            time.perf_counter() - start,
+            route=matched.path if matched else "unmatched",
+            method=request.method,
+            status=status,
+        )
+        if token is not None:
+            trace_id.reset(token)
+
+
+@route.exception_handler(QueueFullError)
+async def queue_full_handler(request: Request, exc: QueueFullError):
+    """Backpressure: reject work instead of queueing it when the worker pool is saturated."""
+    logger.warning(str(exc))
+    return JSONResponse(
+        status_code=429, content={"detail": str(exc)}, headers={"Retry-After": "1"}
+    )
 
 
 @route.get("/")
@@ -35,129 +213,477 @@ async def root():
     return {"status": "API Running"}
 
 
-@route.post("/upload-pdf", response_model=PDFUploadResponse)
-async def upload_pdf(file: UploadFile = File(...), domain: Optional[str] = Form(...)):
-    """Upload and process a PDF document with an additional 'domain' field."""
-    logger.info(f"Upload PDF Endpoint is starting for domain: {domain}")
-    temp_file_path = await chat.handle_temp_dir(file)
+@route.get("/ready")
+async def ready():
+    """Readiness check: 200 once the warm-up phase has finished, 503 before or when it
+    failed. Reports the import time and the time of every warm-up phase."""
+    status_code = 200 if startup_report["status"] == "ready" else 503
+    return JSONResponse(
+        status_code=status_code,
+        content={**startup_report, "import_seconds": round(IMPORT_SECONDS, 3)},
+    )
+
+
+@route.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Stage latency histograms, request latency, chunk / token / cache counters of this
+    worker in the Prometheus text format."""
+    return PlainTextResponse(
+        metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+@route.get("/cache/stats")
+async def cache_stats():
+    """Hit / miss counters of the embedding, query and retrieval caches of this worker."""
+    return registry.stats()
+
+
+@route.get("/admin/shards", response_model=List[ShardInfo])
+async def list_shards():
+    """List the vector store shards with their vector counts."""
+    return await _admin_shards(lambda: chat.get_sharded_store().list_shards())
+
+
+@route.post("/admin/shards/{name}", response_model=ShardInfo, status_code=201)
+async def create_shard(name: str):
+    """Create an empty vector store shard, e.g. for a domain about to be ingested."""
+
+    def create() -> dict:
+        store = chat.get_sharded_store()
+        return store.shard_info(store.create_shard(name))
+
+    return await _admin_shards(create)
+
+
+@route.post("/admin/shards/{name}/compact", response_model=ShardInfo)
+async def compact_shard(name: str):
+    """Compact one vector store shard without touching the others."""
+
+    def compact() -> dict:
+        chat.compact_shard(name)
+        return chat.get_sharded_store().shard_info(name)
+
+    return await _admin_shards(compact)
+
+
+@route.delete("/admin/shards/{name}", response_model=ShardDropResponse)
+async def drop_shard(name: str):
+    """Drop one vector store shard and its chunks without touching the others."""
+    num_deleted = await _admin_shards(lambda: chat.drop_shard(name))
+    return ShardDropResponse(name=name, num_deleted=num_deleted)
 
+
+async def _admin_shards(operation):
     try:
-        docs = chat.process_pdfs(doc_path=temp_file_path)
+        return await workers.run_io(operation)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=f"Shard {e.args[0]} not found")
 
-        # Annotate documents with additional metadata -> domain , etc..
-        for doc in docs:
-            doc.metadata["domain"] = domain  # Store domain in metadata
 
-        print(docs[-1])
+@route.post("/upload-pdf", response_model=PDFUploadResponse)
+async def upload_pdf(file: UploadFile = File(...), domain: Optional[str] = Form(...)):
+    """Upload and process a PDF document with an additional 'domain' field."""
+    logger.info(f"Upload PDF Endpoint is starting for domain: {domain}")
+    async with workers.admit():
+        return await _ingest_pdf(file=file, domain=domain)
 
-        vector_store = chat.get_vector_store()
 
-        idx = index(
-            docs_source=docs,
-            record_manager=chat.instantiate_record_manager(),
-            vector_store=vector_store.get_vdb(),
-            cleanup=None,
-            source_id_key="source",
-        )
+async def _ingest_pdf(file: UploadFile, domain: Optional[str]) -> PDFUploadResponse:
+    """Load and chunk page ranges in the process pool, streaming their chunks into the
+    index in the thread pool, or load and chunk the whole document first when streaming
+    ingest is disabled."""
+    spool_path, sha256 = await chat.spool_upload(file, spool_dir=UPLOAD_SPOOL_DIR)
+    source = chat.upload_source(file.filename, domain)
 
-        is_duplicate, response = chat.process_duplicate_doc(idx, docs)
-        if not is_duplicate:
-            vector_store.add_docs_to_vector_db(docs=docs)
+    try:
+        # exact re-upload: reject before parsing, its chunks are all in the index already
+        known = await workers.run_io(chat.find_upload, sha256, source, domain)
+        if known:
+            logger.info(f"Skipped re-upload of {source} for domain: {domain}")
+            return PDFUploadResponse(
+                message="Document already uploaded", num_skipped=known["num_chunks"]
+            )
+
+        if STREAMING_INGEST:
+            idx = await chat.index_pdf(
+                workers,
+                doc_path=spool_path,
+                domain=domain,
+                source=source,
+                uploads={source: sha256},
+            )
+        else:
+            # load and chunk run together in a worker process
+            with stage("load_chunk"):
+                docs = await workers.run_cpu(
+                    ChatService.process_pdfs,
+                    doc_path=spool_path,
+                    source=source,
+                    loader=chat.loader,
+                    chunker=chat.chunker,
+                )
+
+            # Annotate documents with additional metadata -> domain , etc..
+            for doc in docs:
+                doc.metadata["domain"] = domain  # Store domain in metadata
+
+            idx = await workers.run_io(
+                chat.index_docs, docs=docs, uploads={source: sha256}
+            )
+        _, response = chat.process_duplicate_doc(idx)
 
         logger.info(f"Paper Uploaded and Processed successfully for domain: {domain}")
-        return PDFUploadResponse(message=response)
+        return PDFUploadResponse(
+            message=response,
+            num_added=idx["num_added"],
+            num_updated=idx["num_updated"],
+            num_skipped=idx["num_skipped"],
+            num_deleted=idx["num_deleted"],
+        )
 
     except Exception as e:
         logger.error(f"Error in upload_pdf: {str(e)}")
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
 
     finally:
-        if os.path.exists(temp_file_path):
-            os.remove(temp_file_path)
+        if os.path.exists(spool_path):
+            os.remove(spool_path)
             logger.info("Cleaned up temporary files")
 
 
+@route.post("/upload-pdfs", response_model=BulkUploadResponse)
+async def upload_pdfs(
+    files: List[UploadFile] = File(...),
+    domain: Optional[str] = Form(None),
+    domains: Optional[str] = Form(None),
+):
+    """Upload many PDFs and / or ZIP archives of PDFs in one request.
+    :param files: PDF files or ZIP archives of PDF files
+    :param domain: domain of every file not listed in `domains`
+    :param domains: optional JSON object, file name or ZIP member path -> domain
+    :return: index counts of the whole batch and the result of every file
+    """
+    logger.info(f"Bulk Upload Endpoint is starting for {len(files)} uploads")
+    try:
+        domain_map = json.loads(domains) if domains else {}
+        if not isinstance(domain_map, dict):
+            raise ValueError("domains must be a JSON object")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid domains: {str(e)}")
+
+    async with workers.admit():
+        try:
+            bulk_files = await bulk_ingestor.spool(
+                files, domains=domain_map, default_domain=domain
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        except zipfile.BadZipFile as e:
+            raise HTTPException(status_code=400, detail=f"Invalid ZIP archive: {str(e)}")
+
+        try:
+            idx = await bulk_ingestor.ingest(bulk_files)
+        except Exception as e:
+            logger.error(f"Error in upload_pdfs: {str(e)}")
+            raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
+        finally:
+            bulk_ingestor.cleanup(bulk_files)
+            logger.info("Cleaned up spooled bulk upload files")
+
+    num_indexed = sum(bulk_file.status == "indexed" for bulk_file in bulk_files)
+    logger.info(f"Bulk upload indexed {num_indexed} of {len(bulk_files)} PDFs")
+    return BulkUploadResponse(
+        message=f"{num_indexed} of {len(bulk_files)} PDFs processed",
+        num_files=len(bulk_files),
+        num_added=idx["num_added"],
+        num_updated=idx["num_updated"],
+        num_skipped=idx["num_skipped"],
+        num_deleted=idx["num_deleted"],
+        files=[
+            BulkFileResult(
+                filename=bulk_file.filename,
+                domain=bulk_file.domain,
+                sha256=bulk_file.sha256,
+                status=bulk_file.status,
+                num_chunks=bulk_file.num_chunks,
+                error=bulk_file.error,
+            )
+            for bulk_file in bulk_files
+        ],
+    )
+
+
+@route.post("/jobs/upload-pdf", response_model=IngestJobResponse, status_code=202)
+async def upload_pdf_job(
+    file: UploadFile = File(...), domain: Optional[str] = Form(...)
+):
+    """Spool a PDF and queue it for background ingestion, returning the job immediately."""
+    logger.info(f"Upload PDF Job Endpoint is starting for domain: {domain}")
+    # the job table is SQLite, every access runs in the thread pool
+    if await workers.run_io(job_store.count, JobStatus.QUEUED) >= MAX_QUEUED_JOBS:
+        raise QueueFullError(f"Ingest queue is full: {MAX_QUEUED_JOBS} jobs waiting")
+
+    spool_path, _ = await chat.spool_upload(file, spool_dir=JOBS_SPOOL_DIR)
+    job_id = await workers.run_io(
+        job_store.enqueue, file_path=spool_path, filename=file.filename, domain=domain
+    )
+    logger.info(f"Queued ingest job {job_id} for {file.filename}")
+    return _job_response(await workers.run_io(job_store.get, job_id))
+
+
+@route.get("/jobs/{job_id}", response_model=IngestJobResponse)
+async def get_job(job_id: str):
+    """Report stage, progress and elapsed time of a background ingestion job."""
+    job = await workers.run_io(job_store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return _job_response(job)
+
+
+def _job_response(job: dict) -> IngestJobResponse:
+    started_at = job["started_at"] or job["created_at"]
+    finished_at = job["finished_at"] or time.time()
+    return IngestJobResponse(
+        job_id=job["id"],
+        status=job["status"],
+        stage=job["stage"],
+        filename=job["filename"],
+        domain=job["domain"],
+        pages_processed=job["pages_processed"],
+        chunks_processed=job["chunks_processed"],
+        attempts=job["attempts"],
+        elapsed_seconds=round(finished_at - started_at, 3),
+        error=job["error"],
+        result=job["result"],
+    )
+
+
 @route.post("/chat-with-pdf:latest")
-async def chat_with_pdf_latest(query: str = Form(...)):
+async def chat_with_pdf_latest(
+    query: str = Form(...),
+    rephrase: bool = Form(REPHRASE_QUERIES_DEFAULT),
+    domain: Optional[str] = Form(None),
+    source: Optional[str] = Form(None),
+    page_start: Optional[int] = Form(None),
+    page_end: Optional[int] = Form(None),
+):
     """Updated Endpoint to Retrieve Relevant Documents and Process User Query
     version_fix -> Retrieve Unique Document Citation from LLM
     :param query:
+    :param rephrase: retrieve with LLM query rephrasings, disable for lower latency
+    :param domain, source, page_start, page_end: optional document / page specific filters
     :return: LLM Response
     """
     logger.info("Chat with PDF latest endpoint starting")
-    try:
-        llm = GeminiLLMProvider.get_llm()
-        vector_store = chat.get_vector_store()
+    filters = RetrievalFilter(
+        domain=domain, source=source, page_start=page_start, page_end=page_end
+    )
+    async with workers.admit():
+        return await _answer_query(query=query, rephrase=rephrase, filters=filters)
+
+
+def _use_answer_cache(filters: RetrievalFilter) -> bool:
+    # cached answers are not scoped by filters, so filtered queries bypass the cache
+    return ANSWER_CACHE_ENABLED and filters.is_empty()
+
+
+async def _lookup_cached_answer(
+    query: str, filters: RetrievalFilter
+) -> Tuple[Optional[List[float]], Optional[dict]]:
+    """Embed the query and look it up in the semantic answer cache."""
+    if not _use_answer_cache(filters):
+        return None, None
+    query_embedding = await workers.run_io(registry.get_embeddings().embed_query, query)
+    with stage("answer_cache"):
+        cached_answer = await workers.run_io(
+            registry.answer_cache.lookup, query_embedding
+        )
+    return query_embedding, cached_answer
+
+
+async def _cache_answer(
+    query: str,
+    query_embedding: Optional[List[float]],
+    answer: dict,
+    filters: RetrievalFilter,
+) -> None:
+    if _use_answer_cache(filters):
+        await workers.run_io(
+            registry.answer_cache.put,
+            query=query,
+            embedding=query_embedding,
+            answer=answer,
+            sources=[citation["source"] for citation in answer["citations"]],
+        )
 
-        retrieved_docs = MultiQueryRetriever.from_llm(
-            llm=llm, retriever=vector_store.get_vdb_as_retriever()
-        ).get_relevant_documents(query)
 
-        parsed_docs = {
-            i+1 : {"content": doc.page_content, "metadata": doc.metadata}
-            for i,doc in enumerate(retrieved_docs)
-        }
-        logger.debug("**** PARSED DOCUMENTS ********* \n\n")
-        logger.debug(parsed_docs)
+async def _prepare_prompt(
+    query: str,
+    rephrase: bool,
+    filters: RetrievalFilter,
+    query_embedding: Optional[List[float]] = None,
+) -> Tuple[dict, dict]:
+    """Retrieve documents and build the response prompt inputs.
+    :param query_embedding: query vector of the answer cache lookup, reused for retrieval
+    :return: (parsed documents by doc id, prompt inputs)
+    """
+    retrieved_docs = await registry.get_retriever().aretrieve(
+        query, rephrase=rephrase, filters=filters, query_embedding=query_embedding
+    )
+    with stage("rerank"):
+        reranked = await workers.run_io(
+            registry.get_reranker().rerank, query, retrieved_docs
+        )
+    with stage("prompt"):
+        parsed_docs, context = build_context([doc for doc, _ in reranked])
+    logger.debug("**** PARSED DOCUMENTS ********* \n\n")
+    logger.debug(parsed_docs)
+    logger.debug("**** PROMPT CONTEXT ********* \n\n")
+    logger.debug(context)
+
+    prompt_inputs = {
+        "query": query,
+        "documents": context,
+        "parser_information": PydanticOutputParser(
+            pydantic_object=ChatResponse
+        ).get_format_instructions(),
+    }
+    return parsed_docs, prompt_inputs
 
-        input_docs = {
-            doc_id: data["content"]
-            for doc_id, data in parsed_docs.items()
-        }
-        logger.debug("**** INPUT DOCUMENTS ********* \n\n")
-        logger.debug(input_docs)
 
+async def _answer_query(
+    query: str, rephrase: bool = True, filters: Optional[RetrievalFilter] = None
+) -> dict:
+    """Serve semantically cached answers, otherwise retrieve with native async LLM calls
+    and generate the cited answer."""
+    filters = filters or RetrievalFilter()
+    try:
+        query_embedding, cached_answer = await _lookup_cached_answer(query, filters)
+        if cached_answer is not None:
+            return cached_answer
+
+        parsed_docs, prompt_inputs = await _prepare_prompt(
+            query, rephrase, filters, query_embedding
+        )
 
         prompt = PromptTemplate(
             template=response_prompt_template,
             input_variables=["query", "documents", "parser_information"],
         )
-        chain = LLMChain(
-            llm=llm,
-            prompt=prompt,
-            output_parser=PydanticOutputParser(pydantic_object=ChatResponse),
-        )
-
-        response = chain.run(
-            {
-                "query": query,
-                "documents": str(input_docs),
-                "parser_information": PydanticOutputParser(
-            pydantic_object=ChatResponse
-        ).get_format_instructions(),
-            }
-        )
-        chat_response = ChatResponse.model_validate(response)
+        with stage("generate"):
+            response = await registry.get_llm().ainvoke(prompt.format(**prompt_inputs))
+        with stage("parse"):
+            chat_response = PydanticOutputParser(pydantic_object=ChatResponse).parse(
+                response.content
+            )
         logger.info("**** CHAT RESPONSE ********* \n\n")
         logger.info(chat_response.model_dump_json())
 
-        citations = {}
-
-        for doc_id in chat_response.doc_ids:
-            if doc_id not in parsed_docs:
-                raise ValueError("Invalid Response of Unique ID")
-
-            parsed_doc = parsed_docs[doc_id]
-            source = parsed_doc["metadata"]["source"]
-            domain = parsed_doc["metadata"]["domain"]
-
-            if source not in citations:
-                citations[source] = domain
-
-        parsed_citation = [
-            {"source": citation, "domain": citations[citation]}
-            for citation in citations
-        ]
-        return {
+        answer = {
             "response": chat_response.response,
-            "citations": parsed_citation
+            "citations": resolve_citations(chat_response, parsed_docs),
         }
+        await _cache_answer(query, query_embedding, answer, filters)
+        return answer
 
     except Exception as e:
         logger.error(f"Error in chat_with_pdf_latest: {str(e)}")
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
 
 
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@route.post("/chat-with-pdf:stream")
+async def chat_with_pdf_stream(
+    query: str = Form(...),
+    rephrase: bool = Form(REPHRASE_QUERIES_DEFAULT),
+    domain: Optional[str] = Form(None),
+    source: Optional[str] = Form(None),
+    page_start: Optional[int] = Form(None),
+    page_end: Optional[int] = Form(None),
+):
+    """Streaming variant of chat-with-pdf:latest over server-sent events.
+    Emits `token` events with answer text deltas as the LLM generates them and a final
+    `final` event with the full response and resolved citations.
+    :param query:
+    :param rephrase: retrieve with LLM query rephrasings, disable for lower latency
+    :param domain, source, page_start, page_end: optional document / page specific filters
+    :return: text/event-stream response
+    """
+    logger.info("Chat with PDF stream endpoint starting")
+    # checked before the stream starts so a saturated worker still answers 429,
+    # the slot itself is held by the generator for as long as it streams
+    if workers.pending >= workers.max_pending:
+        raise QueueFullError(f"Server busy: {workers.pending} requests already in flight")
+    return StreamingResponse(
+        _stream_answer(
+            query=query,
+            rephrase=rephrase,
+            filters=RetrievalFilter(
+                domain=domain, source=source, page_start=page_start, page_end=page_end
+            ),
+        ),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def _stream_answer(
+    query: str, rephrase: bool, filters: RetrievalFilter
+) -> AsyncIterator[str]:
+    try:
+        async with workers.admit():
+            query_embedding, cached_answer = await _lookup_cached_answer(query, filters)
+            if cached_answer is not None:
+                yield _sse("token", {"text": cached_answer["response"]})
+                yield _sse("final", cached_answer)
+                return
+
+            parsed_docs, prompt_inputs = await _prepare_prompt(
+                query, rephrase, filters, query_embedding
+            )
+            prompt = PromptTemplate(
+                template=response_prompt_template,
+                input_variables=["query", "documents", "parser_information"],
+            )
+
+            buffer, sent = "", ""
+            with stage("generate"):
+                async for chunk in registry.get_llm().astream(
+                    prompt.format(**prompt_inputs)
+                ):
+                    buffer += chunk.content
+                    text = extract_partial_response(buffer)
+                    if len(text) > len(sent) and text.startswith(sent):
+                        yield _sse("token", {"text": text[len(sent):]})
+                        sent = text
+
+            with stage("parse"):
+                chat_response = PydanticOutputParser(pydantic_object=ChatResponse).parse(
+                    buffer
+                )
+            logger.info("**** CHAT RESPONSE ********* \n\n")
+            logger.info(chat_response.model_dump_json())
+            if chat_response.response.startswith(sent) and len(chat_response.response) > len(sent):
+                yield _sse("token", {"text": chat_response.response[len(sent):]})
+
+            answer = {
+                "response": chat_response.response,
+                "citations": resolve_citations(chat_response, parsed_docs),
+            }
+            yield _sse("final", answer)
+            await _cache_answer(query, query_embedding, answer, filters)
+
+    except Exception as e:
+        logger.error(f"Error in chat_with_pdf_stream: {str(e)}")
+        yield _sse("error", {"detail": f"An error occurred: {str(e)}"})
+
+
 if __name__ == "__main__":
     import uvicorn
 
@@ -1,12 +1,27 @@
+import argparse
+import json
+import re
+import time
 from abc import ABC, abstractmethod
-from typing import List
+from functools import lru_cache
+from typing import Any, Iterable, Iterator, List, Optional, Tuple
 
+import numpy as np
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_core.documents import Document
 
+from utils.variables import (
+    CHUNK_EMBEDDING_MODEL_NAME,
+    CHUNK_MAX_CHARS,
+    CHUNK_OVERLAP_TOKENS,
+    CHUNK_SIZE_TOKENS,
+    EMBEDDING_MODEL_NAME,
+    SEMANTIC_BREAKPOINT_PERCENTILE,
+)
+
 
 class BaseChunker(ABC):
-    def __init__(self, docs: List[Document]):
+    def __init__(self, docs: Optional[List[Document]] = None):
         self.docs = docs
 
     @abstractmethod
@@ -17,11 +32,28 @@ class BaseChunker(ABC):
         """
         pass
 
+    def split_stream(self, docs: Iterable[Document]) -> Iterator[Document]:
+        """
+        Streaming variant of split_docs: chunks are yielded as pages arrive,
+        so the whole document is never held in memory at once.
+        :param docs: Iterable of page Documents
+        :return: Iterator of chunks
+        """
+        for doc in docs:
+            yield from type(self)(docs=[doc]).split_docs()
+
 
 class RTChunker(BaseChunker):
-    def __init__(self, docs: List[Document]):
+    def __init__(self, docs: Optional[List[Document]] = None):
         super().__init__(docs=docs)
 
+    @staticmethod
+    def get_splitter() -> RecursiveCharacterTextSplitter:
+        """
+        :return: splitter shared by the list and streaming modes
+        """
+        return RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=0)
+
     def split_docs(self) -> List[Document]:
         """
         This method should be implemented as a Recursive Character Text Splitter
@@ -37,5 +69,295 @@ class RTChunker(BaseChunker):
         ):
             raise TypeError("docs must be a list of Document objects")
 
-        splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=0)
-        return splitter.split_documents(self.docs)
+        return self.get_splitter().split_documents(self.docs)
+
+    def split_stream(self, docs: Iterable[Document]) -> Iterator[Document]:
+        """
+        Split pages one at a time with a single splitter instance
+        :param docs: Iterable of page Documents
+        :return: Iterator of chunks
+        """
+        splitter = self.get_splitter()
+        for doc in docs:
+            yield from splitter.split_documents([doc])
+
+
+class TokenChunker(RTChunker):
+    """
+    Recursive splitting sized in tokens of the embedding model's own tokenizer,
+    so chunks fill but never overflow the model's input window.
+    """
+
+    @staticmethod
+    @lru_cache(maxsize=1)
+    def get_splitter() -> RecursiveCharacterTextSplitter:
+        from transformers import AutoTokenizer
+
+        return RecursiveCharacterTextSplitter.from_huggingface_tokenizer(
+            AutoTokenizer.from_pretrained(EMBEDDING_MODEL_NAME),
+            chunk_size=CHUNK_SIZE_TOKENS,
+            chunk_overlap=CHUNK_OVERLAP_TOKENS,
+        )
+
+
+### Sentence based chunkers ###
+
+# sentence ends followed by the start of a new sentence
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+(?=[\"'(\[]?[A-Z0-9])")
+# "3.2 Scope", "IV. Results", "Chapter 4 Pumps", "APPENDIX A" -> numbered or all-caps lines
+_HEADING = re.compile(
+    r"^(?:(?:\d+(?:\.\d+)*\.?|[IVX]+\.|(?:Chapter|CHAPTER|Section|SECTION) \d+\.?)\s+[A-Z]\S*.*"
+    r"|[A-Z][A-Z0-9 ,&:/-]{2,})$"
+)
+# a heading starts a new block: it follows a blank line or the end of a sentence
+_BLOCK_END = (".", "!", "?")
+
+
+def is_heading(line: str, previous: Optional[str]) -> bool:
+    """
+    :param line: stripped line
+    :param previous: stripped previous line, None at the start of the page
+    :return: True for a numbered or all-caps heading line that starts a new block
+    """
+    return (
+        len(line) <= 80
+        and not line.endswith((".", ",", ";"))
+        and (not previous or previous.endswith(_BLOCK_END))
+        and sum(char.isalpha() for char in line) >= 2
+        and bool(_HEADING.match(line))
+    )
+
+
+def split_sections(text: str) -> List[Tuple[Optional[str], str]]:
+    """
+    Split page text at heading lines, every other line stays in the section body
+    :param text: page text
+    :return: (heading, body) per section, heading None for text before the first heading
+    """
+    sections = []
+    heading, lines, previous = None, [], None
+    for line in text.splitlines():
+        stripped = line.strip()
+        if stripped and is_heading(stripped, previous):
+            if heading or any(lines):
+                sections.append((heading, " ".join(lines)))
+            heading, lines = stripped, []
+        elif stripped:
+            lines.append(stripped)
+        previous = stripped
+    if heading or any(lines):
+        sections.append((heading, " ".join(lines)))
+    return sections
+
+
+def split_sentences(text: str) -> List[str]:
+    """
+    :param text: section text
+    :return: sentences with whitespace collapsed
+    """
+    return [
+        sentence
+        for sentence in (" ".join(part.split()) for part in _SENTENCE_END.split(text))
+        if sentence
+    ]
+
+
+def pack_sentences(sentences: List[str], max_chars: int) -> List[str]:
+    """
+    Greedily join consecutive sentences into chunks of at most max_chars,
+    sentences longer than max_chars are split on their own
+    :return: chunk texts
+    """
+    chunks, current = [], ""
+    for sentence in sentences:
+        if len(sentence) > max_chars:
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.extend(
+                RecursiveCharacterTextSplitter(
+                    chunk_size=max_chars, chunk_overlap=0
+                ).split_text(sentence)
+            )
+        elif current and len(current) + 1 + len(sentence) > max_chars:
+            chunks.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+class SentenceChunker(BaseChunker):
+    """
+    Structure-aware splitting: pages are split at heading lines, sections into sentences,
+    and sentences packed into chunks of up to CHUNK_MAX_CHARS without cutting a sentence
+    or crossing a heading. The section heading starts the text of each of its chunks, so it
+    is embedded and searchable, and is kept in the chunk metadata.
+    """
+
+    def __init__(
+        self, docs: Optional[List[Document]] = None, max_chars: int = CHUNK_MAX_CHARS
+    ):
+        super().__init__(docs=docs)
+        self.max_chars = max_chars
+
+    def group_sentences(self, sentences: List[str], max_chars: int) -> List[str]:
+        """
+        :param max_chars: chunk size left after the heading
+        :return: chunk texts of one section
+        """
+        return pack_sentences(sentences, max_chars)
+
+    def split_page(self, doc: Document) -> List[Document]:
+        chunks = []
+        for heading, body in split_sections(doc.page_content):
+            metadata = dict(doc.metadata)
+            if not heading:
+                texts = self.group_sentences(split_sentences(body), self.max_chars)
+            else:
+                metadata["heading"] = heading
+                # a heading without body text still becomes a chunk of its own
+                texts = [
+                    f"{heading}\n{text}"
+                    for text in self.group_sentences(
+                        split_sentences(body),
+                        max(self.max_chars - len(heading) - 1, self.max_chars // 2),
+                    )
+                ] or [heading]
+            chunks.extend(
+                Document(page_content=text, metadata=dict(metadata)) for text in texts
+            )
+        return chunks
+
+    def split_docs(self) -> List[Document]:
+        """
+        This method should be implemented as a Sentence / Heading aware Splitter
+
+        :param List[Document]:
+        :return: Split Documents into Chunks
+        """
+        if not self.docs:
+            raise ValueError("docs parameter cannot be empty")
+        return [chunk for doc in self.docs for chunk in self.split_page(doc)]
+
+    def split_stream(self, docs: Iterable[Document]) -> Iterator[Document]:
+        for doc in docs:
+            yield from self.split_page(doc)
+
+
+@lru_cache(maxsize=1)
+def get_chunk_embeddings() -> Any:
+    """
+    :return: small embedding model used only to detect semantic boundaries, loaded once per process
+    """
+    from langchain_community.embeddings import HuggingFaceEmbeddings
+
+    return HuggingFaceEmbeddings(
+        model_name=CHUNK_EMBEDDING_MODEL_NAME,
+        encode_kwargs={"normalize_embeddings": True},
+    )
+
+
+class SemanticChunker(SentenceChunker):
+    """
+    Semantic boundary detection: all sentences of a section are embedded in one batch and
+    a chunk ends where the cosine distance between neighbouring sentences is in the top
+    (100 - SEMANTIC_BREAKPOINT_PERCENTILE) percent; chunks are still capped at CHUNK_MAX_CHARS.
+    """
+
+    def __init__(
+        self,
+        docs: Optional[List[Document]] = None,
+        max_chars: int = CHUNK_MAX_CHARS,
+        breakpoint_percentile: float = SEMANTIC_BREAKPOINT_PERCENTILE,
+        embeddings: Any = None,
+    ):
+        super().__init__(docs=docs, max_chars=max_chars)
+        self.breakpoint_percentile = breakpoint_percentile
+        self.embeddings = embeddings
+
+    def group_sentences(self, sentences: List[str], max_chars: int) -> List[str]:
+        if len(sentences) < 3:
+            return pack_sentences(sentences, max_chars)
+        vectors = np.asarray(
+            (self.embeddings or get_chunk_embeddings()).embed_documents(sentences),
+            dtype=np.float32,
+        )
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12
+        # cosine distance of every sentence to the next one, in one vectorized pass
+        distances = 1.0 - np.einsum("ij,ij->i", vectors[:-1], vectors[1:])
+        breakpoints = np.flatnonzero(
+            distances > np.percentile(distances, self.breakpoint_percentile)
+        )
+        chunks, start = [], 0
+        for end in [*(breakpoints + 1), len(sentences)]:
+            chunks.extend(pack_sentences(sentences[start:end], max_chars))
+            start = end
+        return chunks
+
+
+### Chunker comparison report ###
+
+
+def compare_chunkers(
+    pages: List[Document], chunkers: List[BaseChunker], embeddings: Any = None
+) -> List[dict]:
+    """
+    Chunk the same pages with every chunker
+    :param pages: loaded page Documents
+    :param chunkers: chunkers to compare
+    :param embeddings: optional embedding model, to also time embedding the chunks
+    :return: per chunker -> chunk count, chunk size statistics, chunking / embedding seconds
+    """
+    report = []
+    for chunker in chunkers:
+        start = time.perf_counter()
+        chunks = list(chunker.split_stream(pages))
+        row = {
+            "chunker": type(chunker).__name__,
+            "num_chunks": len(chunks),
+            "mean_chars": round(float(np.mean([len(c.page_content) for c in chunks])), 1)
+            if chunks
+            else 0.0,
+            "max_chars": max((len(c.page_content) for c in chunks), default=0),
+            "chunk_seconds": round(time.perf_counter() - start, 3),
+        }
+        if embeddings is not None:
+            start = time.perf_counter()
+            embeddings.embed_documents([c.page_content for c in chunks])
+            row["embed_seconds"] = round(time.perf_counter() - start, 3)
+        report.append(row)
+    return report
+
+
+if __name__ == "__main__":
+    # cd app && python -m services.chunkers docs/a.pdf docs/b.pdf --embed
+    from services.loaders import PDFLoader
+
+    parser = argparse.ArgumentParser(
+        description="Compare chunk count and ingest time of the chunkers"
+    )
+    parser.add_argument("pdfs", nargs="+")
+    parser.add_argument(
+        "--embed", action="store_true", help="also time embedding the chunks"
+    )
+    args = parser.parse_args()
+
+    embeddings = None
+    if args.embed:
+        from langchain_community.embeddings import HuggingFaceEmbeddings
+
+        embeddings = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME)
+    pages = [page for pdf in args.pdfs for page in PDFLoader.iter_docs(doc_path=pdf)]
+    print(
+        json.dumps(
+            compare_chunkers(
+                pages,
+                [RTChunker(), TokenChunker(), SentenceChunker(), SemanticChunker()],
+                embeddings=embeddings,
+            ),
+            indent=2,
+        )
+    )
@@ -0,0 +1,195 @@
+import json
+import os
+import sqlite3
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from langchain_community.docstore.base import AddableMixin, Docstore
+from langchain_core.documents import Document
+
+# SQLite limits the number of bound parameters per statement
+_MAX_PARAMS = 900
+
+
+def _batches(ids: List[str]) -> Iterator[List[str]]:
+    for start in range(0, len(ids), _MAX_PARAMS):
+        yield ids[start : start + _MAX_PARAMS]
+
+
+class SQLiteDocstore(Docstore, AddableMixin):
+    """
+    Chunk store of the FAISS backend, one SQLite row per chunk keyed on its vector id.
+    Replaces langchain's InMemoryDocstore, which is pickled whole on every save and
+    unpickled on every load: pickling this store only writes its path, appends are
+    plain inserts and a search fetches just the top-k rows.
+    Deletes are tombstones, so older index generations that still reference a chunk
+    keep resolving it until `purge` runs after those generations are removed.
+    """
+
+    def __init__(self, db_path: str):
+        """
+        :param db_path: Path of the SQLite file holding the chunks
+        """
+        self.db_path = db_path
+        self._schema_ready = False
+
+    def __getstate__(self) -> Dict[str, Any]:
+        return {"db_path": self.db_path}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__init__(db_path=state["db_path"])
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._schema_ready:
+            self.create_schema()
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def create_schema(self) -> None:
+        """
+        Create the chunk table if it does not exist yet.
+        :return: None
+        """
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        with sqlite3.connect(self.db_path, timeout=30) as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS chunks (
+                    id TEXT PRIMARY KEY,
+                    page_content TEXT NOT NULL,
+                    source TEXT,
+                    domain TEXT,
+                    page INTEGER,
+                    metadata TEXT NOT NULL,
+                    deleted_at INTEGER
+                )
+                """
+            )
+        self._schema_ready = True
+
+    @staticmethod
+    def _row(doc_id: str, doc: Document) -> Tuple:
+        page = doc.metadata.get("page")
+        return (
+            doc_id,
+            doc.page_content,
+            doc.metadata.get("source"),
+            doc.metadata.get("domain"),
+            page if isinstance(page, int) else None,
+            json.dumps(doc.metadata),
+        )
+
+    def add(self, texts: Dict[str, Document]) -> None:
+        """
+        Append chunks, re-adding a deleted id revives it.
+        :param texts: vector id -> chunk
+        :return: None
+        """
+        with self._connect() as connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO chunks "
+                "(id, page_content, source, domain, page, metadata, deleted_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, NULL)",
+                [self._row(doc_id, doc) for doc_id, doc in texts.items()],
+            )
+
+    def delete(self, ids: Iterable[str]) -> None:
+        """
+        Tombstone chunks, they are removed for good by `purge`.
+        :param ids: vector ids
+        :return: None
+        """
+        now = time.time_ns()
+        with self._connect() as connection:
+            for batch in _batches(list(ids)):
+                connection.execute(
+                    f"UPDATE chunks SET deleted_at = ? WHERE deleted_at IS NULL "
+                    f"AND id IN ({','.join('?' * len(batch))})",
+                    [now, *batch],
+                )
+
+    def purge(self, deleted_before: int) -> int:
+        """
+        Remove chunks tombstoned before the oldest index generation still on disk.
+        :param deleted_before: time in nanoseconds
+        :return: number of removed chunks
+        """
+        with self._connect() as connection:
+            return connection.execute(
+                "DELETE FROM chunks WHERE deleted_at < ?", (deleted_before,)
+            ).rowcount
+
+    def mget(self, ids: List[str]) -> List[Optional[Document]]:
+        """
+        Fetch the chunks of a search result in one query.
+        :param ids: vector ids
+        :return: chunks in the order of ids, None for unknown ids
+        """
+        found = {}
+        with self._connect() as connection:
+            for batch in _batches(list(ids)):
+                for doc_id, page_content, metadata in connection.execute(
+                    f"SELECT id, page_content, metadata FROM chunks "
+                    f"WHERE id IN ({','.join('?' * len(batch))})",
+                    batch,
+                ):
+                    found[doc_id] = Document(
+                        id=doc_id,
+                        page_content=page_content,
+                        metadata=json.loads(metadata),
+                    )
+        return [found.get(doc_id) for doc_id in ids]
+
+    def search(self, search: str) -> Union[str, Document]:
+        doc = self.mget([search])[0]
+        return doc if doc is not None else f"ID {search} not found."
+
+    def metadata(self) -> Iterator[Tuple[str, Optional[str], Optional[str], Any]]:
+        """
+        :return: (id, source, domain, page) of every live chunk, without loading the text
+        """
+        with self._connect() as connection:
+            yield from connection.execute(
+                "SELECT id, source, domain, page FROM chunks WHERE deleted_at IS NULL"
+            )
+
+    def count(self) -> int:
+        with self._connect() as connection:
+            return connection.execute(
+                "SELECT COUNT(*) FROM chunks WHERE deleted_at IS NULL"
+            ).fetchone()[0]
+
+
+def fetch_documents(docstore: Docstore, ids: List[str]) -> List[Optional[Document]]:
+    """
+    :return: chunks in the order of ids, None for unknown ids, batched where the store allows
+    """
+    if isinstance(docstore, SQLiteDocstore):
+        return docstore.mget(ids)
+    docs = [docstore.search(doc_id) for doc_id in ids]
+    return [doc if isinstance(doc, Document) else None for doc in docs]
+
+
+def chunk_metadata(
+    docstore: Docstore, ids: Iterable[str]
+) -> Dict[str, Tuple[Optional[str], Optional[str], Any]]:
+    """
+    :return: vector id -> (source, domain, page) for the given ids
+    """
+    ids = set(ids)
+    if isinstance(docstore, SQLiteDocstore):
+        return {
+            doc_id: (source, domain, page)
+            for doc_id, source, domain, page in docstore.metadata()
+            if doc_id in ids
+        }
+    metadata = {}
+    for doc_id in ids:
+        doc = docstore.search(doc_id)
+        if isinstance(doc, Document):
+            metadata[doc_id] = (
+                doc.metadata.get("source"),
+                doc.metadata.get("domain"),
+                doc.metadata.get("page"),
+            )
+    return metadata
@@ -0,0 +1,306 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from utils.caches import LRUCache, normalize_query
+from utils.metrics import stage
+
+
+class EmbeddingStore:
+    """
+    Persistent content-hash -> vector store for one embedding model.
+    Vectors are appended to a float32 file read through a memory map,
+    the key -> row mapping lives in a small SQLite table next to it.
+    The number of committed rows is recorded with the mapping, so rows of a write that
+    never committed are overwritten by the next one.
+    """
+
+    def __init__(self, cache_dir: str, model_name: str):
+        """
+        :param cache_dir: Root directory of the embedding cache
+        :param model_name: Embedding model name, every model gets its own store
+        """
+        self.model_name = model_name
+        self.store_dir = os.path.join(cache_dir, re.sub(r"[^\w.-]", "_", model_name))
+        self.vectors_path = os.path.join(self.store_dir, "vectors.f32")
+        self.index_path = os.path.join(self.store_dir, "index.sqlite")
+        self.dim: Optional[int] = None
+        self._matrix: Optional[np.memmap] = None
+        self._lock = threading.Lock()
+
+        os.makedirs(self.store_dir, exist_ok=True)
+        with self._connect() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, row INTEGER NOT NULL)"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)"
+            )
+            self._load_dim(connection)
+
+    def _load_dim(self, connection: sqlite3.Connection) -> None:
+        """
+        Read the vector dimension, which is fixed by the first write of any process
+        """
+        row = connection.execute("SELECT value FROM meta WHERE name = 'dim'").fetchone()
+        if row:
+            self.dim = int(row[0])
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.index_path, timeout=30, isolation_level=None)
+
+    def key(self, text: str, kind: str) -> str:
+        """
+        :param text: embedded text
+        :param kind: "doc" or "query", models may embed both differently
+        :return: content hash of (model, kind, text)
+        """
+        payload = f"{self.model_name}\x00{kind}\x00{text}".encode("utf-8")
+        return hashlib.sha256(payload).hexdigest()
+
+    def _rows_available(self) -> int:
+        if not self.dim or not os.path.exists(self.vectors_path):
+            return 0
+        return os.path.getsize(self.vectors_path) // (self.dim * 4)
+
+    def _get_matrix(self, min_rows: int) -> np.memmap:
+        """
+        Memory map of the vector file, re-mapped only when it has grown past min_rows
+        """
+        if self._matrix is None or self._matrix.shape[0] < min_rows:
+            self._matrix = np.memmap(
+                self.vectors_path,
+                dtype=np.float32,
+                mode="r",
+                shape=(self._rows_available(), self.dim),
+            )
+        return self._matrix
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, List[float]]:
+        """
+        :param keys: content hashes
+        :return: cached vectors of the keys that are present
+        """
+        rows: Dict[str, int] = {}
+        with self._connect() as connection:
+            # stay below SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                batch = keys[start : start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows.update(
+                    connection.execute(
+                        f"SELECT key, row FROM entries WHERE key IN ({placeholders})",
+                        batch,
+                    ).fetchall()
+                )
+            if rows and self.dim is None:
+                self._load_dim(connection)
+        if not rows:
+            return {}
+        with self._lock:
+            matrix = self._get_matrix(max(rows.values()) + 1)
+            return {key: matrix[row].tolist() for key, row in rows.items()}
+
+    @staticmethod
+    def _committed_rows(connection: sqlite3.Connection) -> int:
+        """
+        Number of rows of the vector file written by committed transactions
+        """
+        row = connection.execute("SELECT value FROM meta WHERE name = 'rows'").fetchone()
+        if row:
+            return int(row[0])
+        # stores written before the row count was recorded
+        return connection.execute(
+            "SELECT COALESCE(MAX(row) + 1, 0) FROM entries"
+        ).fetchone()[0]
+
+    def put_many(self, items: Dict[str, List[float]]) -> None:
+        """
+        Write new vectors after the committed rows. BEGIN IMMEDIATE serializes writers
+        across worker processes; the file is cut back to the committed rows first, so a
+        torn or uncommitted earlier write never shifts rows, and the vectors are synced
+        to disk before the mapping is committed.
+        :param items: content hash -> vector
+        :return: None
+        """
+        if not items:
+            return
+        vectors = np.asarray(list(items.values()), dtype=np.float32)
+        connection = self._connect()
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            if self.dim is None:
+                self._load_dim(connection)
+            if self.dim is None:
+                self.dim = int(vectors.shape[1])
+                connection.execute(
+                    "INSERT OR IGNORE INTO meta (name, value) VALUES ('dim', ?)",
+                    (str(self.dim),),
+                )
+            first_row = self._committed_rows(connection)
+            mode = "r+b" if os.path.exists(self.vectors_path) else "w+b"
+            with open(self.vectors_path, mode) as vectors_file:
+                vectors_file.seek(first_row * self.dim * 4)
+                vectors_file.truncate()
+                vectors_file.write(vectors.tobytes())
+                vectors_file.flush()
+                os.fsync(vectors_file.fileno())
+            connection.executemany(
+                "INSERT OR IGNORE INTO entries (key, row) VALUES (?, ?)",
+                [(key, first_row + i) for i, key in enumerate(items)],
+            )
+            connection.execute(
+                "INSERT OR REPLACE INTO meta (name, value) VALUES ('rows', ?)",
+                (str(first_row + len(items)),),
+            )
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        finally:
+            connection.close()
+
+
+def embed_queries(embeddings: Embeddings, texts: List[str]) -> List[List[float]]:
+    """
+    :return: query embeddings of the texts, in one call when the embeddings support it
+    """
+    if hasattr(embeddings, "embed_queries"):
+        return embeddings.embed_queries(texts)
+    return [embeddings.embed_query(text) for text in texts]
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that batches calls to the underlying model and skips it entirely
+    for texts whose vectors are already in the EmbeddingStore.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        store: EmbeddingStore,
+        batch_size: int,
+        query_as_document: bool = False,
+    ):
+        """
+        :param embeddings: underlying embedding model
+        :param store: persistent content-hash embedding store
+        :param batch_size: number of texts sent to the model per call
+        :param query_as_document: the model embeds queries exactly like documents
+            (no query prefix or instruction), so query misses are batched through
+            embed_documents; otherwise through the model's embed_queries when it has one
+        """
+        self.embeddings = embeddings
+        self.store = store
+        self.batch_size = batch_size
+        self.query_as_document = query_as_document
+        self.hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()
+
+    def _embed(self, texts: List[str], kind: str) -> List[List[float]]:
+        keys = [self.store.key(text, kind) for text in texts]
+        cached = self.store.get_many(keys)
+
+        # embed each distinct missing text once, even if repeated within the batch
+        missing = {key: text for key, text in zip(keys, texts) if key not in cached}
+        with self._stats_lock:
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+
+        missing_keys = list(missing)
+        for start in range(0, len(missing_keys), self.batch_size):
+            batch_keys = missing_keys[start : start + self.batch_size]
+            batch_texts = [missing[key] for key in batch_keys]
+            if kind == "query" and not self.query_as_document:
+                vectors = embed_queries(self.embeddings, batch_texts)
+            else:
+                vectors = self.embeddings.embed_documents(batch_texts)
+            computed = dict(zip(batch_keys, vectors))
+            self.store.put_many(computed)
+            cached.update(computed)
+
+        return [cached[key] for key in keys]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(list(texts), kind="doc")
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed([text], kind="query")[0]
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """
+        Query embeddings of several texts, looked up in the store in one batch
+        """
+        return self._embed(list(texts), kind="query")
+
+    def stats(self) -> Dict[str, float]:
+        """
+        :return: cache hit / miss counters of this process and the hit ratio
+        """
+        with self._stats_lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {
+            "model": self.store.model_name,
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": round(hits / total, 4) if total else 0.0,
+        }
+
+
+class QueryLRUEmbeddings(Embeddings):
+    """
+    In-process LRU/TTL cache of query embeddings keyed on the normalized query.
+    Query vectors do not depend on the index, so no version is part of the key.
+    """
+
+    def __init__(self, embeddings: Embeddings, cache: LRUCache):
+        """
+        :param embeddings: underlying embedding model
+        :param cache: LRU cache holding query vectors
+        """
+        self.embeddings = embeddings
+        self.cache = cache
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        with stage("embed"):
+            return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_queries([text])[0]
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """
+        Query embeddings of several texts: LRU hits are served from the cache and the
+        misses are embedded together through the query path of the wrapped embeddings
+        :param texts: queries
+        :return: one vector per query
+        """
+        keys = [normalize_query(text) for text in texts]
+        vectors = [self.cache.get(key) for key in keys]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            with stage("embed"):
+                computed = embed_queries(self.embeddings, [texts[i] for i in missing])
+            for i, vector in zip(missing, computed):
+                vectors[i] = vector
+                self.cache.put(keys[i], vector)
+        return vectors
+
+    def stats(self) -> Dict[str, float]:
+        """
+        :return: stats of the wrapped embeddings plus the query LRU cache
+        """
+        stats = {"query_lru": self.cache.stats()}
+        if hasattr(self.embeddings, "stats"):
+            stats["disk"] = self.embeddings.stats()
+        return stats
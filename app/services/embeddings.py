@@ -1,7 +1,15 @@
 from abc import ABC, abstractmethod
 from typing import Any
 
-from langchain_community.embeddings import HuggingFaceEmbeddings
+from langchain_core.embeddings import Embeddings
+
+from services.embedding_cache import CachedEmbeddings, EmbeddingStore
+from utils.variables import (
+    EMBEDDING_BATCH_SIZE,
+    EMBEDDING_CACHE_DIR,
+    EMBEDDING_MODEL_NAME,
+    EMBEDDING_NORMALIZE,
+)
 
 
 class BaseEmbeddings(ABC):
@@ -13,12 +21,52 @@ class BaseEmbeddings(ABC):
         """
         pass
 
+    @staticmethod
+    def with_cache(
+        embeddings: Embeddings,
+        model_name: str,
+        batch_size: int = EMBEDDING_BATCH_SIZE,
+        cache_dir: str = EMBEDDING_CACHE_DIR,
+        query_as_document: bool = False,
+    ) -> Embeddings:
+        """
+        Wrap a provider's embedding model with batching and the content-hash embedding cache
+        :param embeddings: embedding model of the provider
+        :param model_name: model name, part of every cache key
+        :param batch_size: number of texts sent to the model per call
+        :param cache_dir: cache directory, an empty value disables the cache
+        :param query_as_document: the model embeds queries like documents, so several
+            queries are embedded in one embed_documents call
+        :return: CachedEmbeddings, or the model itself when caching is disabled
+        """
+        if not cache_dir:
+            return embeddings
+        return CachedEmbeddings(
+            embeddings=embeddings,
+            store=EmbeddingStore(cache_dir=cache_dir, model_name=model_name),
+            batch_size=batch_size,
+            query_as_document=query_as_document,
+        )
+
 
 class HFEmbeddings(BaseEmbeddings):
     @classmethod
-    def get_embeddings(cls) -> HuggingFaceEmbeddings:
+    def get_embeddings(cls) -> Embeddings:
         """
         This method should be Implementation as a HuggingFaceEmbedding Provider
-        :return: an instance of HuggingFaceEmbeddings
+        :return: an instance of HuggingFaceEmbeddings behind the embedding cache
         """
-        return HuggingFaceEmbeddings()
+        from langchain_community.embeddings import HuggingFaceEmbeddings
+
+        return cls.with_cache(
+            HuggingFaceEmbeddings(
+                model_name=EMBEDDING_MODEL_NAME,
+                encode_kwargs={
+                    "batch_size": EMBEDDING_BATCH_SIZE,
+                    "normalize_embeddings": EMBEDDING_NORMALIZE,
+                },
+            ),
+            model_name=f"{EMBEDDING_MODEL_NAME}:normalize={EMBEDDING_NORMALIZE}",
+            # HuggingFaceEmbeddings.embed_query is embed_documents of a single text
+            query_as_document=True,
+        )
@@ -0,0 +1,447 @@
+import argparse
+import json
+import operator
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.utils import DistanceStrategy
+from langchain_core.documents import Document
+
+from utils.variables import (
+    FAISS_EF_SEARCH,
+    FAISS_MAX_TOMBSTONE_RATIO,
+    FAISS_NPROBE,
+    FAISS_TRAIN_SAMPLE_SIZE,
+    VECTOR_DB_PATH,
+)
+
+### FAISS index factories (faiss is imported lazily, Chroma-only deployments do not need it) ###
+
+
+def generation_path(vector_db_path: str, generation: str) -> str:
+    """
+    :param vector_db_path: Path where the vector database is stored
+    :param generation: index generation, "0" for stores written before generations existed
+    :return: folder holding index.faiss / index.pkl of that generation
+    """
+    if generation == "0":
+        return vector_db_path
+    return os.path.join(vector_db_path, "generations", generation)
+
+
+def read_index_mmap(path: str) -> Any:
+    """
+    Open a saved FAISS index memory-mapped and read-only, so its pages live in the
+    OS page cache and are shared by every process serving the same file.
+    :param path: index.faiss file
+    :return: read-only FAISS index
+    """
+    import faiss
+
+    flags = (
+        faiss.IO_FLAG_MMAP
+        | getattr(faiss, "IO_FLAG_MMAP_IFC", 0)
+        | faiss.IO_FLAG_READ_ONLY
+    )
+    return faiss.read_index(path, flags)
+
+
+def is_flat(index: Any) -> bool:
+    """
+    :return: True for exact brute-force indexes, which need neither training nor tuning
+    """
+    import faiss
+
+    return isinstance(faiss.downcast_index(index), faiss.IndexFlat)
+
+
+def all_vectors(index: Any) -> np.ndarray:
+    """
+    :param index: any FAISS index holding positional ids 0..ntotal-1
+    :return: every stored vector (PQ indexes return their decoded approximation)
+    """
+    import faiss
+
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None and ivf.direct_map.no():
+        ivf.make_direct_map()
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def build_index(
+    vectors: np.ndarray,
+    factory: str,
+    metric: Optional[int] = None,
+    sample_size: int = FAISS_TRAIN_SAMPLE_SIZE,
+    seed: int = 0,
+) -> Any:
+    """
+    Build a FAISS index from a factory string, e.g. "Flat", "IVF1024,Flat", "IVF1024,PQ32", "HNSW32".
+    Indexes that need training are trained on a random sample of the vectors first.
+    :param vectors: float32 matrix of the vectors to add, in position order
+    :param factory: faiss.index_factory description
+    :param metric: faiss metric type, defaults to L2
+    :param sample_size: maximum number of vectors used for training
+    :param seed: seed of the training sample
+    :return: trained index holding all vectors
+    """
+    import faiss
+
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    metric = faiss.METRIC_L2 if metric is None else metric
+    index = faiss.index_factory(vectors.shape[1], factory, metric)
+    if not index.is_trained:
+        rng = np.random.default_rng(seed)
+        sample = vectors[
+            rng.choice(len(vectors), min(len(vectors), sample_size), replace=False)
+        ]
+        index.train(sample)
+    index.add(vectors)
+    set_search_params(index)
+    return index
+
+
+def set_search_params(
+    index: Any, nprobe: int = FAISS_NPROBE, ef_search: int = FAISS_EF_SEARCH
+) -> None:
+    """
+    Apply the runtime recall / latency knobs: nprobe for IVF, efSearch for HNSW.
+    :return: None
+    """
+    import faiss
+
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = nprobe
+    hnsw = faiss.downcast_index(index)
+    if hasattr(hnsw, "hnsw"):
+        hnsw.hnsw.efSearch = ef_search
+
+
+def search_parameters(index: Any, selector: Any) -> Any:
+    """
+    :param index: index to be searched
+    :param selector: faiss IDSelector restricting the searched ids
+    :return: SearchParameters of the index type, carrying its current nprobe / efSearch
+    """
+    import faiss
+
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        return faiss.SearchParametersIVF(sel=selector, nprobe=ivf.nprobe)
+    hnsw = faiss.downcast_index(index)
+    if hasattr(hnsw, "hnsw"):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=hnsw.hnsw.efSearch)
+    return faiss.SearchParameters(sel=selector)
+
+
+class PositionalFAISS(FAISS):
+    """
+    langchain FAISS store whose vector ids stay usable as positions for every index type.
+    langchain re-numbers positions after a delete, which only holds for flat indexes:
+    - IVF vectors are removed with remove_ids and the ones at the highest ids are
+      re-labelled into the freed ids, so ids stay 0..ntotal-1 without re-encoding anything
+    - HNSW cannot remove vectors: deleted ones stay in the graph as tombstones (positions
+      without a docstore id), skipped by every search, and the index is rebuilt once
+      they exceed `max_tombstone_ratio` of it
+    """
+
+    max_tombstone_ratio: float = FAISS_MAX_TOMBSTONE_RATIO
+    # (ntotal, mapped vectors) -> tombstoned positions, reset by every write
+    _tombstones: Optional[Tuple[Tuple[int, int], np.ndarray]] = None
+
+    def deleted_positions(self) -> np.ndarray:
+        """
+        :return: sorted positions of tombstoned vectors, still in the index but no longer mapped
+        """
+        key = (self.index.ntotal, len(self.index_to_docstore_id))
+        if key[0] == key[1]:
+            return np.empty(0, dtype=np.int64)
+        if self._tombstones is None or self._tombstones[0] != key:
+            mapped = np.fromiter(self.index_to_docstore_id, dtype=np.int64)
+            self._tombstones = (
+                key,
+                np.setdiff1d(np.arange(key[0], dtype=np.int64), mapped),
+            )
+        return self._tombstones[1]
+
+    def search_positions(
+        self, query: np.ndarray, k: int, allowed: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        :param query: float32 matrix of (normalised) query vectors
+        :param k: number of neighbours per query
+        :param allowed: optional allowlist of mapped positions to search
+        :return: (distances, positions) as returned by faiss.Index.search, without tombstones
+        """
+        import faiss
+
+        if allowed is not None:
+            selector = faiss.IDSelectorBatch(allowed)
+        else:
+            deleted = self.deleted_positions()
+            if not len(deleted):
+                return self.index.search(query, k)
+            # IDSelectorNot does not own the selector it negates, keep a reference
+            tombstones = faiss.IDSelectorBatch(deleted)
+            selector = faiss.IDSelectorNot(tombstones)
+        return self.index.search(
+            query, k, params=search_parameters(self.index, selector)
+        )
+
+    def similarity_search_with_score_by_vector(
+        self,
+        embedding: List[float],
+        k: int = 4,
+        filter: Optional[Union[Callable, Dict[str, Any]]] = None,
+        fetch_k: int = 20,
+        **kwargs: Any,
+    ) -> List[Tuple[Document, float]]:
+        if not len(self.deleted_positions()):
+            return super().similarity_search_with_score_by_vector(
+                embedding, k, filter=filter, fetch_k=fetch_k, **kwargs
+            )
+        # langchain searches the raw index, which would return tombstones
+        import faiss
+
+        vector = np.array([embedding], dtype=np.float32)
+        if self._normalize_L2:
+            faiss.normalize_L2(vector)
+        scores, positions = self.search_positions(vector, k if filter is None else fetch_k)
+        matches = self._create_filter_func(filter) if filter is not None else None
+        docs = []
+        for position, score in zip(positions[0], scores[0]):
+            if position == -1:
+                continue
+            doc = self.docstore.search(self.index_to_docstore_id[position])
+            if matches is None or matches(doc.metadata):
+                docs.append((doc, score))
+        score_threshold = kwargs.get("score_threshold")
+        if score_threshold is not None:
+            cmp = (
+                operator.ge
+                if self.distance_strategy
+                in (DistanceStrategy.MAX_INNER_PRODUCT, DistanceStrategy.JACCARD)
+                else operator.le
+            )
+            docs = [(doc, score) for doc, score in docs if cmp(score, score_threshold)]
+        return docs[:k]
+
+    def _FAISS__add(self, texts, embeddings, metadatas=None, ids=None) -> List[str]:
+        # langchain's private FAISS.__add numbers new vectors from len(index_to_docstore_id),
+        # tombstones still hold positions so the index appends them at ntotal instead
+        start, mapping = self.index.ntotal, self.index_to_docstore_id
+        if start == len(mapping):
+            return super()._FAISS__add(texts, embeddings, metadatas=metadatas, ids=ids)
+        self.index_to_docstore_id = {}
+        try:
+            added = super()._FAISS__add(texts, embeddings, metadatas=metadatas, ids=ids)
+        finally:
+            new, self.index_to_docstore_id = self.index_to_docstore_id, mapping
+        mapping.update({start + offset: doc_id for offset, doc_id in new.items()})
+        return added
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        import faiss
+
+        if ids is None:
+            raise ValueError("No ids provided to delete.")
+        if is_flat(self.index):
+            return super().delete(ids, **kwargs)
+        removed = set(ids)
+        positions = np.fromiter(
+            sorted(
+                position
+                for position, doc_id in self.index_to_docstore_id.items()
+                if doc_id in removed
+            ),
+            dtype=np.int64,
+        )
+        if len(positions) < len(removed):
+            missing = removed - set(self.index_to_docstore_id.values())
+            raise ValueError(
+                f"Some specified ids do not exist in the current store. Ids not found: {missing}"
+            )
+        for position in positions.tolist():
+            del self.index_to_docstore_id[position]
+        self.docstore.delete(list(removed))
+        ivf = faiss.try_extract_index_ivf(self.index)
+        if ivf is not None:
+            self._remove_ivf(ivf, positions)
+        elif len(self.deleted_positions()) > self.max_tombstone_ratio * self.index.ntotal:
+            self.drop_tombstones()
+        return True
+
+    def _remove_ivf(self, ivf: Any, positions: np.ndarray) -> None:
+        """
+        Remove the vectors at `positions` (already unmapped) and move the vectors left at
+        ids >= the new ntotal into the freed ids, in the inverted lists and the mapping.
+        :return: None
+        """
+        import faiss
+
+        if not ivf.direct_map.no():
+            # an Array direct map (see all_vectors) does not support remove_ids
+            ivf.set_direct_map_type(faiss.DirectMap.NoMap)
+        remaining = self.index.ntotal - len(positions)
+        self.index.remove_ids(faiss.IDSelectorBatch(positions))
+        holes = positions[positions < remaining]
+        if not len(holes):
+            return
+        moved = np.setdiff1d(
+            np.arange(remaining, remaining + len(positions), dtype=np.int64), positions
+        )
+        relabel = np.empty(len(positions), dtype=np.int64)
+        relabel[moved - remaining] = holes
+        invlists = ivf.invlists
+        for list_no in range(invlists.nlist):
+            size = invlists.list_size(list_no)
+            if not size:
+                continue
+            # writable view over the ids stored in the inverted list
+            list_ids = faiss.rev_swig_ptr(invlists.get_ids(list_no), size)
+            tail = list_ids >= remaining
+            if tail.any():
+                list_ids[tail] = relabel[list_ids[tail] - remaining]
+        for hole, position in zip(holes.tolist(), moved.tolist()):
+            self.index_to_docstore_id[hole] = self.index_to_docstore_id.pop(position)
+
+    def drop_tombstones(self) -> None:
+        """
+        Rebuild the (already trained) index from its mapped vectors, re-numbering positions.
+        :return: None
+        """
+        import faiss
+
+        keep = sorted(self.index_to_docstore_id)
+        vectors = all_vectors(self.index)[keep]
+        index = faiss.clone_index(self.index)
+        index.reset()
+        index.add(vectors)
+        self.index = index
+        self.index_to_docstore_id = {
+            new_position: self.index_to_docstore_id[position]
+            for new_position, position in enumerate(keep)
+        }
+
+
+### Recall vs latency report ###
+
+
+def _search_timed(index: Any, queries: np.ndarray, k: int):
+    ids = np.empty((len(queries), k), dtype=np.int64)
+    latencies = np.empty(len(queries))
+    for i, query in enumerate(queries):
+        start = time.perf_counter()
+        _, ids[i] = index.search(query[None, :], k)
+        latencies[i] = time.perf_counter() - start
+    return ids, latencies
+
+
+def recall_latency_report(
+    vectors: np.ndarray,
+    factories: Sequence[str],
+    k: int = 10,
+    num_queries: int = 200,
+    nprobes: Sequence[int] = (1, 4, 16, 64),
+    ef_searches: Sequence[int] = (16, 64, 256),
+    sample_size: int = FAISS_TRAIN_SAMPLE_SIZE,
+    seed: int = 0,
+) -> List[Dict[str, Any]]:
+    """
+    Compare ANN index settings against the exact flat baseline. Held-out vectors are used as
+    queries, recall@k is measured against the flat results, latency per single-query search.
+    :param vectors: corpus vectors, e.g. all_vectors() of the production index
+    :param factories: faiss.index_factory descriptions to evaluate
+    :param k: number of neighbours per query
+    :param num_queries: number of held-out query vectors
+    :param nprobes: nprobe values swept for IVF indexes
+    :param ef_searches: efSearch values swept for HNSW indexes
+    :param sample_size: maximum number of vectors used for training
+    :param seed: seed of the query and training samples
+    :return: one row per factory and setting -> recall, mean / p95 latency, build time
+    """
+    import faiss
+
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    rng = np.random.default_rng(seed)
+    held_out = rng.choice(len(vectors), min(num_queries, len(vectors) // 10), replace=False)
+    queries = vectors[held_out]
+    corpus = np.delete(vectors, held_out, axis=0)
+
+    def row(factory, params, ids, latencies, build_seconds):
+        return {
+            "factory": factory,
+            "params": params,
+            f"recall@{k}": round(
+                float(np.mean([len(set(a) & set(t)) / k for a, t in zip(ids, truth)])),
+                4,
+            ),
+            "mean_ms": round(float(latencies.mean()) * 1000, 4),
+            "p95_ms": round(float(np.percentile(latencies, 95)) * 1000, 4),
+            "build_seconds": round(build_seconds, 3),
+        }
+
+    start = time.perf_counter()
+    flat = faiss.IndexFlatL2(corpus.shape[1])
+    flat.add(corpus)
+    build_seconds = time.perf_counter() - start
+    truth, latencies = _search_timed(flat, queries, k)
+    report = [row("Flat", {}, truth, latencies, build_seconds)]
+
+    for factory in factories:
+        start = time.perf_counter()
+        index = build_index(corpus, factory, sample_size=sample_size, seed=seed)
+        build_seconds = time.perf_counter() - start
+        if faiss.try_extract_index_ivf(index) is not None:
+            settings = [{"nprobe": nprobe} for nprobe in nprobes]
+        elif hasattr(faiss.downcast_index(index), "hnsw"):
+            settings = [{"efSearch": ef} for ef in ef_searches]
+        else:
+            settings = [{}]
+        for params in settings:
+            set_search_params(
+                index,
+                nprobe=params.get("nprobe", FAISS_NPROBE),
+                ef_search=params.get("efSearch", FAISS_EF_SEARCH),
+            )
+            ids, latencies = _search_timed(index, queries, k)
+            report.append(row(factory, params, ids, latencies, build_seconds))
+    return report
+
+
+if __name__ == "__main__":
+    # cd app && python -m services.faiss_indexes --factories "IVF1024,Flat" "IVF1024,PQ32" "HNSW32"
+    parser = argparse.ArgumentParser(
+        description="Recall vs latency of FAISS index types on the stored vectors"
+    )
+    parser.add_argument("--vector-db-path", default=VECTOR_DB_PATH)
+    parser.add_argument("--factories", nargs="+", default=["IVF256,Flat", "HNSW32"])
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[16, 64, 256])
+    args = parser.parse_args()
+
+    from utils.caches import IndexVersion
+
+    generation = IndexVersion(os.path.join(args.vector_db_path, "CURRENT")).current()
+    stored = read_index_mmap(
+        os.path.join(generation_path(args.vector_db_path, generation), "index.faiss")
+    )
+    print(
+        json.dumps(
+            recall_latency_report(
+                all_vectors(stored),
+                factories=args.factories,
+                k=args.k,
+                num_queries=args.queries,
+                nprobes=args.nprobe,
+                ef_searches=args.ef_search,
+            ),
+            indent=2,
+        )
+    )
@@ -1,7 +1,6 @@
 from abc import ABC, abstractmethod
 
 from langchain_core.language_models import BaseChatModel
-from langchain_google_genai import ChatGoogleGenerativeAI
 
 from utils.variables import GOOGLE_API_KEY
 
@@ -23,10 +22,13 @@ class GeminiLLMProvider(BaseLLMProvider):
     model_name = "gemini-1.5-flash"
 
     @classmethod
-    def get_llm(cls) -> ChatGoogleGenerativeAI:
+    def get_llm(cls) -> BaseChatModel:
         """
-        This method returns an instance of the ChatGoogleGenerativeAI model.
+        This method returns an instance of the ChatGoogleGenerativeAI model,
+        the Google GenAI SDK is only imported when Gemini is the configured LLM.
         """
+        from langchain_google_genai import ChatGoogleGenerativeAI
+
         return ChatGoogleGenerativeAI(
             model=cls.model_name,
             temperature=0.7,
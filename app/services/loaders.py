@@ -1,8 +1,20 @@
+import multiprocessing
+import threading
 from abc import ABC, abstractmethod
-from typing import List, Optional
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import islice
+from typing import Iterator, List, Optional
 
-from langchain.document_loaders import PyPDFLoader
+from langchain_community.document_loaders import PyPDFLoader
 from langchain_core.documents import Document
+from pypdf import PdfReader
+
+from utils.variables import (
+    PDF_LOADER_WORKERS,
+    PDF_SHARD_PAGES,
+    PDF_SHARDING_MIN_PAGES,
+)
 
 
 class BaseLoader(ABC):
@@ -18,6 +30,42 @@ class BaseLoader(ABC):
         """
         pass
 
+    @classmethod
+    def iter_docs(cls, doc_path: Optional[str] = None) -> Iterator[Document]:
+        """
+        Streaming variant of get_docs, loaders that can yield pages lazily should override it
+        :param doc_path:
+        :return: Iterator of Documents
+        """
+        yield from cls.get_docs(doc_path=doc_path)
+
+    @classmethod
+    def num_pages(cls, doc_path: str) -> Optional[int]:
+        """
+        Loaders that can load page ranges on their own override it together with iter_pages
+        :param doc_path:
+        :return: number of pages of the document, None when page ranges are not supported
+        """
+        return None
+
+    @classmethod
+    def iter_pages(
+        cls, doc_path: str, start: int = 0, end: Optional[int] = None
+    ) -> Iterator[Document]:
+        """
+        Yield the pages [start, end) of the document, the whole document when end is None
+        :param doc_path:
+        :return: Iterator of page Documents
+        """
+        yield from islice(cls.iter_docs(doc_path=doc_path), start, end)
+
+    @classmethod
+    def shutdown(cls) -> None:
+        """
+        Release resources shared across documents, e.g. loader processes
+        :return: None
+        """
+
 
 class PDFLoader(BaseLoader):
     @classmethod
@@ -36,3 +84,155 @@ class PDFLoader(BaseLoader):
 
         # return PDF loader of this instance
         return PyPDFLoader(doc_path).load()
+
+    @classmethod
+    def iter_docs(cls, doc_path: Optional[str] = None) -> Iterator[Document]:
+        """
+        Lazily yield one Document per PDF page
+        :param doc_path:
+        :return: Iterator of page Documents
+        """
+        if not doc_path:
+            raise ValueError(
+                "doc_path must be provided either during initialization or method call"
+            )
+        return PyPDFLoader(doc_path).lazy_load()
+
+    @classmethod
+    def num_pages(cls, doc_path: str) -> Optional[int]:
+        return len(PdfReader(doc_path).pages)
+
+    @classmethod
+    def iter_pages(
+        cls, doc_path: str, start: int = 0, end: Optional[int] = None
+    ) -> Iterator[Document]:
+        """
+        Extract the pages [start, end) without reading the pages before them
+        :param doc_path:
+        :return: Iterator of page Documents
+        """
+        if end is None:
+            end = cls.num_pages(doc_path)
+        return _iter_pages(doc_path, start, end)
+
+
+def _iter_pages(doc_path: str, start: int, end: int) -> Iterator[Document]:
+    """
+    Lazily extract the text of pages [start, end) of a PDF, one page at a time
+    :return: one Document per page with PyPDFLoader compatible metadata
+    """
+    reader = PdfReader(doc_path)
+    for page in range(start, end):
+        yield Document(
+            page_content=reader.pages[page].extract_text(),
+            metadata={"source": doc_path, "page": page},
+        )
+
+
+def _extract_pages(doc_path: str, start: int, end: int) -> List[Document]:
+    """
+    Extract the text of pages [start, end) of a PDF, run inside a loader worker process
+    :return: one Document per page with PyPDFLoader compatible metadata
+    """
+    return list(_iter_pages(doc_path, start, end))
+
+
+class ShardedPDFLoader(PDFLoader):
+    # loader processes shared by every document of this process, created on first use
+    _executor: Optional[ProcessPoolExecutor] = None
+    _executor_workers = 0
+    _executor_lock = threading.Lock()
+
+    @classmethod
+    def get_executor(cls, workers: int) -> ProcessPoolExecutor:
+        """
+        spawn is used so loader processes never fork a threaded parent holding torch
+        :param workers: number of loader processes
+        :return: the shared loader process pool
+        """
+        with cls._executor_lock:
+            if cls._executor is None or cls._executor_workers != workers:
+                if cls._executor is not None:
+                    cls._executor.shutdown(wait=False)
+                cls._executor = ProcessPoolExecutor(
+                    max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+                )
+                cls._executor_workers = workers
+            return cls._executor
+
+    @classmethod
+    def shutdown(cls) -> None:
+        with cls._executor_lock:
+            if cls._executor is not None:
+                cls._executor.shutdown(wait=True, cancel_futures=True)
+                cls._executor = None
+
+    @classmethod
+    def get_docs(
+        cls,
+        doc_path: Optional[str] = None,
+        workers: int = PDF_LOADER_WORKERS,
+        shard_pages: int = PDF_SHARD_PAGES,
+    ) -> List[Document]:
+        """
+        This method should be an Implementation of BaseLoader for large PDF documents.
+        The page range is split into shards of `shard_pages` pages extracted in a shared
+        spawn process pool;
+        at most `workers` shards are in flight, and pages are reassembled in page order.
+        Small documents are loaded serially, where process start-up would dominate.
+        :param doc_path:
+        :param workers: number of loader processes
+        :param shard_pages: number of pages per shard
+        :return: List of page Documents in page order
+        """
+        return list(
+            cls.iter_docs(doc_path=doc_path, workers=workers, shard_pages=shard_pages)
+        )
+
+    @classmethod
+    def iter_docs(
+        cls,
+        doc_path: Optional[str] = None,
+        workers: int = PDF_LOADER_WORKERS,
+        shard_pages: int = PDF_SHARD_PAGES,
+    ) -> Iterator[Document]:
+        """
+        Yield pages in page order as their shards finish extraction
+        :param doc_path:
+        :param workers: number of loader processes
+        :param shard_pages: number of pages per shard
+        :return: Iterator of page Documents
+        """
+        if not doc_path:
+            raise ValueError(
+                "doc_path must be provided either during initialization or method call"
+            )
+
+        num_pages = len(PdfReader(doc_path).pages)
+        if num_pages < PDF_SHARDING_MIN_PAGES or workers <= 1:
+            yield from _iter_pages(doc_path, 0, num_pages)
+            return
+
+        shards = [
+            (start, min(start + shard_pages, num_pages))
+            for start in range(0, num_pages, shard_pages)
+        ]
+        executor = cls.get_executor(workers)
+        # submit lazily so only `workers` shards of this document are held in memory at once
+        pending = []
+        try:
+            for start, end in shards:
+                pending.append(executor.submit(_extract_pages, doc_path, start, end))
+                if len(pending) >= workers:
+                    yield from pending.pop(0).result()
+            for future in pending:
+                yield from future.result()
+        except BrokenProcessPool:
+            # a crashed loader process breaks the pool, the next document gets a new one
+            with cls._executor_lock:
+                if cls._executor is executor:
+                    cls._executor = None
+            raise
+        finally:
+            for future in pending:
+                future.cancel()
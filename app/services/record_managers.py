@@ -0,0 +1,180 @@
+from typing import Any, Dict, List, Optional, Sequence
+
+from langchain.indexes import SQLRecordManager
+from langchain.indexes._sql_record_manager import UpsertionRecord
+from sqlalchemy import and_, create_engine, event, text
+
+# bound parameters per statement, under SQLite's historic limit of 999
+_MAX_PARAMS = 900
+
+
+def _batches(items: Sequence, size: int) -> List[Sequence]:
+    return [items[start : start + size] for start in range(0, len(items), size)]
+
+
+class PooledSQLRecordManager(SQLRecordManager):
+    """
+    Application-scoped SQLRecordManager, created once and shared by every ingest.
+    One pooled engine serves all sessions; on SQLite the database runs in WAL mode, so
+    dedup lookups of concurrent ingests (and of other workers) are not blocked by a
+    writer, and writers wait on a busy timeout instead of failing with "database is locked".
+    Upserts go out as multi-row statements, one transaction per ingest batch, and the
+    (namespace, group_id, updated_at) index serves incremental cleanup by source.
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        db_url: str,
+        pool_size: int = 8,
+        busy_timeout_ms: int = 30000,
+    ):
+        """
+        :param namespace: record manager namespace
+        :param db_url: SQLAlchemy database url
+        :param pool_size: connections kept open in the pool
+        :param busy_timeout_ms: time a SQLite writer waits for the write lock
+        """
+        engine_kwargs: Dict[str, Any] = {"pool_pre_ping": True}
+        if db_url.startswith("sqlite"):
+            engine_kwargs["connect_args"] = {"check_same_thread": False, "timeout": 30}
+        # in-memory SQLite keeps a single connection per thread, there is nothing to size
+        if ":memory:" not in db_url and db_url != "sqlite://":
+            engine_kwargs.update(pool_size=pool_size, max_overflow=pool_size)
+        super().__init__(
+            namespace=namespace, engine=create_engine(db_url, **engine_kwargs)
+        )
+
+        if self.dialect == "sqlite":
+
+            @event.listens_for(self.engine, "connect")
+            def _configure_sqlite(dbapi_connection, _):
+                cursor = dbapi_connection.cursor()
+                cursor.execute("PRAGMA journal_mode=WAL")
+                cursor.execute("PRAGMA synchronous=NORMAL")
+                cursor.execute(f"PRAGMA busy_timeout={busy_timeout_ms}")
+                cursor.close()
+
+    def create_schema(self) -> None:
+        """
+        Create the record table and the index used by incremental cleanup.
+        :return: None
+        """
+        super().create_schema()
+        with self.engine.begin() as connection:
+            connection.execute(
+                text(
+                    "CREATE INDEX IF NOT EXISTS ix_upsertion_record_namespace_group "
+                    "ON upsertion_record (namespace, group_id, updated_at)"
+                )
+            )
+
+    def update(
+        self,
+        keys: Sequence[str],
+        *,
+        group_ids: Optional[Sequence[Optional[str]]] = None,
+        time_at_least: Optional[float] = None,
+    ) -> None:
+        """
+        Upsert a batch of records in one transaction, split into statements that stay
+        within the bound parameter limit (one parameter per column and record, the
+        uuid primary key included).
+        """
+        if group_ids is None:
+            group_ids = [None] * len(keys)
+        if len(keys) != len(group_ids):
+            raise ValueError(
+                f"Number of keys ({len(keys)}) does not match number of "
+                f"group_ids ({len(group_ids)})"
+            )
+        if self.dialect != "sqlite":
+            return super().update(keys, group_ids=group_ids, time_at_least=time_at_least)
+
+        from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+        update_time = self.get_time()
+        if time_at_least and update_time < time_at_least:
+            raise AssertionError(f"Time sync issue: {update_time} < {time_at_least}")
+
+        records = [
+            {
+                "key": key,
+                "namespace": self.namespace,
+                "updated_at": update_time,
+                "group_id": group_id,
+            }
+            for key, group_id in zip(keys, group_ids)
+        ]
+        with self._make_session() as session:
+            for batch in _batches(
+                records, _MAX_PARAMS // len(UpsertionRecord.__table__.columns)
+            ):
+                statement = sqlite_insert(UpsertionRecord).values(batch)
+                session.execute(
+                    statement.on_conflict_do_update(
+                        [UpsertionRecord.key, UpsertionRecord.namespace],
+                        set_={
+                            "updated_at": statement.excluded.updated_at,
+                            "group_id": statement.excluded.group_id,
+                        },
+                    )
+                )
+            session.commit()
+
+    def exists(self, keys: Sequence[str]) -> List[bool]:
+        """
+        Dedup lookup on the (key, namespace) index, in parameter-bounded batches
+        """
+        found = set()
+        with self._make_session() as session:
+            for batch in _batches(list(keys), _MAX_PARAMS):
+                found.update(
+                    key
+                    for (key,) in session.query(UpsertionRecord.key).filter(
+                        and_(
+                            UpsertionRecord.key.in_(batch),
+                            UpsertionRecord.namespace == self.namespace,
+                        )
+                    )
+                )
+        return [key in found for key in keys]
+
+    def list_keys(
+        self,
+        *,
+        before: Optional[float] = None,
+        after: Optional[float] = None,
+        group_ids: Optional[Sequence[str]] = None,
+        limit: Optional[int] = None,
+    ) -> List[str]:
+        """
+        Select only the key column instead of loading whole records
+        """
+        with self._make_session() as session:
+            query = session.query(UpsertionRecord.key).filter(
+                UpsertionRecord.namespace == self.namespace
+            )
+            if after:
+                query = query.filter(UpsertionRecord.updated_at > after)
+            if before:
+                query = query.filter(UpsertionRecord.updated_at < before)
+            if group_ids:
+                query = query.filter(UpsertionRecord.group_id.in_(list(group_ids)))
+            if limit:
+                query = query.limit(limit)
+            return [key for (key,) in query]
+
+    def delete_keys(self, keys: Sequence[str]) -> None:
+        """
+        Delete records in parameter-bounded batches, in one transaction
+        """
+        with self._make_session() as session:
+            for batch in _batches(list(keys), _MAX_PARAMS):
+                session.query(UpsertionRecord).filter(
+                    and_(
+                        UpsertionRecord.key.in_(batch),
+                        UpsertionRecord.namespace == self.namespace,
+                    )
+                ).delete(synchronize_session=False)
+            session.commit()
@@ -0,0 +1,87 @@
+from abc import ABC, abstractmethod
+from typing import Any, List, Tuple
+
+from langchain_core.documents import Document
+
+from utils.variables import (
+    RERANK_BATCH_SIZE,
+    RERANK_MAX_CANDIDATES,
+    RERANK_MODEL_NAME,
+)
+
+
+class BaseReranker(ABC):
+    @classmethod
+    @abstractmethod
+    def get_reranker(cls) -> "BaseReranker":
+        """
+        This method should be implemented as a Base Reranker Provider
+        :return: a ready to use reranker instance
+        """
+        pass
+
+    @abstractmethod
+    def rerank(self, query: str, docs: List[Document]) -> List[Tuple[Document, float]]:
+        """
+        Order retrieved chunks by relevance to the query
+        :param query: user query
+        :param docs: retrieved chunks, best first
+        :return: (chunk, relevance score) pairs, most relevant first
+        """
+        pass
+
+
+class PassthroughReranker(BaseReranker):
+    @classmethod
+    def get_reranker(cls) -> "PassthroughReranker":
+        return cls()
+
+    def rerank(self, query: str, docs: List[Document]) -> List[Tuple[Document, float]]:
+        """
+        Keep the retrieval order, scores are 1 / rank
+        """
+        return [(doc, 1.0 / rank) for rank, doc in enumerate(docs, start=1)]
+
+
+class CrossEncoderReranker(BaseReranker):
+    def __init__(
+        self,
+        model: Any,
+        batch_size: int = RERANK_BATCH_SIZE,
+        max_candidates: int = RERANK_MAX_CANDIDATES,
+    ):
+        """
+        :param model: sentence-transformers CrossEncoder
+        :param batch_size: (query, chunk) pairs scored per forward pass
+        :param max_candidates: only the first max_candidates retrieved chunks are scored
+        """
+        self.model = model
+        self.batch_size = batch_size
+        self.max_candidates = max_candidates
+
+    @classmethod
+    def get_reranker(cls) -> "CrossEncoderReranker":
+        """
+        This method returns a local CPU cross-encoder, loaded once by the provider registry
+        """
+        from sentence_transformers import CrossEncoder
+
+        return cls(model=CrossEncoder(RERANK_MODEL_NAME, device="cpu"))
+
+    def rerank(self, query: str, docs: List[Document]) -> List[Tuple[Document, float]]:
+        """
+        Score (query, chunk) pairs jointly with the cross-encoder in batches
+        """
+        candidates = docs[: self.max_candidates]
+        if not candidates:
+            return []
+        scores = self.model.predict(
+            [(query, doc.page_content) for doc in candidates],
+            batch_size=self.batch_size,
+            show_progress_bar=False,
+        )
+        return sorted(
+            zip(candidates, (float(score) for score in scores)),
+            key=lambda pair: pair[1],
+            reverse=True,
+        )
@@ -0,0 +1,221 @@
+import asyncio
+import hashlib
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import BaseChatModel
+from langchain_core.prompts import PromptTemplate
+
+from services.embedding_cache import embed_queries
+from services.sparse_index import BM25Index
+from services.vectordbs import BaseVectorStore
+from utils.caches import LRUCache, normalize_query
+from utils.loggers import logger
+from utils.metrics import stage
+from utils.models import RetrievalFilter
+from utils.prompts import query_retriever_prompt
+
+
+def content_hash(doc: Document) -> str:
+    """
+    :return: hash identifying a chunk by its text, used to drop duplicate chunks
+    """
+    return hashlib.sha256(doc.page_content.encode("utf-8")).hexdigest()
+
+
+def reciprocal_rank_fusion(
+    result_lists: List[List[Document]],
+    rrf_k: int = 60,
+    weights: Optional[List[float]] = None,
+) -> List[Document]:
+    """
+    Merge ranked result lists with reciprocal-rank fusion, score = sum(w / (rrf_k + rank)),
+    keeping one copy of every chunk by content hash.
+    :param result_lists: ranked documents per sub-query and retriever
+    :param rrf_k: rank smoothing constant
+    :param weights: weight per result list, 1.0 each by default
+    :return: fused, de-duplicated documents, best first
+    """
+    weights = weights or [1.0] * len(result_lists)
+    scores: Dict[str, float] = {}
+    docs: Dict[str, Document] = {}
+    for results, weight in zip(result_lists, weights):
+        for rank, doc in enumerate(results, start=1):
+            key = content_hash(doc)
+            scores[key] = scores.get(key, 0.0) + weight / (rrf_k + rank)
+            docs.setdefault(key, doc)
+    return [docs[key] for key in sorted(scores, key=scores.get, reverse=True)]
+
+
+class FanOutRetriever:
+    """
+    Multi-query hybrid retrieval stage.
+    The LLM optionally rephrases the query, sub-queries missing in the query embedding cache
+    are embedded in one batch and searched concurrently in the vector store and, when given,
+    the BM25 index, and all dense and sparse result lists are merged with reciprocal-rank
+    fusion.
+    Rephrasings and per sub-query results are cached; result entries are keyed on the
+    index version so nothing retrieved before the latest ingest is served.
+    """
+
+    def __init__(
+        self,
+        llm: BaseChatModel,
+        embeddings: Embeddings,
+        vector_store: Callable[[], BaseVectorStore],
+        cache: LRUCache,
+        index_version: Callable[[], str],
+        num_queries: int,
+        k: int,
+        rrf_k: int = 60,
+        sparse_index: Optional[BM25Index] = None,
+        sparse_weight: float = 1.0,
+        run_io: Optional[Callable[..., Awaitable[Any]]] = None,
+    ):
+        """
+        :param llm: LLM generating the query rephrasings
+        :param embeddings: embedding model of the vector store
+        :param vector_store: returns the current vector store
+        :param cache: LRU cache for rephrasings and sub-query results
+        :param index_version: returns the current index version
+        :param num_queries: number of rephrasings generated per query
+        :param k: number of chunks retrieved per sub-query
+        :param rrf_k: reciprocal-rank fusion smoothing constant
+        :param sparse_index: BM25 index searched next to the vector store, None for dense only
+        :param sparse_weight: fusion weight of the BM25 result lists, dense lists weigh 1.0
+        :param run_io: runs blocking calls off the event loop, e.g. WorkerPool.run_io,
+            defaults to asyncio.to_thread
+        """
+        self.llm = llm
+        self.embeddings = embeddings
+        self.vector_store = vector_store
+        self.cache = cache
+        self.index_version = index_version
+        self.num_queries = num_queries
+        self.k = k
+        self.rrf_k = rrf_k
+        self.sparse_index = sparse_index
+        self.sparse_weight = sparse_weight
+        self.run_io = run_io or asyncio.to_thread
+        self.prompt = PromptTemplate.from_template(query_retriever_prompt)
+
+    async def rephrase(self, query: str) -> List[str]:
+        """
+        :param query: user query
+        :return: up to `num_queries` alternative versions of the query
+        """
+        key = ("rephrase", normalize_query(query), self.num_queries)
+        queries = self.cache.get(key)
+        if queries is None:
+            with stage("rephrase"):
+                message = await self.llm.ainvoke(
+                    self.prompt.format(question=query, num_queries=self.num_queries)
+                )
+            queries = [
+                line.strip()
+                for line in message.content.split("\n")
+                if line.strip()
+            ][: self.num_queries]
+            self.cache.put(key, queries)
+        return queries
+
+    async def aretrieve(
+        self,
+        query: str,
+        rephrase: bool = True,
+        k: Optional[int] = None,
+        filters: Optional[RetrievalFilter] = None,
+        query_embedding: Optional[List[float]] = None,
+    ) -> List[Document]:
+        """
+        :param query: user query
+        :param rephrase: generate LLM rephrasings, disable for latency-sensitive callers
+        :param k: number of chunks per sub-query, defaults to the configured k
+        :param filters: optional metadata filters pushed down into the vector store
+        :param query_embedding: embedding of the query when the caller already computed it
+        :return: fused, de-duplicated documents, best first
+        """
+        k = k or self.k
+        queries = [query]
+        if rephrase and self.num_queries > 0:
+            queries += await self.rephrase(query)
+
+        # identical sub-queries are searched once
+        queries = list({normalize_query(q): q for q in queries}.values())
+        version = self.index_version()
+        filter_key = filters.model_dump_json() if filters else None
+        keys = [
+            ("search", normalize_query(q), k, filter_key, version) for q in queries
+        ]
+        results = [self.cache.get(key) for key in keys]
+
+        missing = [i for i, docs in enumerate(results) if docs is None]
+        if missing:
+            with stage("retrieve"):
+                # queries[0] is the user query
+                known = {0: query_embedding} if query_embedding is not None else {}
+                to_embed = [i for i in missing if i not in known]
+                if to_embed:
+                    embedded = await self.run_io(
+                        embed_queries, self.embeddings, [queries[i] for i in to_embed]
+                    )
+                    known.update(zip(to_embed, embedded))
+                vectors = [known[i] for i in missing]
+                vector_store = self.vector_store()
+                searched = await asyncio.gather(
+                    *(
+                        self.run_io(
+                            vector_store.search_by_vector, vector, k=k, filters=filters
+                        )
+                        for vector in vectors
+                    )
+                )
+                for i, docs in zip(missing, searched):
+                    results[i] = docs
+                    self.cache.put(keys[i], docs)
+
+        weights = [1.0] * len(results)
+        if self.sparse_index is not None:
+            with stage("sparse_retrieve"):
+                results += await self._sparse_retrieve(
+                    queries, k, filters, filter_key, version
+                )
+            weights += [self.sparse_weight] * len(queries)
+
+        logger.debug(
+            f"Fan-out retrieval: {len(queries)} sub-queries, {len(missing)} searched"
+        )
+        return reciprocal_rank_fusion(results, rrf_k=self.rrf_k, weights=weights)
+
+    async def _sparse_retrieve(
+        self,
+        queries: List[str],
+        k: int,
+        filters: Optional[RetrievalFilter],
+        filter_key: Optional[str],
+        version: str,
+    ) -> List[List[Document]]:
+        """
+        BM25 result list per sub-query, hits are resolved to chunks through the vector store
+        """
+        keys = [("bm25", normalize_query(q), k, filter_key, version) for q in queries]
+        results = [self.cache.get(key) for key in keys]
+        missing = [i for i, docs in enumerate(results) if docs is None]
+        if missing:
+            hits = await asyncio.gather(
+                *(
+                    self.run_io(
+                        self.sparse_index.search, queries[i], k=k, filters=filters
+                    )
+                    for i in missing
+                )
+            )
+            ids = list(dict.fromkeys(doc_id for hit in hits for doc_id, _ in hit))
+            docs = dict(
+                zip(ids, await self.run_io(self.vector_store().get_documents, ids))
+            )
+            for i, hit in zip(missing, hits):
+                results[i] = [docs[doc_id] for doc_id, _ in hit if docs[doc_id]]
+                self.cache.put(keys[i], results[i])
+        return results
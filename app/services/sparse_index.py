@@ -0,0 +1,396 @@
+import heapq
+import math
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter
+import uuid
+from typing import Any, Iterable, Iterator, List, Optional, Tuple, Type
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+from utils.loggers import logger
+from utils.metrics import stage
+from utils.models import RetrievalFilter
+
+# words, numbers and joined identifiers such as "AB-1234", "4.2.1" or "ISO_9001"
+_TOKEN = re.compile(r"[0-9a-z]+(?:[-_./:][0-9a-z]+)*")
+_SEPARATOR = re.compile(r"[-_./:]")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lower-cased terms of a text; joined identifiers are kept whole and also split
+    into their parts, so "AB-1234" is found by "AB-1234", "ab 1234" and "1234"
+    :param text: chunk or query text
+    :return: terms in order, with repetitions
+    """
+    terms = []
+    for token in _TOKEN.findall(text.lower()):
+        terms.append(token)
+        parts = _SEPARATOR.split(token)
+        if len(parts) > 1:
+            terms.extend(parts)
+    return terms
+
+
+class BM25Index:
+    """
+    Sparse inverted index over the ingested chunks, scored with Okapi BM25.
+    Postings, document frequencies and chunk lengths live in SQLite next to the record
+    manager, so the index is updated incrementally with every ingest and shared by all
+    workers. Chunk ids are the record manager / vector store ids, so hits are resolved
+    through the vector store and stale chunks are removed with the same ids.
+    Search cost is bounded by the query, not the corpus: terms found in most chunks are
+    skipped and only the highest term frequency postings of each term are read.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        k1: float = 1.2,
+        b: float = 0.75,
+        max_df_ratio: float = 0.5,
+        min_docs_for_df_cutoff: int = 1000,
+        max_postings: int = 2000,
+    ):
+        """
+        :param db_path: Path of the SQLite file holding the index
+        :param k1: term frequency saturation
+        :param b: document length normalisation
+        :param max_df_ratio: query terms in more than this fraction of the chunks are
+            skipped, unless every query term is; the rarest one is searched then
+        :param min_docs_for_df_cutoff: smaller indexes search every query term, in a
+            few chunks most terms exceed max_df_ratio
+        :param max_postings: postings read per query term, highest term frequency first
+        """
+        self.db_path = db_path
+        self.k1 = k1
+        self.b = b
+        self.max_df_ratio = max_df_ratio
+        self.min_docs_for_df_cutoff = min_docs_for_df_cutoff
+        self.max_postings = max_postings
+        self._lock = threading.Lock()
+        self._schema_ready = False
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._schema_ready:
+            self.create_schema()
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def create_schema(self) -> None:
+        """
+        Create the index tables if they do not exist yet.
+        :return: None
+        """
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        with sqlite3.connect(self.db_path, timeout=30) as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS bm25_docs (
+                    id TEXT PRIMARY KEY,
+                    source TEXT,
+                    domain TEXT,
+                    page INTEGER,
+                    length INTEGER NOT NULL
+                )
+                """
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS bm25_postings (term TEXT NOT NULL, "
+                "doc_id TEXT NOT NULL, tf INTEGER NOT NULL, PRIMARY KEY (term, doc_id)) "
+                "WITHOUT ROWID"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS ix_bm25_postings_doc_id ON bm25_postings (doc_id)"
+            )
+            # impact order: the top postings of a term are read without a sort
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS ix_bm25_postings_tf "
+                "ON bm25_postings (term, tf DESC)"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS bm25_terms (term TEXT PRIMARY KEY, df INTEGER NOT NULL)"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS bm25_stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL)"
+            )
+            connection.execute(
+                "INSERT OR IGNORE INTO bm25_stats (name, value) "
+                "VALUES ('num_docs', 0), ('total_length', 0)"
+            )
+        self._schema_ready = True
+
+    @staticmethod
+    def _delete(connection: sqlite3.Connection, ids: List[str]) -> int:
+        deleted = 0
+        for doc_id in ids:
+            row = connection.execute(
+                "SELECT length FROM bm25_docs WHERE id = ?", (doc_id,)
+            ).fetchone()
+            if row is None:
+                continue
+            terms = [
+                (term,)
+                for (term,) in connection.execute(
+                    "SELECT term FROM bm25_postings WHERE doc_id = ?", (doc_id,)
+                )
+            ]
+            connection.executemany(
+                "UPDATE bm25_terms SET df = df - 1 WHERE term = ?", terms
+            )
+            connection.execute("DELETE FROM bm25_postings WHERE doc_id = ?", (doc_id,))
+            connection.execute("DELETE FROM bm25_docs WHERE id = ?", (doc_id,))
+            connection.execute(
+                "UPDATE bm25_stats SET value = value - CASE name "
+                "WHEN 'num_docs' THEN 1 ELSE ? END",
+                (row[0],),
+            )
+            deleted += 1
+        connection.execute("DELETE FROM bm25_terms WHERE df <= 0")
+        return deleted
+
+    def add(self, ids: List[str], docs: List[Document]) -> None:
+        """
+        Index chunks, replacing chunks already indexed under the same id.
+        :param ids: vector store ids of the chunks
+        :param docs: chunks
+        :return: None
+        """
+        with self._lock, self._connect() as connection:
+            self._delete(connection, ids)
+            total_length = 0
+            for doc_id, doc in zip(ids, docs):
+                counts = Counter(tokenize(doc.page_content))
+                length = sum(counts.values())
+                page = doc.metadata.get("page")
+                connection.execute(
+                    "INSERT INTO bm25_docs (id, source, domain, page, length) VALUES (?, ?, ?, ?, ?)",
+                    (
+                        doc_id,
+                        doc.metadata.get("source"),
+                        doc.metadata.get("domain"),
+                        page if isinstance(page, int) else None,
+                        length,
+                    ),
+                )
+                connection.executemany(
+                    "INSERT INTO bm25_postings (term, doc_id, tf) VALUES (?, ?, ?)",
+                    [(term, doc_id, tf) for term, tf in counts.items()],
+                )
+                connection.executemany(
+                    "INSERT INTO bm25_terms (term, df) VALUES (?, 1) "
+                    "ON CONFLICT (term) DO UPDATE SET df = df + 1",
+                    [(term,) for term in counts],
+                )
+                total_length += length
+            connection.execute(
+                "UPDATE bm25_stats SET value = value + CASE name "
+                "WHEN 'num_docs' THEN ? ELSE ? END",
+                (len(ids), total_length),
+            )
+
+    def delete(self, ids: Iterable[str]) -> int:
+        """
+        :param ids: vector store ids, ids not in the index are ignored
+        :return: number of removed chunks
+        """
+        with self._lock, self._connect() as connection:
+            return self._delete(connection, list(ids))
+
+    def count(self) -> int:
+        with self._connect() as connection:
+            return connection.execute(
+                "SELECT value FROM bm25_stats WHERE name = 'num_docs'"
+            ).fetchone()[0]
+
+    @staticmethod
+    def _filter_clause(filters: Optional[RetrievalFilter]) -> Tuple[str, List[Any]]:
+        if filters is None:
+            return "", []
+        clauses, params = [], []
+        for column in ("domain", "source"):
+            value = getattr(filters, column)
+            if value is not None:
+                clauses.append(f"d.{column} = ?")
+                params.append(value)
+        if filters.page_start is not None:
+            clauses.append("d.page >= ?")
+            params.append(filters.page_start)
+        if filters.page_end is not None:
+            clauses.append("d.page <= ?")
+            params.append(filters.page_end)
+        return "".join(f" AND {clause}" for clause in clauses), params
+
+    def search(
+        self, query: str, k: int, filters: Optional[RetrievalFilter] = None
+    ) -> List[Tuple[str, float]]:
+        """
+        BM25 search, the filters are applied while reading the postings.
+        Common terms are skipped and at most `max_postings` postings per term are read,
+        so the cost does not grow with the corpus.
+        :param query: query text
+        :param k: number of chunks to return
+        :param filters: optional domain / source / page range filters
+        :return: (chunk id, BM25 score) pairs, best first
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        where, params = self._filter_clause(filters)
+        scores = Counter()
+        with self._connect() as connection:
+            num_docs, total_length = (
+                value
+                for _, value in connection.execute(
+                    "SELECT name, value FROM bm25_stats ORDER BY name"
+                )
+            )
+            if not num_docs:
+                return []
+            avg_length = total_length / num_docs
+            dfs = sorted(
+                (df, term)
+                for term, df in connection.execute(
+                    f"SELECT term, df FROM bm25_terms WHERE term IN "
+                    f"({', '.join('?' * len(terms))})",
+                    terms,
+                )
+            )
+            searched = dfs
+            if num_docs >= self.min_docs_for_df_cutoff:
+                searched = [
+                    (df, term) for df, term in dfs if df <= self.max_df_ratio * num_docs
+                ] or dfs[:1]
+            for df, term in searched:
+                idf = math.log(1 + (num_docs - df + 0.5) / (df + 0.5))
+                for doc_id, tf, length in connection.execute(
+                    "SELECT p.doc_id, p.tf, d.length FROM bm25_postings p "
+                    "JOIN bm25_docs d ON d.id = p.doc_id WHERE p.term = ?"
+                    + where
+                    + " ORDER BY p.tf DESC LIMIT ?",
+                    [term, *params, self.max_postings],
+                ):
+                    norm = self.k1 * (1 - self.b + self.b * length / avg_length)
+                    scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+
+class SparseIndexingVDB(VectorStore):
+    """
+    langchain VectorStore wrapper used as the index() write target: every chunk written to
+    or deleted from the vector store is written to or deleted from the BM25 index as well,
+    when one is given. Both writes are timed as their own pipeline stages.
+    """
+
+    def __init__(self, vdb: VectorStore, sparse_index: Optional[BM25Index]):
+        self.vdb = vdb
+        self.sparse_index = sparse_index
+
+    @property
+    def embeddings(self):
+        return self.vdb.embeddings
+
+    def add_documents(
+        self, documents: List[Document], ids: Optional[List[str]] = None, **kwargs
+    ) -> List[str]:
+        with stage("vector_write"):
+            ids = self.vdb.add_documents(documents, ids=ids, **kwargs)
+        if self.sparse_index is not None:
+            with stage("sparse_write"):
+                self.sparse_index.add(ids, documents)
+        return ids
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        **kwargs,
+    ) -> List[str]:
+        texts = list(texts)
+        metadatas = metadatas or [{} for _ in texts]
+        return self.add_documents(
+            [Document(page_content=t, metadata=m) for t, m in zip(texts, metadatas)],
+            ids=ids,
+            **kwargs,
+        )
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs) -> Optional[bool]:
+        with stage("vector_write"):
+            deleted = self.vdb.delete(ids, **kwargs)
+        if ids and self.sparse_index is not None:
+            with stage("sparse_write"):
+                self.sparse_index.delete(ids)
+        return deleted
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs) -> List[Document]:
+        return self.vdb.similarity_search(query, k=k, **kwargs)
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        *,
+        vdb_class: Type[VectorStore],
+        sparse_index: Optional[BM25Index] = None,
+        ids: Optional[List[str]] = None,
+        **kwargs,
+    ) -> "SparseIndexingVDB":
+        """
+        Build a `vdb_class` vector store from the texts and index the same chunks in BM25
+        :param vdb_class: langchain vector store class to build, e.g. FAISS
+        :param sparse_index: BM25 index written along, None for a plain vector store
+        :param ids: chunk ids, generated when not given
+        :return: wrapper over the new vector store
+        """
+        texts = list(texts)
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [str(uuid.uuid4()) for _ in texts]
+        with stage("vector_write"):
+            vdb = vdb_class.from_texts(
+                texts, embedding, metadatas=metadatas, ids=ids, **kwargs
+            )
+        if sparse_index is not None:
+            with stage("sparse_write"):
+                sparse_index.add(
+                    ids,
+                    [Document(page_content=t, metadata=m) for t, m in zip(texts, metadatas)],
+                )
+        return cls(vdb=vdb, sparse_index=sparse_index)
+
+
+def backfill(
+    sparse_index: BM25Index,
+    documents: Iterator[Tuple[str, Document]],
+    batch_size: int = 500,
+) -> int:
+    """
+    Index chunks ingested before the BM25 index existed.
+    :param sparse_index: BM25 index to fill
+    :param documents: (vector store id, chunk) pairs
+    :param batch_size: chunks committed per transaction
+    :return: number of indexed chunks
+    """
+    indexed = 0
+    batch = []
+    for doc_id, doc in documents:
+        # placeholder documents of the vector stores have no source
+        if doc.metadata.get("source") is None:
+            continue
+        batch.append((doc_id, doc))
+        if len(batch) >= batch_size:
+            sparse_index.add(*map(list, zip(*batch)))
+            indexed += len(batch)
+            batch = []
+    if batch:
+        sparse_index.add(*map(list, zip(*batch)))
+        indexed += len(batch)
+    logger.info(f"Backfilled BM25 index with {indexed} chunks")
+    return indexed
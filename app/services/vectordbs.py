@@ -1,13 +1,49 @@
+import fcntl
+import hashlib
+import heapq
 import os
+import pickle
+import re
+import shutil
+import threading
+import time
+import uuid
 from abc import ABC, abstractmethod
-from typing import Any
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from itertools import chain
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Type
 
-from langchain.schema import Document
-from langchain.vectorstores import FAISS, Chroma
+import numpy as np
+from langchain_community.vectorstores import FAISS, Chroma
+from langchain_core.documents import Document
 from langchain_core.embeddings import Embeddings
 from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import VectorStore
 
 from utils.loggers import logger
+from utils.models import RetrievalFilter
+from services.docstores import SQLiteDocstore, chunk_metadata, fetch_documents
+from services.faiss_indexes import (
+    PositionalFAISS,
+    all_vectors,
+    build_index,
+    generation_path,
+    is_flat,
+    read_index_mmap,
+    set_search_params,
+)
+from utils.caches import IndexVersion
+from utils.variables import (
+    FAISS_INDEX_FACTORY,
+    FAISS_KEEP_GENERATIONS,
+    FAISS_MMAP_SERVING,
+    FAISS_TRAIN_MIN_VECTORS,
+    SHARD_SEARCH_WORKERS,
+    VECTOR_SHARD_BUCKETS,
+    VECTOR_SHARD_BY,
+)
 
 
 ### Works only for Local Storage - VectorDB Indexes ###
@@ -20,15 +56,66 @@ class BaseVectorStore(ABC):
         """
         self.embeddings = embeddings
         self.vector_db_path = vector_db_path
+        self._vdb = None
 
     @abstractmethod
+    def load_vdb(self) -> Any:
+        """
+        Abstract method to open the vector database from local storage
+        :return: vector database instance
+        """
+        pass
+
     def get_vdb(self) -> Any:
         """
-        Abstract method to retrieve the vector database instance
-        :return: FAISS vector database instance
+        Retrieve the open vector database handle, loading it on first use only.
+        :return: vector database instance
+        """
+        if self._vdb is None:
+            self._vdb = self.load_vdb()
+        return self._vdb
+
+    @abstractmethod
+    def persist(self) -> None:
+        """
+        Abstract method to flush the open vector database handle to local storage
+        :return: None
         """
         pass
 
+    def refresh(self) -> Any:
+        """
+        Drop the open vector database handle and re-open it from local storage.
+        Used after out-of-band writes so readers see the latest index.
+        :return: vector database instance
+        """
+        self._vdb = None
+        return self.get_vdb()
+
+    def sync(self) -> None:
+        """
+        Drop open handles that are older than the index on local storage, so the next
+        write starts from the latest index. Stores persisted by their backend need nothing.
+        :return: None
+        """
+        pass
+
+    @contextmanager
+    def write_lock(self) -> Iterator[None]:
+        """
+        Inter-process write lock of the store, held across syncing to the latest index,
+        writing and persisting, so writes of other uvicorn workers are never overwritten.
+        :return: context manager holding the lock
+        """
+        os.makedirs(self.vector_db_path, exist_ok=True)
+        with open(os.path.join(self.vector_db_path, "WRITE.lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                self.sync()
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
     @abstractmethod
     def get_vdb_as_retriever(self) -> BaseRetriever:
         """
@@ -37,15 +124,138 @@ class BaseVectorStore(ABC):
         """
         pass
 
+    @abstractmethod
+    def search_by_vector_with_score(
+        self, vector: List[float], k: int, filters: Optional[RetrievalFilter] = None
+    ) -> List[Tuple[Document, float]]:
+        """
+        Abstract method for similarity search restricted to chunks matching the filters,
+        implementations push the filters down so cost scales with the filtered subset
+        :param vector: query embedding
+        :param k: number of documents to return
+        :param filters: optional domain / source / page range filters
+        :return: most similar documents with their L2 distance, closest first
+        """
+        pass
+
+    def search_by_vector(
+        self, vector: List[float], k: int, filters: Optional[RetrievalFilter] = None
+    ) -> List[Document]:
+        """
+        Similarity search restricted to chunks matching the filters
+        :param vector: query embedding
+        :param k: number of documents to return
+        :param filters: optional domain / source / page range filters
+        :return: most similar documents
+        """
+        return [
+            doc for doc, _ in self.search_by_vector_with_score(vector, k, filters)
+        ]
+
+    @abstractmethod
+    def get_documents(self, ids: List[str]) -> List[Optional[Document]]:
+        """
+        Abstract method fetching chunks by vector id
+        :param ids: vector ids, as assigned by the record manager
+        :return: chunks in the order of ids, None for unknown ids
+        """
+        pass
+
+    def iter_documents(self, batch_size: int = 500) -> Iterator[Tuple[str, Document]]:
+        """
+        :param batch_size: chunks fetched per call
+        :return: (vector id, chunk) of every stored chunk
+        """
+        ids = list(self.list_records())
+        for start in range(0, len(ids), batch_size):
+            batch = ids[start : start + batch_size]
+            for doc_id, doc in zip(batch, self.get_documents(batch)):
+                if doc is not None:
+                    yield doc_id, doc
+
+    @abstractmethod
+    def list_records(self) -> Dict[str, Optional[str]]:
+        """
+        Abstract method listing every stored chunk
+        :return: vector id -> source of the chunk
+        """
+        pass
+
+    @abstractmethod
+    def delete_ids(self, ids: List[str]) -> int:
+        """
+        Abstract method deleting chunks by vector id, ids not in this store are ignored
+        :param ids: vector ids, as assigned by the record manager
+        :return: number of deleted chunks
+        """
+        pass
+
+    @abstractmethod
+    def count(self) -> int:
+        """
+        :return: number of vectors in the store
+        """
+        pass
+
+    def compact(self) -> int:
+        """
+        Drop the placeholder document once real chunks exist and persist the store.
+        :return: number of vectors after compaction
+        """
+        placeholders = [
+            doc_id for doc_id, source in self.list_records().items() if source is None
+        ]
+        if placeholders and self.count() > len(placeholders):
+            self.delete_ids(placeholders)
+        self.persist()
+        return self.count()
+
+    def destroy(self) -> None:
+        """
+        Close the vector database handle and delete it from local storage.
+        :return: None
+        """
+        self._vdb = None
+        shutil.rmtree(self.vector_db_path, ignore_errors=True)
+
 
 class FAISSVectorStore(BaseVectorStore):
-    def __init__(self, embeddings: Embeddings, vector_db_path: str):
+    """
+    FAISS index saved in immutable generations under `<vector_db_path>/generations`.
+    Every persist writes a new generation and then atomically moves the CURRENT pointer,
+    so readers never see a half-written index and writers never wait for readers.
+    Writers of all processes serialize on `write_lock`, which reloads the writable
+    handle when another process published a newer generation.
+    In serving mode searches use a separate memory-mapped, read-only handle that is
+    swapped when the pointer moves; the writable in-memory handle is only loaded to ingest.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        vector_db_path: str,
+        index_factory: str = FAISS_INDEX_FACTORY,
+        mmap_serving: bool = FAISS_MMAP_SERVING,
+    ):
         """
         Initialize the FAISSVectorStore class.
         :param embeddings: Embedding model to be used for document embeddings.
         :param vector_db_path: Path where the vector database is stored.
+        :param index_factory: faiss.index_factory description of the trained index
+        :param mmap_serving: search a memory-mapped, read-only handle of the current generation
         """
         super().__init__(embeddings=embeddings, vector_db_path=vector_db_path)
+        self.index_factory = index_factory
+        self.mmap_serving = mmap_serving
+        self.generation = IndexVersion(path=os.path.join(vector_db_path, "CURRENT"))
+        # shared by all generations: rows are appended, deletes are tombstones
+        self.docstore_path = os.path.join(vector_db_path, "docstore.sqlite")
+        # generation the writable handle was loaded from or last published as
+        self._vdb_generation: Optional[str] = None
+        self._reader: Optional[Tuple[str, FAISS]] = None
+        self._reader_lock = threading.Lock()
+        self._metadata_index: Optional[Tuple[FAISS, Dict, Dict]] = None
+        self._metadata_lock = threading.Lock()
         self.ensure_vector_db_exists()
 
     def ensure_vector_db_exists(self):
@@ -77,20 +287,61 @@ class FAISSVectorStore(BaseVectorStore):
             )
         ]
         faiss_db = FAISS.from_documents(documents=dummy_doc, embedding=self.embeddings)
-        faiss_db.save_local(self.vector_db_path)
+        self._publish(faiss_db)
         logger.debug(
             f"Vector database initialized at {self.vector_db_path} with a dummy document."
         )
 
-    def get_vdb(self) -> FAISS:
+    def _use_sqlite_docstore(self, vdb: FAISS) -> None:
+        """
+        Move the chunks of a new or pre-SQLite store out of its InMemoryDocstore.
+        """
+        if isinstance(vdb.docstore, SQLiteDocstore):
+            return
+        docstore = SQLiteDocstore(db_path=self.docstore_path)
+        docstore.add(
+            {
+                doc_id: vdb.docstore.search(doc_id)
+                for doc_id in vdb.index_to_docstore_id.values()
+            }
+        )
+        vdb.docstore = docstore
+
+    def _publish(self, vdb: FAISS) -> str:
+        """
+        Save the index as a new generation, then atomically point CURRENT at it.
+        Older generations beyond FAISS_KEEP_GENERATIONS are removed; processes still
+        mapping them keep reading the unlinked files until they swap. Chunks deleted
+        before the oldest remaining generation are purged from the docstore.
+        :return: the new generation
         """
-        Retrieve the FAISS vector database from the local path.
+        self._use_sqlite_docstore(vdb)
+        generation = str(time.time_ns())
+        vdb.save_local(generation_path(self.vector_db_path, generation))
+        self.generation.bump(generation)
+
+        generations_dir = os.path.join(self.vector_db_path, "generations")
+        old = sorted(
+            (name for name in os.listdir(generations_dir) if name != generation),
+            key=int,
+        )
+        removed = old[: max(len(old) - FAISS_KEEP_GENERATIONS + 1, 0)]
+        for name in removed:
+            shutil.rmtree(os.path.join(generations_dir, name), ignore_errors=True)
+        oldest = min(old[len(removed) :] + [generation], key=int)
+        vdb.docstore.purge(deleted_before=int(oldest))
+        return generation
+
+    def load_vdb(self) -> FAISS:
+        """
+        Load the writable FAISS vector database of the current generation.
         If the vector database does not exist, initialize it with a dummy document.
         :return: FAISS vector database instance loaded from the local storage.
         """
+        generation = self.generation.current()
         try:
-            return FAISS.load_local(
-                folder_path=self.vector_db_path,
+            vdb = PositionalFAISS.load_local(
+                folder_path=generation_path(self.vector_db_path, generation),
                 embeddings=self.embeddings,
                 allow_dangerous_deserialization=True,
             )
@@ -99,11 +350,46 @@ class FAISSVectorStore(BaseVectorStore):
                 f"Error loading vector database: {e}. Reinitializing with a dummy document."
             )
             self.initialize_with_dummy_document()
-            return FAISS.load_local(
-                folder_path=self.vector_db_path,
+            generation = self.generation.current()
+            vdb = PositionalFAISS.load_local(
+                folder_path=generation_path(self.vector_db_path, generation),
                 embeddings=self.embeddings,
                 allow_dangerous_deserialization=True,
             )
+        set_search_params(vdb.index)
+        self._use_sqlite_docstore(vdb)
+        self._vdb_generation = generation
+        return vdb
+
+    def get_reader(self) -> FAISS:
+        """
+        Search handle. In serving mode the current generation is opened memory-mapped and
+        read-only, so uvicorn worker processes share its pages through the page cache.
+        The handle is only re-opened when the CURRENT pointer moves; in-flight searches
+        finish on the handle they started with.
+        :return: FAISS vector database instance
+        """
+        if not self.mmap_serving:
+            return self.get_vdb()
+        generation = self.generation.current()
+        with self._reader_lock:
+            if self._reader is None or self._reader[0] != generation:
+                path = generation_path(self.vector_db_path, generation)
+                index = read_index_mmap(os.path.join(path, "index.faiss"))
+                set_search_params(index)
+                with open(os.path.join(path, "index.pkl"), "rb") as docstore_file:
+                    docstore, index_to_docstore_id = pickle.load(docstore_file)
+                self._reader = (
+                    generation,
+                    PositionalFAISS(
+                        embedding_function=self.embeddings,
+                        index=index,
+                        docstore=docstore,
+                        index_to_docstore_id=index_to_docstore_id,
+                    ),
+                )
+                logger.debug(f"Serving FAISS generation {generation} memory-mapped")
+            return self._reader[1]
 
     def add_docs_to_vector_db(self, docs):
         """
@@ -112,20 +398,191 @@ class FAISSVectorStore(BaseVectorStore):
         :return: None
         """
         vector_store = self.get_vdb()
-        vector_store.index()
-        vector_store.add_documents(documents=docs, embedding=self.embeddings)
-        vector_store.save_local(self.vector_db_path)
+        vector_store.add_documents(documents=docs)
+        self.persist()
         logger.debug("Documents added to the vector database.")
 
+    def persist(self) -> None:
+        """
+        Publish the open FAISS index as a new generation, first converting a flat index
+        to FAISS_INDEX_FACTORY once it holds FAISS_TRAIN_MIN_VECTORS vectors.
+        :return: None
+        """
+        vdb = self.get_vdb()
+        if (
+            self.index_factory != "Flat"
+            and is_flat(vdb.index)
+            and vdb.index.ntotal >= FAISS_TRAIN_MIN_VECTORS
+        ):
+            self.train_index()
+        self._vdb_generation = self._publish(vdb)
+        # writes may have added, removed or re-numbered vectors
+        self._metadata_index = None
+
+    def sync(self) -> None:
+        """
+        Drop the writable handle if another process published a newer generation,
+        call under `write_lock` before writing.
+        :return: None
+        """
+        if self._vdb is not None and self._vdb_generation != self.generation.current():
+            logger.debug("Reloading FAISS index changed by another worker")
+            self._vdb = None
+            self._metadata_index = None
+
+    def refresh(self) -> FAISS:
+        """
+        Pick up a generation published by another worker. The writable handle is
+        dropped and only re-loaded by the next write.
+        :return: search handle of the current generation
+        """
+        self._vdb = None
+        self._metadata_index = None
+        return self.get_reader()
+
+    def train_index(self, factory: Optional[str] = None) -> None:
+        """
+        Rebuild the open index as an approximate-nearest-neighbour index, trained on a
+        sample of the stored vectors. Vector positions, and so the docstore mapping, are kept.
+        :param factory: faiss.index_factory description, defaults to FAISS_INDEX_FACTORY
+        :return: None
+        """
+        factory = factory or self.index_factory
+        vdb = self.get_vdb()
+        start = time.perf_counter()
+        vdb.index = build_index(
+            all_vectors(vdb.index), factory, metric=vdb.index.metric_type
+        )
+        logger.info(
+            f"Trained FAISS {factory} index over {vdb.index.ntotal} vectors "
+            f"in {time.perf_counter() - start:.2f}s"
+        )
+
+    def _get_metadata_index(self, vdb: FAISS) -> Tuple[Dict, Dict]:
+        """
+        Lazily built allowlist index over FAISS vector positions:
+        (field, value) -> positions for domain / source, and position -> page
+        :return: (positions by field value, page by position)
+        """
+        with self._metadata_lock:
+            if self._metadata_index is None or self._metadata_index[0] is not vdb:
+                by_value = defaultdict(set)
+                pages = {}
+                metadata = chunk_metadata(
+                    vdb.docstore, vdb.index_to_docstore_id.values()
+                )
+                for position, doc_id in vdb.index_to_docstore_id.items():
+                    source, domain, page = metadata.get(doc_id, (None, None, None))
+                    by_value[("source", source)].add(position)
+                    by_value[("domain", domain)].add(position)
+                    pages[position] = page
+                self._metadata_index = (vdb, by_value, pages)
+            return self._metadata_index[1:]
+
+    def _allowed_positions(self, vdb: FAISS, filters: RetrievalFilter) -> np.ndarray:
+        by_value, pages = self._get_metadata_index(vdb)
+        candidates = None
+        for field in ("domain", "source"):
+            value = getattr(filters, field)
+            if value is not None:
+                positions = by_value.get((field, value), set())
+                candidates = positions if candidates is None else candidates & positions
+        if candidates is None:
+            candidates = pages.keys()
+        if filters.page_start is not None or filters.page_end is not None:
+            low = filters.page_start if filters.page_start is not None else float("-inf")
+            high = filters.page_end if filters.page_end is not None else float("inf")
+            candidates = [
+                position
+                for position in candidates
+                if pages[position] is not None and low <= pages[position] <= high
+            ]
+        return np.fromiter(sorted(candidates), dtype=np.int64)
+
+    def search_by_vector_with_score(
+        self, vector: List[float], k: int, filters: Optional[RetrievalFilter] = None
+    ) -> List[Tuple[Document, float]]:
+        """
+        Similarity search over the FAISS index; filters become an ID allowlist
+        (IDSelectorBatch) so only vectors of matching chunks are scored.
+        :param vector: query embedding
+        :param k: number of documents to return
+        :param filters: optional domain / source / page range filters
+        :return: most similar documents with their L2 distance, closest first
+        """
+        import faiss
+
+        vdb = self.get_reader()
+        query = np.asarray([vector], dtype=np.float32)
+        if vdb._normalize_L2:
+            faiss.normalize_L2(query)
+        if filters is None or filters.is_empty():
+            distances, ids = vdb.search_positions(query, k)
+        else:
+            positions = self._allowed_positions(vdb, filters)
+            if not len(positions):
+                return []
+            distances, ids = vdb.search_positions(
+                query, min(k, len(positions)), allowed=positions
+            )
+        hits = [
+            (vdb.index_to_docstore_id[position], float(distance))
+            for position, distance in zip(ids[0], distances[0])
+            if position != -1
+        ]
+        docs = fetch_documents(vdb.docstore, [doc_id for doc_id, _ in hits])
+        return [
+            (doc, distance)
+            for doc, (_, distance) in zip(docs, hits)
+            if doc is not None
+        ]
+
+    def get_documents(self, ids: List[str]) -> List[Optional[Document]]:
+        return fetch_documents(self.get_reader().docstore, ids)
+
+    def list_records(self) -> Dict[str, Optional[str]]:
+        vdb = self.get_vdb()
+        metadata = chunk_metadata(vdb.docstore, vdb.index_to_docstore_id.values())
+        return {
+            doc_id: metadata.get(doc_id, (None,))[0]
+            for doc_id in vdb.index_to_docstore_id.values()
+        }
+
+    def delete_ids(self, ids: List[str]) -> int:
+        vdb = self.get_vdb()
+        # FAISS.delete rejects unknown ids
+        stored = set(vdb.index_to_docstore_id.values())
+        present = [doc_id for doc_id in ids if doc_id in stored]
+        if present:
+            vdb.delete(present)
+            self._metadata_index = None
+        return len(present)
+
+    def count(self) -> int:
+        # HNSW tombstones are still counted by ntotal
+        return len(self.get_reader().index_to_docstore_id)
+
+    def compact(self) -> int:
+        """
+        Additionally drop docstore entries no vector refers to any more.
+        :return: number of vectors after compaction
+        """
+        vdb = self.get_vdb()
+        referenced = set(vdb.index_to_docstore_id.values())
+        vdb.docstore.delete(
+            [doc_id for doc_id, *_ in vdb.docstore.metadata() if doc_id not in referenced]
+        )
+        return super().compact()
+
     def get_vdb_as_retriever(self):
         """
         Retrieve the FAISS vector database as a retriever.
         :return: A retriever object based on the vector database.
         """
-        return self.get_vdb().as_retriever()
+        return self.get_reader().as_retriever()
 
 
-class ChromaVectorStore:
+class ChromaVectorStore(BaseVectorStore):
     def __init__(
         self,
         embeddings: Embeddings,
@@ -138,8 +595,7 @@ class ChromaVectorStore:
         :param vector_db_path: Path where the Chroma database is stored.
         :param collection_name: Name of the Chroma collection.
         """
-        self.embeddings = embeddings
-        self.vector_db_path = vector_db_path
+        super().__init__(embeddings=embeddings, vector_db_path=vector_db_path)
         self.collection_name = collection_name
 
         # Ensure Chroma database exists
@@ -183,9 +639,9 @@ class ChromaVectorStore:
             f"Chroma database initialized at {self.vector_db_path} with a dummy document."
         )
 
-    def get_vdb(self) -> Chroma:
+    def load_vdb(self) -> Chroma:
         """
-        Retrieve the Chroma database. If the database does not exist, initialize it with a dummy document.
+        Open the Chroma database. If the database does not exist, initialize it with a dummy document.
         :return: Chroma database instance.
         """
         try:
@@ -212,12 +668,433 @@ class ChromaVectorStore:
         """
         chroma_db = self.get_vdb()
         chroma_db.add_documents(documents=docs)
-        chroma_db.persist()
+        self.persist()
         logger.debug("Documents added to the Chroma database.")
 
+    def persist(self) -> None:
+        """
+        Flush the open Chroma collection to the local path.
+        """
+        self.get_vdb().persist()
+
     def get_vdb_as_retriever(self):
         """
         Retrieve the Chroma database as a retriever.
         :return: A retriever object based on the database.
         """
         return self.get_vdb().as_retriever()
+
+    @staticmethod
+    def build_where(filters: Optional[RetrievalFilter]) -> Optional[Dict[str, Any]]:
+        """
+        Translate retrieval filters into a Chroma `where` clause.
+        :param filters: optional domain / source / page range filters
+        :return: where clause, or None without filters
+        """
+        if filters is None:
+            return None
+        conditions = []
+        if filters.domain is not None:
+            conditions.append({"domain": filters.domain})
+        if filters.source is not None:
+            conditions.append({"source": filters.source})
+        if filters.page_start is not None:
+            conditions.append({"page": {"$gte": filters.page_start}})
+        if filters.page_end is not None:
+            conditions.append({"page": {"$lte": filters.page_end}})
+        if not conditions:
+            return None
+        return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+    def search_by_vector_with_score(
+        self, vector: List[float], k: int, filters: Optional[RetrievalFilter] = None
+    ) -> List[Tuple[Document, float]]:
+        """
+        Similarity search with the filters pushed down as a Chroma `where` clause.
+        :param vector: query embedding
+        :param k: number of documents to return
+        :param filters: optional domain / source / page range filters
+        :return: most similar documents with their L2 distance, closest first
+        """
+        return self.get_vdb().similarity_search_by_vector_with_relevance_scores(
+            vector, k=k, filter=self.build_where(filters)
+        )
+
+    def get_documents(self, ids: List[str]) -> List[Optional[Document]]:
+        records = self.get_vdb().get(ids=list(ids), include=["documents", "metadatas"])
+        found = {
+            doc_id: Document(id=doc_id, page_content=text, metadata=metadata or {})
+            for doc_id, text, metadata in zip(
+                records["ids"], records["documents"], records["metadatas"]
+            )
+        }
+        return [found.get(doc_id) for doc_id in ids]
+
+    def list_records(self) -> Dict[str, Optional[str]]:
+        records = self.get_vdb().get(include=["metadatas"])
+        return {
+            doc_id: (metadata or {}).get("source")
+            for doc_id, metadata in zip(records["ids"], records["metadatas"])
+        }
+
+    def delete_ids(self, ids: List[str]) -> int:
+        vdb = self.get_vdb()
+        present = vdb.get(ids=list(ids), include=[])["ids"]
+        if present:
+            vdb.delete(ids=present)
+        return len(present)
+
+    def count(self) -> int:
+        return self.get_vdb()._collection.count()
+
+    def destroy(self) -> None:
+        if self._vdb is not None:
+            self._vdb.delete_collection()
+        super().destroy()
+
+
+class ShardedVDB(VectorStore):
+    """
+    langchain VectorStore facade over the shards of a ShardedVectorStore, used as the
+    index() write target: added chunks are routed to the shard of their metadata,
+    deletes go to whichever shard holds the id.
+    """
+
+    def __init__(self, store: "ShardedVectorStore"):
+        self.store = store
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.store.embeddings
+
+    def add_documents(
+        self, documents: List[Document], ids: Optional[List[str]] = None, **kwargs
+    ) -> List[str]:
+        ids = ids or [str(uuid.uuid4()) for _ in documents]
+        groups: Dict[str, Tuple[List[Document], List[str]]] = defaultdict(
+            lambda: ([], [])
+        )
+        for doc, doc_id in zip(documents, ids):
+            group = groups[self.store.shard_for(doc.metadata)]
+            group[0].append(doc)
+            group[1].append(doc_id)
+        for name, (docs, doc_ids) in groups.items():
+            self.store.get_shard(name, create=True).get_vdb().add_documents(
+                docs, ids=doc_ids
+            )
+            self.store.mark_dirty(name)
+        return ids
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        **kwargs,
+    ) -> List[str]:
+        texts = list(texts)
+        metadatas = metadatas or [{} for _ in texts]
+        return self.add_documents(
+            [Document(page_content=t, metadata=m) for t, m in zip(texts, metadatas)],
+            ids=ids,
+        )
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs) -> Optional[bool]:
+        if not ids:
+            return False
+        for name, shard in self.store.shards().items():
+            if shard.delete_ids(ids):
+                self.store.mark_dirty(name)
+        return True
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs) -> List[Document]:
+        return self.store.search_by_vector(self.embeddings.embed_query(query), k=k)
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        *,
+        store: "ShardedVectorStore",
+        ids: Optional[List[str]] = None,
+        **kwargs,
+    ) -> "ShardedVDB":
+        """
+        Add the texts to the shards of `store`, creating shards as needed.
+        Shards embed with the store's embedding model, `embedding` must be the same.
+        :param store: sharded store the chunks are written to
+        :param ids: chunk ids, generated when not given
+        :return: facade over the store
+        """
+        if embedding is not store.embeddings:
+            raise ValueError("Shards embed with the embedding model of the sharded store")
+        vdb = cls(store)
+        vdb.add_texts(texts, metadatas=metadatas, ids=ids)
+        return vdb
+
+
+class ShardedVectorStore(BaseVectorStore):
+    """
+    Vector store split into independent shards, one per domain or per source hash bucket,
+    each a full `shard_class` store under `<vector_db_path>/shards/<name>`.
+    Searches run on the shards the filters can match, in parallel, and the per-shard
+    top-k lists are merged by distance. Shards are created on first write and can be
+    listed, compacted and dropped individually.
+    """
+
+    shard_class: Type[BaseVectorStore]
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        vector_db_path: str,
+        shard_by: str = VECTOR_SHARD_BY,
+        num_buckets: int = VECTOR_SHARD_BUCKETS,
+        search_workers: int = SHARD_SEARCH_WORKERS,
+    ):
+        """
+        :param embeddings: Embedding model to be used for document embeddings
+        :param vector_db_path: Path under which the shards are stored
+        :param shard_by: "domain" for one shard per domain, "hash" for source hash buckets
+        :param num_buckets: number of hash buckets when shard_by="hash"
+        :param search_workers: threads searching shards in parallel
+        """
+        if shard_by not in ("domain", "hash"):
+            raise ValueError(f"Unknown shard key: {shard_by}")
+        super().__init__(embeddings=embeddings, vector_db_path=vector_db_path)
+        self.shard_by = shard_by
+        self.num_buckets = num_buckets
+        self.shards_path = os.path.join(vector_db_path, "shards")
+        self._shards: Dict[str, BaseVectorStore] = {}
+        self._dirty = set()
+        self._lock = threading.RLock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=search_workers, thread_name_prefix="shard-search"
+        )
+        self._discover()
+
+    @staticmethod
+    def shard_name(value: str) -> str:
+        """
+        :return: file system safe shard name
+        """
+        return re.sub(r"[^A-Za-z0-9_.-]", "_", value).strip(".") or "default"
+
+    def shard_for(self, metadata: Dict[str, Any]) -> str:
+        """
+        :param metadata: chunk metadata
+        :return: name of the shard the chunk belongs to
+        """
+        if self.shard_by == "domain":
+            return self.shard_name(metadata.get("domain") or "default")
+        source = str(metadata.get("source", ""))
+        bucket = int(hashlib.sha1(source.encode("utf-8")).hexdigest(), 16)
+        return f"bucket-{bucket % self.num_buckets:03d}"
+
+    def _shard_names_for(self, filters: Optional[RetrievalFilter]) -> List[str]:
+        """
+        Shard pruning: a domain (or source, with hash buckets) filter maps to one shard
+        """
+        if filters is not None:
+            if self.shard_by == "domain" and filters.domain is not None:
+                return [self.shard_for({"domain": filters.domain})]
+            if self.shard_by == "hash" and filters.source is not None:
+                return [self.shard_for({"source": filters.source})]
+        return list(self.shards())
+
+    def _discover(self) -> None:
+        """
+        Sync the open shard handles with the shard folders on disk,
+        which other workers may have created or dropped.
+        """
+        os.makedirs(self.shards_path, exist_ok=True)
+        names = {
+            name
+            for name in os.listdir(self.shards_path)
+            if os.path.isdir(os.path.join(self.shards_path, name))
+        }
+        with self._lock:
+            for name in set(self._shards) - names:
+                del self._shards[name]
+            for name in names - set(self._shards):
+                self._shards[name] = self._open_shard(name)
+
+    def _open_shard(self, name: str) -> BaseVectorStore:
+        return self.shard_class(
+            embeddings=self.embeddings,
+            vector_db_path=os.path.join(self.shards_path, name),
+        )
+
+    def shards(self) -> Dict[str, BaseVectorStore]:
+        """
+        :return: shard name -> open shard
+        """
+        with self._lock:
+            return dict(self._shards)
+
+    def get_shard(self, name: str, create: bool = False) -> BaseVectorStore:
+        """
+        :param name: shard name
+        :param create: create the shard if it does not exist
+        :raises KeyError: if the shard does not exist and create is False
+        :return: open shard
+        """
+        with self._lock:
+            if name not in self._shards:
+                if not create:
+                    raise KeyError(name)
+                logger.info(f"Creating vector store shard {name}")
+                self._shards[name] = self._open_shard(name)
+            return self._shards[name]
+
+    def mark_dirty(self, name: str) -> None:
+        with self._lock:
+            self._dirty.add(name)
+
+    def load_vdb(self) -> ShardedVDB:
+        return ShardedVDB(self)
+
+    def persist(self) -> None:
+        """
+        Persist only the shards written since the last persist.
+        :return: None
+        """
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+        for name in dirty:
+            shard = self.shards().get(name)
+            if shard is not None:
+                shard.persist()
+
+    def sync(self) -> None:
+        """
+        Pick up shards created or dropped by other workers and sync every shard,
+        the lock of the sharded store covers all of its shards.
+        :return: None
+        """
+        self._discover()
+        for shard in self.shards().values():
+            shard.sync()
+
+    def refresh(self) -> ShardedVDB:
+        self._discover()
+        for shard in self.shards().values():
+            shard.refresh()
+        return self.get_vdb()
+
+    def get_vdb_as_retriever(self) -> BaseRetriever:
+        return self.get_vdb().as_retriever()
+
+    def search_by_vector_with_score(
+        self, vector: List[float], k: int, filters: Optional[RetrievalFilter] = None
+    ) -> List[Tuple[Document, float]]:
+        """
+        Scatter-gather search: the relevant shards are searched in parallel with the
+        filters pushed down into each, then the top-k are merged by distance.
+        :param vector: query embedding
+        :param k: number of documents to return
+        :param filters: optional domain / source / page range filters
+        :return: most similar documents with their L2 distance, closest first
+        """
+        shards = self.shards()
+        targets = [shards[name] for name in self._shard_names_for(filters) if name in shards]
+        if len(targets) == 1:
+            results = [targets[0].search_by_vector_with_score(vector, k, filters)]
+        else:
+            results = self._executor.map(
+                lambda shard: shard.search_by_vector_with_score(vector, k, filters),
+                targets,
+            )
+        # every shard carries its own placeholder document
+        candidates = [
+            (doc, score)
+            for doc, score in chain.from_iterable(results)
+            if doc.metadata.get("source") is not None
+        ]
+        return heapq.nsmallest(k, candidates, key=lambda pair: pair[1])
+
+    def get_documents(self, ids: List[str]) -> List[Optional[Document]]:
+        docs = [None] * len(ids)
+        for shard in self.shards().values():
+            missing = [i for i, doc in enumerate(docs) if doc is None]
+            if not missing:
+                break
+            for i, doc in zip(missing, shard.get_documents([ids[i] for i in missing])):
+                docs[i] = doc
+        return docs
+
+    def list_records(self) -> Dict[str, Optional[str]]:
+        records = {}
+        for shard in self.shards().values():
+            records.update(shard.list_records())
+        return records
+
+    def delete_ids(self, ids: List[str]) -> int:
+        return sum(shard.delete_ids(ids) for shard in self.shards().values())
+
+    def count(self) -> int:
+        return sum(shard.count() for shard in self.shards().values())
+
+    def compact(self) -> int:
+        return sum(shard.compact() for shard in self.shards().values())
+
+    ### Shard administration ###
+
+    def shard_info(self, name: str) -> Dict[str, Any]:
+        """
+        :param name: shard name
+        :raises KeyError: if the shard does not exist
+        :return: name, folder and vector count of the shard
+        """
+        shard = self.get_shard(name)
+        return {"name": name, "path": shard.vector_db_path, "num_vectors": shard.count()}
+
+    def list_shards(self) -> List[Dict[str, Any]]:
+        """
+        :return: name, folder and vector count of every shard
+        """
+        return [self.shard_info(name) for name in sorted(self.shards())]
+
+    def create_shard(self, name: str) -> str:
+        """
+        Create an empty shard ahead of ingest.
+        :param name: shard name, a domain or bucket name
+        :return: name of the new (or existing) shard
+        """
+        name = self.shard_name(name)
+        self.get_shard(name, create=True)
+        return name
+
+    def compact_shard(self, name: str) -> int:
+        """
+        :param name: shard name
+        :raises KeyError: if the shard does not exist
+        :return: number of vectors in the shard after compaction
+        """
+        return self.get_shard(name).compact()
+
+    def drop_shard(self, name: str) -> Dict[str, Optional[str]]:
+        """
+        Delete a shard and its folder, leaving every other shard untouched.
+        :param name: shard name
+        :raises KeyError: if the shard does not exist
+        :return: vector id -> source of every dropped chunk
+        """
+        with self._lock:
+            shard = self.get_shard(name)
+            records = shard.list_records()
+            shard.destroy()
+            del self._shards[name]
+            self._dirty.discard(name)
+        logger.info(f"Dropped vector store shard {name} with {len(records)} vectors")
+        return records
+
+
+class ShardedFAISSVectorStore(ShardedVectorStore):
+    shard_class = FAISSVectorStore
+
+
+class ShardedChromaVectorStore(ShardedVectorStore):
+    shard_class = ChromaVectorStore
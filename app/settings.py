@@ -1,7 +1,17 @@
-from utils.enums import Embeddings, LLMModels, VectorStores
+from utils.enums import (
+    Chunkers,
+    Embeddings,
+    LLMModels,
+    Loaders,
+    Rerankers,
+    VectorStores,
+)
 
 settings = {
     "LLM": LLMModels.GEMINI,
     "VECTOR_STORE": VectorStores.CHROMA,
     "EMBEDDINGS": Embeddings.HUGGINGFACE,
+    "LOADER": Loaders.SHARDED_PDF,
+    "RERANKER": Rerankers.CROSS_ENCODER,
+    "CHUNKER": Chunkers.RECURSIVE,
 }
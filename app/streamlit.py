@@ -42,6 +42,13 @@ with tab2:
     st.header("Chat with PDF")
     query = st.text_area("Enter your query:")
 
+    with st.expander("Filters (optional)"):
+        filter_domain = st.text_input("Only search domain")
+        filter_source = st.text_input("Only search source document")
+        page_col1, page_col2 = st.columns(2)
+        filter_page_start = page_col1.number_input("From page", min_value=0, value=None, step=1)
+        filter_page_end = page_col2.number_input("To page", min_value=0, value=None, step=1)
+
     if st.button("Get Response"):
         if query:
             messages_payload = st.session_state.get('messages',[])
@@ -51,31 +58,68 @@ with tab2:
 
             logging.info(f"Sending request: {request_payload}")
             response = requests.post(
-                f"{FASTAPI_URL}/chat-with-pdf:latest", data={"query": request_payload}
+                f"{FASTAPI_URL}/chat-with-pdf:stream",
+                data={
+                    "query": request_payload,
+                    **{
+                        name: value
+                        for name, value in {
+                            "domain": filter_domain,
+                            "source": filter_source,
+                            "page_start": filter_page_start,
+                            "page_end": filter_page_end,
+                        }.items()
+                        if value not in (None, "")
+                    },
+                },
+                stream=True,
             )
 
             if response.status_code == 200:
-                chat_response = response.json()
-                messages_payload.append(
-                    {"role": "ai", "content": chat_response["response"]}
-                )
-                st.session_state.messages = messages_payload
-                logging.info(
-                    f"Message History : {request_payload}"
-                )
-
-                logging.info(f"Received response: {chat_response}")
-
-                st.success("Response Received!")
-                st.markdown(f"**Response:**\n{chat_response['response']}")
-
-                if chat_response.get("citations"):
-                    st.markdown("### 📖 Citations:")
-                    for doc in chat_response["citations"]:
-                        st.write(f"📄 {doc}")
-
-                if chat_response.get("domain"):
-                    st.markdown(f"### 🌍 Domain: **{chat_response['domain']}**")
+                st.markdown("**Response:**")
+                placeholder = st.empty()
+                streamed_text = ""
+                chat_response, error_detail = None, None
+
+                # server-sent events -> "event: <name>" / "data: <json>" lines
+                event = None
+                for line in response.iter_lines(decode_unicode=True):
+                    if line.startswith("event:"):
+                        event = line[len("event:"):].strip()
+                    elif line.startswith("data:"):
+                        data = json.loads(line[len("data:"):])
+                        if event == "token":
+                            streamed_text += data["text"]
+                            placeholder.markdown(streamed_text)
+                        elif event == "final":
+                            chat_response = data
+                        elif event == "error":
+                            error_detail = data.get("detail", "Unknown error")
+
+                if chat_response is None:
+                    logging.error(f"Error from API: {error_detail}")
+                    st.error(f"Error: {error_detail}")
+                else:
+                    placeholder.markdown(chat_response["response"])
+                    messages_payload.append(
+                        {"role": "ai", "content": chat_response["response"]}
+                    )
+                    st.session_state.messages = messages_payload
+                    logging.info(
+                        f"Message History : {request_payload}"
+                    )
+
+                    logging.info(f"Received response: {chat_response}")
+
+                    st.success("Response Received!")
+
+                    if chat_response.get("citations"):
+                        st.markdown("### 📖 Citations:")
+                        for doc in chat_response["citations"]:
+                            st.write(f"📄 {doc}")
+
+                    if chat_response.get("domain"):
+                        st.markdown(f"### 🌍 Domain: **{chat_response['domain']}**")
             else:
                 error_detail = response.json().get("detail", "Unknown error")
                 logging.error(f"Error from API: {error_detail}")
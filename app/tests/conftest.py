@@ -0,0 +1,61 @@
+import os
+import sys
+
+# modules import each other relative to app/, as when the app is started from there
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from services.record_managers import PooledSQLRecordManager
+from services.sparse_index import BM25Index
+from services.vectordbs import FAISSVectorStore
+from utils.answer_cache import SemanticAnswerCache
+from utils.enums import VectorStores
+from utils.file_hashes import FileHashStore
+from utils.helpers import ChatService
+
+
+class LocalRegistry:
+    """Stand-in for ProviderRegistry keeping every store of an ingest under one folder"""
+
+    def __init__(self, path):
+        self.vector_store = FAISSVectorStore(
+            embeddings=DeterministicFakeEmbedding(size=8),
+            vector_db_path=str(path / "vectors"),
+            index_factory="Flat",
+            mmap_serving=False,
+        )
+        self.record_manager = PooledSQLRecordManager(
+            namespace="test", db_url=f"sqlite:///{path / 'records.sql'}"
+        )
+        self.record_manager.create_schema()
+        self.sparse_index = BM25Index(db_path=str(path / "bm25.sql"))
+        self.answer_cache = SemanticAnswerCache(
+            db_path=str(path / "answers.sql"),
+            threshold=0.95,
+            max_entries=10,
+            ttl_seconds=3600,
+        )
+        self.file_hashes = FileHashStore(db_path=str(path / "file_hashes.sql"))
+        self.versions = 0
+
+    def get_vector_store(self, backend=None) -> FAISSVectorStore:
+        return self.vector_store
+
+    def get_record_manager(self) -> PooledSQLRecordManager:
+        return self.record_manager
+
+    def bump_index_version(self, backend=None) -> int:
+        self.versions += 1
+        return self.versions
+
+
+@pytest.fixture
+def chat(tmp_path) -> ChatService:
+    return ChatService(
+        llm=None,
+        embeddings=None,
+        vectorstore=VectorStores.FAISS,
+        registry=LocalRegistry(tmp_path),
+    )
@@ -0,0 +1,56 @@
+from utils.answer_cache import SemanticAnswerCache
+
+
+def make_cache(tmp_path, **kwargs) -> SemanticAnswerCache:
+    options = {"threshold": 0.95, "max_entries": 10, "ttl_seconds": 3600}
+    options.update(kwargs)
+    return SemanticAnswerCache(db_path=str(tmp_path / "answers.sql"), **options)
+
+
+def answer(text: str) -> dict:
+    return {"response": text, "citations": []}
+
+
+def test_similar_queries_hit_and_others_miss(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.put("pump?", [1.0, 0.0], answer("pump"), sources=["docs/a.pdf"])
+    assert cache.lookup([0.99, 0.01]) == answer("pump")
+    assert cache.lookup([0.0, 1.0]) is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_invalidating_a_source_drops_answers_citing_it(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.put("pump?", [1.0, 0.0], answer("pump"), sources=["docs/a.pdf", "docs/b.pdf"])
+    cache.put("valve?", [0.0, 1.0], answer("valve"), sources=["docs/c.pdf"])
+    assert cache.invalidate_sources(["docs/b.pdf", "docs/unknown.pdf"]) == 1
+    assert cache.lookup([1.0, 0.0]) is None
+    assert cache.lookup([0.0, 1.0]) == answer("valve")
+    assert cache.invalidate_sources([]) == 0
+
+
+def test_invalidation_reaches_other_workers(tmp_path):
+    first, second = make_cache(tmp_path), make_cache(tmp_path)
+    first.put("pump?", [1.0, 0.0], answer("pump"), sources=["docs/a.pdf"])
+    assert second.lookup([1.0, 0.0]) == answer("pump")
+    first.invalidate_sources(["docs/a.pdf"])
+    assert second.lookup([1.0, 0.0]) is None
+
+
+def test_expired_and_evicted_answers_are_not_served(tmp_path):
+    expired = make_cache(tmp_path, ttl_seconds=-1)
+    expired.put("pump?", [1.0, 0.0], answer("pump"), sources=["docs/a.pdf"])
+    assert expired.lookup([1.0, 0.0]) is None
+
+    cache = make_cache(tmp_path, max_entries=1)
+    cache.put("pump?", [1.0, 0.0], answer("pump"), sources=["docs/a.pdf"])
+    cache.put("valve?", [0.0, 1.0], answer("valve"), sources=["docs/b.pdf"])
+    assert cache.lookup([1.0, 0.0]) is None
+    assert cache.stats()["size"] == 1
+
+
+def test_answers_without_citations_are_not_cached(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.put("pump?", [1.0, 0.0], answer("I don't know"), sources=[])
+    assert cache.lookup([1.0, 0.0]) is None
+    assert cache.stats()["size"] == 0
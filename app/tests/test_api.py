@@ -0,0 +1,180 @@
+import asyncio
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+from langchain_core.documents import Document
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+
+import main
+from benchmark import synthetic_pdf
+from services.rerankers import PassthroughReranker
+from utils.jobs import IngestJobStore
+from utils.workers import WorkerPool
+
+
+class OffLoopJobStore(IngestJobStore):
+    """Job store refusing to be used from the event loop thread"""
+
+    def _connect(self):
+        with pytest.raises(RuntimeError):
+            asyncio.get_running_loop()
+        return super()._connect()
+
+
+class AnsweringRegistry:
+    """Registry stand-in retrieving fixed chunks and answering with a fixed LLM output"""
+
+    def __init__(self, docs, output: str):
+        self.docs = docs
+        self.llm = GenericFakeChatModel(messages=iter([AIMessage(content=output)]))
+
+    def get_retriever(self):
+        return self
+
+    async def aretrieve(self, query, **kwargs):
+        return self.docs
+
+    def get_reranker(self):
+        return PassthroughReranker()
+
+    def get_llm(self):
+        return self.llm
+
+
+def sse_events(body: str):
+    events = []
+    for message in body.strip().split("\n\n"):
+        event, data = message.split("\n")
+        events.append((event[len("event: "):], json.loads(data[len("data: "):])))
+    return events
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch, chat):
+    # the app's lifespan is not run: no provider warm-up, the stores live in tmp_path
+    workers = WorkerPool(process_workers=1, thread_workers=4, max_pending=4)
+    workers.startup()
+    job_store = OffLoopJobStore(db_path=str(tmp_path / "jobs.sql"))
+    job_store.create_schema()
+    monkeypatch.setattr(main, "workers", workers)
+    monkeypatch.setattr(main, "chat", chat)
+    monkeypatch.setattr(main, "job_store", job_store)
+    monkeypatch.setattr(main, "JOBS_SPOOL_DIR", str(tmp_path / "spool"))
+    yield TestClient(main.route)
+    workers.shutdown(wait=True)
+
+
+def test_job_endpoints_keep_the_job_table_off_the_event_loop(client):
+    pdf = synthetic_pdf([["Pumps and valves"]])
+    response = client.post(
+        "/jobs/upload-pdf",
+        files={"file": ("a.pdf", pdf, "application/pdf")},
+        data={"domain": "hr"},
+    )
+    assert response.status_code == 202
+    job = response.json()
+    assert (job["status"], job["filename"], job["domain"]) == ("queued", "a.pdf", "hr")
+    assert client.get(f"/jobs/{job['job_id']}").json()["status"] == "queued"
+    assert client.get("/jobs/unknown").status_code == 404
+
+
+def stream_chat(client, monkeypatch, output: str):
+    docs = [
+        Document(page_content=text, metadata={"source": source, "domain": domain})
+        for text, source, domain in [
+            ("Valves leak", "docs/hr/a.pdf", "hr"),
+            ("Pumps daily", "docs/ops/b.pdf", "ops"),
+        ]
+    ]
+    monkeypatch.setattr(main, "registry", AnsweringRegistry(docs, output))
+    monkeypatch.setattr(main, "ANSWER_CACHE_ENABLED", False)
+    response = client.post("/chat-with-pdf:stream", data={"query": "how often?"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    return sse_events(response.text)
+
+
+def test_stream_sends_answer_tokens_then_the_cited_answer(client, monkeypatch):
+    events = stream_chat(
+        client, monkeypatch, '{"response": "Pumps are inspected daily.", "doc_ids": [2]}'
+    )
+    tokens = [data["text"] for event, data in events if event == "token"]
+    assert len(tokens) > 1 and "".join(tokens) == "Pumps are inspected daily."
+    assert events[-1] == (
+        "final",
+        {
+            "response": "Pumps are inspected daily.",
+            "citations": [{"source": "docs/ops/b.pdf", "domain": "ops"}],
+        },
+    )
+
+
+def test_stream_reports_errors_as_an_event(client, monkeypatch):
+    events = stream_chat(client, monkeypatch, '{"response": "No ids", "doc_ids": [7]}')
+    assert events[-1][0] == "error"
+    assert "Invalid Response of Unique ID" in events[-1][1]["detail"]
+
+
+def test_metrics_endpoint_reports_request_latency_and_caches(client):
+    client.get("/")
+    response = client.get("/metrics")
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    lines = response.text.splitlines()
+    count = 'chatpdf_request_duration_seconds_count{route="/",method="GET",status="200"} '
+    assert [int(line[len(count):]) >= 1 for line in lines if line.startswith(count)] == [
+        True
+    ]
+    assert 'chatpdf_cache_hits_total{cache="retrieval"} 0' in lines
+
+
+class WarmUpRegistry:
+    def __init__(self, error: str = None):
+        self.error = error
+        self.warmup_seconds = {}
+
+    def startup(self):
+        if self.error:
+            raise RuntimeError(self.error)
+        self.warmup_seconds = {"embeddings": 0.5, "vector_store": 0.25}
+
+
+class InlineWarmUpWorkers:
+    async def run_io(self, fn, *args):
+        return fn(*args)
+
+    async def warm_up(self, *modules):
+        pass
+
+
+class StubJobRunner:
+    started = False
+
+    async def start(self):
+        self.started = True
+
+
+@pytest.mark.parametrize("error", [None, "model not found"])
+def test_ready_reports_503_until_the_warm_up_succeeded(client, monkeypatch, error):
+    monkeypatch.setattr(
+        main,
+        "startup_report",
+        {"status": "warming_up", "error": None, "warmup_seconds": {}},
+    )
+    assert client.get("/ready").status_code == 503
+    monkeypatch.setattr(main, "registry", WarmUpRegistry(error))
+    monkeypatch.setattr(main, "workers", InlineWarmUpWorkers())
+    monkeypatch.setattr(main, "job_runner", StubJobRunner())
+    asyncio.run(main._warm_up())
+    # the job runner starts either way, queued jobs then load the providers on first use
+    assert main.job_runner.started
+    response = client.get("/ready")
+    report = response.json()
+    if error:
+        assert response.status_code == 503
+        assert (report["status"], report["error"]) == ("failed", error)
+    else:
+        assert response.status_code == 200 and report["status"] == "ready"
+        assert set(report["warmup_seconds"]) == {"embeddings", "vector_store", "process_pool"}
+    assert report["import_seconds"] > 0
@@ -0,0 +1,125 @@
+import asyncio
+import io
+import os
+import zipfile
+
+import pytest
+
+from utils.bulk import BulkFile, BulkIngestor, member_name
+from utils.helpers import ChatService
+
+
+def make_ingestor(tmp_path, max_files=10, max_uncompressed_bytes=1000) -> BulkIngestor:
+    return BulkIngestor(
+        chat=None,
+        workers=None,
+        spool_dir=str(tmp_path / "spool"),
+        concurrency=1,
+        batch_size=10,
+        max_files=max_files,
+        max_uncompressed_bytes=max_uncompressed_bytes,
+    )
+
+
+def make_zip(tmp_path, members) -> str:
+    path = str(tmp_path / "upload.zip")
+    with zipfile.ZipFile(path, "w") as archive:
+        for name, content in members.items():
+            archive.writestr(name, content)
+    return path
+
+
+def spooled(tmp_path) -> list:
+    spool_dir = tmp_path / "spool"
+    return os.listdir(spool_dir) if spool_dir.exists() else []
+
+
+def test_member_names_are_normalised():
+    assert member_name("docs\\a/../b.PDF") == "docs/b.PDF"
+    assert member_name("../evil.pdf") is None
+    assert member_name("__MACOSX/docs/a.pdf") is None
+    assert member_name("docs/.hidden.pdf") is None
+    assert member_name("docs/readme.txt") is None
+
+
+def test_bulk_sources_follow_the_single_upload_rule():
+    bulk_file = BulkFile(filename="a/x.pdf", domain="hr")
+    assert bulk_file.source == ChatService.upload_source("a/x.pdf", "hr") == "docs/hr/a/x.pdf"
+    assert ChatService.upload_source("..\\a\\x.pdf", "hr") == "docs/hr/a/x.pdf"
+
+
+class Upload:
+    def __init__(self, filename: str, path: str):
+        self.filename = filename
+        self.file = open(path, "rb")
+
+    async def read(self, size: int) -> bytes:
+        return self.file.read(size)
+
+
+class InlineWorkers:
+    async def run_io(self, fn, *args, **kwargs):
+        return fn(*args, **kwargs)
+
+
+def test_zip_members_of_the_same_name_in_two_folders_get_two_sources(tmp_path, chat):
+    ingestor = make_ingestor(tmp_path)
+    ingestor.chat, ingestor.workers = chat, InlineWorkers()
+    first = make_zip(tmp_path, {"a/report.pdf": b"%PDF-a", "b/report.pdf": b"%PDF-b"})
+    os.rename(first, tmp_path / "first.zip")
+    second = make_zip(tmp_path, {"a/report.pdf": b"%PDF-c"})
+    uploads = [
+        Upload("first.zip", str(tmp_path / "first.zip")),
+        Upload("second.zip", second),
+    ]
+    bulk_files = asyncio.run(ingestor.spool(uploads, domains={}, default_domain="hr"))
+    assert [(f.source, f.status) for f in bulk_files] == [
+        ("docs/hr/a/report.pdf", "pending"),
+        ("docs/hr/b/report.pdf", "pending"),
+        ("docs/hr/a/report.pdf", "failed"),
+    ]
+    ingestor.cleanup(bulk_files)
+
+
+def test_unpack_zip_extracts_pdfs(tmp_path):
+    ingestor = make_ingestor(tmp_path)
+    path = make_zip(tmp_path, {"a/x.pdf": b"%PDF-1", "notes.txt": b"skip"})
+    [(name, spool_path, sha256)] = ingestor.unpack_zip(path, limit=10, max_bytes=1000)
+    assert name == "a/x.pdf" and len(sha256) == 64
+    with open(spool_path, "rb") as spool_file:
+        assert spool_file.read() == b"%PDF-1"
+
+
+def test_unpack_zip_rejects_too_many_members(tmp_path):
+    ingestor = make_ingestor(tmp_path)
+    path = make_zip(tmp_path, {f"{i}.pdf": b"%PDF" for i in range(3)})
+    with pytest.raises(ValueError):
+        ingestor.unpack_zip(path, limit=2, max_bytes=1000)
+    assert spooled(tmp_path) == []
+
+
+def test_unpack_zip_rejects_declared_size_over_the_limit(tmp_path):
+    ingestor = make_ingestor(tmp_path)
+    path = make_zip(tmp_path, {"a.pdf": b"0" * 600, "b.pdf": b"0" * 600})
+    with pytest.raises(ValueError):
+        ingestor.unpack_zip(path, limit=10, max_bytes=1000)
+    assert spooled(tmp_path) == []
+
+
+def test_unpack_zip_counts_bytes_actually_written(tmp_path, monkeypatch):
+    ingestor = make_ingestor(tmp_path)
+    path = make_zip(tmp_path, {"a.pdf": b"0" * 600, "b.pdf": b"0" * 600})
+    # headers understating the member sizes, the members still inflate to 600 bytes
+    infolist = zipfile.ZipFile.infolist
+
+    def understated(self):
+        infos = infolist(self)
+        for info in infos:
+            info.file_size = 10
+        return infos
+
+    monkeypatch.setattr(zipfile.ZipFile, "infolist", understated)
+    monkeypatch.setattr(zipfile.ZipFile, "open", lambda self, info: io.BytesIO(b"0" * 600))
+    with pytest.raises(ValueError):
+        ingestor.unpack_zip(path, limit=10, max_bytes=1000)
+    assert spooled(tmp_path) == []
@@ -0,0 +1,50 @@
+import os
+
+from utils import caches
+from utils.caches import IndexVersion, LRUCache, normalize_query
+
+
+def test_normalize_query_folds_case_and_whitespace():
+    assert normalize_query("  What IS\tthe  Pump? ") == "what is the pump?"
+
+
+def test_lru_evicts_the_least_recently_used_entry():
+    cache = LRUCache(max_size=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert cache.stats() == {
+        "size": 2,
+        "max_size": 2,
+        "hits": 3,
+        "misses": 1,
+        "hit_ratio": 0.75,
+    }
+
+
+def test_lru_entries_expire_after_their_ttl(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(caches.time, "monotonic", lambda: now[0])
+    cache = LRUCache(max_size=2, ttl_seconds=10)
+    cache.put("a", 1)
+    now[0] += 9
+    assert cache.get("a") == 1
+    now[0] += 1
+    assert cache.get("a") is None
+    assert cache.stats()["size"] == 0
+
+
+def test_index_version_is_shared_through_its_file(tmp_path):
+    path = str(tmp_path / "vectors.version")
+    worker, other = IndexVersion(path), IndexVersion(path)
+    assert worker.current() == other.current() == "0"
+    version = other.bump()
+    assert worker.current() == version
+    assert other.bump("next") == "next"
+    # two bumps can share a filesystem timestamp tick, readers key on the mtime
+    os.utime(path, ns=(1, 1))
+    assert worker.current() == "next"
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
@@ -0,0 +1,102 @@
+from langchain_core.documents import Document
+
+from services.chunkers import (
+    SemanticChunker,
+    SentenceChunker,
+    pack_sentences,
+    split_sections,
+    split_sentences,
+)
+
+WRAPPED = """The pump assembly must be inspected every
+three months by a certified technician and the
+results recorded in the maintenance log
+before the unit is returned to service."""
+
+
+def words(text: str) -> list:
+    return text.split()
+
+
+def test_wrapped_lines_are_not_headings():
+    assert split_sections(WRAPPED) == [(None, " ".join(WRAPPED.splitlines()))]
+
+
+def test_lowercase_lines_are_not_all_caps_headings():
+    text = "Check the valve.\nthe seal is replaced\nwhen it leaks."
+    assert [heading for heading, _ in split_sections(text)] == [None]
+
+
+def test_numbered_and_all_caps_headings():
+    text = (
+        "1.2 Scope\nThis manual covers pumps.\n\n"
+        "SAFETY NOTES\nWear gloves. Close the valve.\n"
+        "Chapter 3 Maintenance\nInspect monthly."
+    )
+    assert split_sections(text) == [
+        ("1.2 Scope", "This manual covers pumps."),
+        ("SAFETY NOTES", "Wear gloves. Close the valve."),
+        ("Chapter 3 Maintenance", "Inspect monthly."),
+    ]
+
+
+def test_heading_needs_a_block_boundary_before_it():
+    text = "Replace the filter every\n12 Months or\nsooner."
+    assert [heading for heading, _ in split_sections(text)] == [None]
+
+
+def test_split_sentences_collapses_whitespace():
+    assert split_sentences("First  one.\nSecond one! Third?") == [
+        "First one.",
+        "Second one!",
+        "Third?",
+    ]
+
+
+def test_pack_sentences_respects_max_chars():
+    sentences = ["a" * 30 + ".", "b" * 30 + ".", "c" * 30 + "."]
+    assert pack_sentences(sentences, 70) == [f"{sentences[0]} {sentences[1]}", sentences[2]]
+    assert all(len(chunk) <= 20 for chunk in pack_sentences(["x " * 40], 20))
+
+
+def test_sentence_chunker_keeps_all_text():
+    page = Document(
+        page_content=f"OVERVIEW\n{WRAPPED}\n\n2 Parts\nA seal. A valve.", metadata={"page": 0}
+    )
+    chunks = SentenceChunker(docs=[page], max_chars=120).split_docs()
+    # every chunk of a section repeats its heading, the page text is kept once
+    text, seen = [], set()
+    for chunk in chunks:
+        heading = chunk.metadata["heading"]
+        body = chunk.page_content[len(heading) + 1 :]
+        text += ([heading] if heading not in seen else []) + [body]
+        seen.add(heading)
+    assert words(" ".join(text)) == words(page.page_content)
+    assert len(chunks) > 2
+    assert all(chunk.page_content.startswith(chunk.metadata["heading"]) for chunk in chunks)
+    assert all(len(chunk.page_content) <= 120 for chunk in chunks)
+    assert {chunk.metadata["page"] for chunk in chunks} == {0}
+
+
+def test_heading_without_body_is_kept():
+    chunks = SentenceChunker(docs=[Document(page_content="APPENDIX A")]).split_docs()
+    assert [chunk.page_content for chunk in chunks] == ["APPENDIX A"]
+
+
+class TopicEmbeddings:
+    """Two orthogonal topics, sentences about pumps vs. about invoices"""
+
+    def embed_documents(self, texts):
+        return [[1.0, 0.0] if "pump" in text else [0.0, 1.0] for text in texts]
+
+
+def test_semantic_chunker_breaks_at_topic_change():
+    text = "The pump runs. The pump stops. The pump leaks. Invoices are due. Invoices are paid."
+    chunker = SemanticChunker(
+        max_chars=1000, breakpoint_percentile=50, embeddings=TopicEmbeddings()
+    )
+    chunks = chunker.split_page(Document(page_content=text))
+    assert [chunk.page_content for chunk in chunks] == [
+        "The pump runs. The pump stops. The pump leaks.",
+        "Invoices are due. Invoices are paid.",
+    ]
@@ -0,0 +1,35 @@
+from langchain_core.documents import Document
+
+from utils.helpers import build_context
+
+
+def doc(text: str, source: str = "docs/manual.pdf", page=None) -> Document:
+    metadata = {"source": source}
+    if page is not None:
+        metadata["page"] = page
+    return Document(page_content=text, metadata=metadata)
+
+
+def test_entries_are_numbered_with_file_and_page():
+    parsed, text = build_context(
+        [doc("pump  inspection\nevery month", page=3), doc("valve", source="docs/b.pdf")],
+        token_budget=100,
+        chars_per_token=4,
+    )
+    assert text == "[1] manual.pdf p.3: pump inspection every month\n[2] b.pdf: valve"
+    assert parsed[1]["metadata"]["page"] == 3 and parsed[2]["content"] == "valve"
+
+
+def test_documents_over_the_budget_are_skipped():
+    docs = [doc("a" * 20), doc("b" * 200), doc("c" * 20)]
+    parsed, text = build_context(docs, token_budget=20, chars_per_token=4)
+    # the second document does not fit, the third still does and is renumbered
+    assert [entry["content"][0] for entry in parsed.values()] == ["a", "c"]
+    assert text.splitlines()[1].startswith("[2] manual.pdf: c")
+    assert len(text) <= 80
+
+
+def test_first_document_is_truncated_instead_of_dropped():
+    parsed, text = build_context([doc("x" * 500)], token_budget=10, chars_per_token=4)
+    assert list(parsed) == [1] and parsed[1]["content"] == "x" * 500
+    assert text.startswith("[1] manual.pdf: x") and len(text) == 39
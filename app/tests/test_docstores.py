@@ -0,0 +1,55 @@
+import pickle
+import time
+
+from langchain_core.documents import Document
+
+from services.docstores import SQLiteDocstore
+
+
+def chunk(text: str, page: int = 1) -> Document:
+    return Document(
+        page_content=text, metadata={"source": "docs/a.pdf", "domain": "hr", "page": page}
+    )
+
+
+def make_store(tmp_path) -> SQLiteDocstore:
+    store = SQLiteDocstore(db_path=str(tmp_path / "docstore.sqlite"))
+    store.add({"a": chunk("first"), "b": chunk("second", page=2)})
+    return store
+
+
+def test_mget_keeps_order_and_metadata(tmp_path):
+    store = make_store(tmp_path)
+    docs = store.mget(["b", "missing", "a"])
+    assert [doc.page_content if doc else None for doc in docs] == ["second", None, "first"]
+    assert docs[0].metadata == {"source": "docs/a.pdf", "domain": "hr", "page": 2}
+    assert store.search("missing") == "ID missing not found."
+
+
+def test_deleted_chunks_resolve_until_purged(tmp_path):
+    store = make_store(tmp_path)
+    store.delete(["a"])
+    # older index generations still reference the tombstoned chunk
+    assert store.mget(["a"])[0].page_content == "first"
+    assert store.count() == 1
+    assert [row[0] for row in store.metadata()] == ["b"]
+
+    assert store.purge(deleted_before=0) == 0
+    assert store.purge(deleted_before=time.time_ns()) == 1
+    assert store.mget(["a"]) == [None]
+
+
+def test_re_adding_revives_a_tombstoned_chunk(tmp_path):
+    store = make_store(tmp_path)
+    store.delete(["a"])
+    store.add({"a": chunk("first again")})
+    assert store.count() == 2
+    assert store.purge(deleted_before=time.time_ns()) == 0
+    assert store.mget(["a"])[0].page_content == "first again"
+
+
+def test_pickling_keeps_only_the_path(tmp_path):
+    store = make_store(tmp_path)
+    restored = pickle.loads(pickle.dumps(store))
+    assert len(pickle.dumps(store)) < 200
+    assert restored.mget(["a"])[0].page_content == "first"
@@ -0,0 +1,95 @@
+import threading
+
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from services.embedding_cache import CachedEmbeddings, EmbeddingStore, QueryLRUEmbeddings
+from utils.caches import LRUCache
+
+
+def make_store(tmp_path) -> EmbeddingStore:
+    return EmbeddingStore(cache_dir=str(tmp_path), model_name="test/model")
+
+
+def test_put_and_get_round_trip(tmp_path):
+    store = make_store(tmp_path)
+    store.put_many({"a": [1.0, 2.0], "b": [3.0, 4.0]})
+    store.put_many({"c": [5.0, 6.0]})
+    assert make_store(tmp_path).get_many(["a", "c", "missing"]) == {
+        "a": [1.0, 2.0],
+        "c": [5.0, 6.0],
+    }
+
+
+def test_torn_write_does_not_shift_rows(tmp_path):
+    store = make_store(tmp_path)
+    store.put_many({"a": [1.0, 2.0]})
+    # a crashed writer left a partial row and an uncommitted full row behind
+    with open(store.vectors_path, "ab") as vectors_file:
+        vectors_file.write(b"\x00" * 12)
+    store.put_many({"b": [3.0, 4.0]})
+    store.put_many({"c": [5.0, 6.0]})
+    assert make_store(tmp_path).get_many(["a", "b", "c"]) == {
+        "a": [1.0, 2.0],
+        "b": [3.0, 4.0],
+        "c": [5.0, 6.0],
+    }
+
+
+def test_hit_and_miss_counters_under_concurrency(tmp_path):
+    embeddings = CachedEmbeddings(
+        DeterministicFakeEmbedding(size=4), make_store(tmp_path), batch_size=8
+    )
+    embeddings.embed_documents(["warm"])
+
+    def embed():
+        for _ in range(50):
+            embeddings.embed_documents(["warm", "warm"])
+
+    threads = [threading.Thread(target=embed) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats = embeddings.stats()
+    assert (stats["hits"], stats["misses"]) == (400, 1)
+
+
+class CountingEmbeddings(DeterministicFakeEmbedding):
+    calls: list = []
+
+    def embed_documents(self, texts):
+        self.calls.append(("embed_documents", len(texts)))
+        return super().embed_documents(texts)
+
+    def embed_query(self, text):
+        self.calls.append(("embed_query", 1))
+        return super().embed_query(text)
+
+
+class QueryBatchingEmbeddings(CountingEmbeddings):
+    def embed_queries(self, texts):
+        self.calls.append(("embed_queries", len(texts)))
+        return [DeterministicFakeEmbedding.embed_query(self, text) for text in texts]
+
+
+def query_stack(tmp_path, model, **kwargs) -> QueryLRUEmbeddings:
+    cached = CachedEmbeddings(model, make_store(tmp_path), batch_size=8, **kwargs)
+    return QueryLRUEmbeddings(cached, LRUCache(max_size=16, ttl_seconds=60))
+
+
+def test_sub_queries_cost_one_model_call(tmp_path):
+    model = CountingEmbeddings(size=4, calls=[])
+    embeddings = query_stack(tmp_path, model, query_as_document=True)
+    vectors = embeddings.embed_queries(["pump?", "valve?", "seal?"])
+    assert model.calls == [("embed_documents", 3)]
+    assert vectors[1] == model.embed_query("valve?")
+
+    model.calls.clear()
+    embeddings.embed_queries(["pump?", "valve?", "gasket?"])
+    assert model.calls == [("embed_documents", 1)]
+
+
+def test_query_misses_use_the_model_query_batch(tmp_path):
+    model = QueryBatchingEmbeddings(size=4, calls=[])
+    query_stack(tmp_path, model).embed_queries(["pump?", "valve?", "seal?"])
+    assert model.calls == [("embed_queries", 3)]
@@ -0,0 +1,33 @@
+import sqlite3
+
+from utils.file_hashes import FileHashStore
+
+
+def upload(sha256: str, domain, num_chunks: int = 1) -> dict:
+    return {"sha256": sha256, "source": "docs/a.pdf", "domain": domain, "num_chunks": num_chunks}
+
+
+def test_uploads_are_keyed_by_source_and_domain(tmp_path):
+    store = FileHashStore(db_path=str(tmp_path / "file_hashes.sql"))
+    store.record([upload("1", "hr"), upload("2", "ops"), upload("3", None)])
+    store.record([upload("4", "hr", num_chunks=5), upload("5", None)])
+    assert store.find("1", "docs/a.pdf", "hr") is None
+    assert store.find("4", "docs/a.pdf", "hr")["num_chunks"] == 5
+    assert store.find("2", "docs/a.pdf", "ops") is not None
+    assert store.find("5", "docs/a.pdf", None) is not None
+    assert store.find("3", "docs/a.pdf", None) is None
+    assert store.forget(["docs/a.pdf"]) == 3
+
+
+def test_tables_keyed_by_source_only_are_migrated(tmp_path):
+    db_path = str(tmp_path / "file_hashes.sql")
+    with sqlite3.connect(db_path) as connection:
+        connection.execute(
+            "CREATE TABLE file_hashes (source TEXT PRIMARY KEY, sha256 TEXT NOT NULL, "
+            "domain TEXT, num_chunks INTEGER NOT NULL, uploaded_at REAL NOT NULL)"
+        )
+        connection.execute("INSERT INTO file_hashes VALUES ('docs/a.pdf', '1', 'hr', 2, 0)")
+    store = FileHashStore(db_path=db_path)
+    store.record([upload("2", "ops")])
+    assert store.find("1", "docs/a.pdf", "hr")["num_chunks"] == 2
+    assert store.find("2", "docs/a.pdf", "ops") is not None
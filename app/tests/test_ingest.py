@@ -0,0 +1,138 @@
+import asyncio
+
+import pytest
+from langchain_core.documents import Document
+
+from benchmark import synthetic_pdf
+from services.loaders import ShardedPDFLoader
+
+from utils.helpers import ChatService
+from utils.workers import WorkerPool
+
+
+def chunks(source: str, domain: str, *texts: str) -> list:
+    return [
+        Document(page_content=text, metadata={"source": source, "domain": domain, "page": 0})
+        for text in texts
+    ]
+
+
+def test_index_docs_counts_and_cleans_up_re_uploads(chat):
+    source = ChatService.upload_source("a.pdf", "hr")
+    idx = chat.index_docs(chunks(source, "hr", "pump", "valve"), cleanup="incremental")
+    assert (idx["num_added"], idx["num_deleted"]) == (2, 0)
+
+    idx = chat.index_docs(chunks(source, "hr", "pump", "valve"), cleanup="incremental")
+    assert (idx["num_added"], idx["num_skipped"]) == (0, 2)
+    assert chat.process_duplicate_doc(idx)[0]
+
+    idx = chat.index_docs(chunks(source, "hr", "pump", "gasket"), cleanup="incremental")
+    assert (idx["num_added"], idx["num_skipped"], idx["num_deleted"]) == (1, 1, 1)
+    assert chat.registry.versions == 2
+
+
+def test_same_file_name_in_two_domains_keeps_both_documents(chat):
+    hr = ChatService.upload_source("a.pdf", "hr")
+    ops = ChatService.upload_source("a.pdf", "ops")
+    assert hr == "docs/hr/a.pdf" and ops == "docs/ops/a.pdf"
+    assert ChatService.upload_source("a.pdf", "hr/ops") == "docs/hr%2Fops/a.pdf"
+    assert ChatService.upload_source("a.pdf", None) == "docs/_/a.pdf"
+
+    chat.index_docs(chunks(hr, "hr", "pump"), uploads={hr: "1" * 64})
+    idx = chat.index_docs(chunks(ops, "ops", "valve"), uploads={ops: "2" * 64})
+    assert (idx["num_added"], idx["num_deleted"]) == (1, 0)
+    # a new FAISS store holds a placeholder chunk without source
+    assert sorted(filter(None, chat.get_vector_store().list_records().values())) == [hr, ops]
+    assert chat.find_upload("1" * 64, hr, "hr")["num_chunks"] == 1
+
+
+class ThreadWorkers:
+    """Parses in the calling task instead of a process pool, indexes in a thread"""
+
+    process_workers = 2
+
+    def __init__(self):
+        self.parsed = []
+
+    async def run_cpu(self, fn, *args, **kwargs):
+        self.parsed.append(args[1:3])
+        return fn(*args, **kwargs)
+
+    async def run_io(self, fn, *args, **kwargs):
+        return await asyncio.to_thread(fn, *args, **kwargs)
+
+
+def write_pdf(path, pages) -> str:
+    with open(path, "wb") as pdf:
+        pdf.write(
+            synthetic_pdf([[f"Page {page} is about {text}"] for page, text in enumerate(pages)])
+        )
+    return str(path)
+
+
+def test_failed_stream_keeps_the_document_it_replaces(chat):
+    source = ChatService.upload_source("a.pdf", "hr")
+    chat.index_docs(chunks(source, "hr", "pump", "valve"))
+
+    def failing():
+        yield from chunks(source, "hr", "gasket", "seal")
+        raise RuntimeError("parse error")
+
+    with pytest.raises(RuntimeError):
+        chat.index_docs(failing(), batch_size=1)
+    assert len(chat.get_vector_store().list_records()) == 5
+
+    idx = chat.index_docs(chunks(source, "hr", "gasket", "seal"), batch_size=1)
+    assert (idx["num_added"], idx["num_skipped"], idx["num_deleted"]) == (0, 2, 2)
+
+
+def test_index_pdf_streams_page_ranges_in_page_order(tmp_path, chat):
+    path = write_pdf(tmp_path / "a.pdf", ["pumps", "valves", "seals", "gaskets", "pipes"])
+    workers, seen = ThreadWorkers(), []
+
+    def progress(docs):
+        for doc in docs:
+            seen.append(doc.metadata["page"])
+            yield doc
+
+    source = ChatService.upload_source("a.pdf", "hr")
+    idx = asyncio.run(
+        chat.index_pdf(
+            workers,
+            doc_path=path,
+            domain="hr",
+            source=source,
+            progress=progress,
+            shard_pages=2,
+        )
+    )
+    assert idx["num_added"] == 5 and seen == [0, 1, 2, 3, 4]
+    assert workers.parsed == [(0, 2), (2, 4), (4, 5)]
+    assert set(filter(None, chat.get_vector_store().list_records().values())) == {source}
+
+    # a changed re-upload deletes the stale page once every range is written
+    path = write_pdf(tmp_path / "b.pdf", ["pumps", "valves", "seals", "gaskets", "tubes"])
+    idx = asyncio.run(
+        chat.index_pdf(workers, doc_path=path, domain="hr", source=source, shard_pages=2)
+    )
+    assert (idx["num_added"], idx["num_skipped"], idx["num_deleted"]) == (1, 4, 1)
+
+
+def test_default_ingest_parses_small_pdfs_in_the_process_pool(tmp_path, chat):
+    path = write_pdf(tmp_path / "a.pdf", ["pumps", "valves"])
+    chat.loader = ShardedPDFLoader
+    workers = WorkerPool(process_workers=1, thread_workers=2, max_pending=1)
+    calls, run_cpu = [], workers.run_cpu
+
+    async def counting_run_cpu(fn, *args, **kwargs):
+        calls.append(fn.__name__)
+        return await run_cpu(fn, *args, **kwargs)
+
+    workers.run_cpu = counting_run_cpu
+    workers.startup()
+    try:
+        source = ChatService.upload_source("a.pdf", "hr")
+        idx = asyncio.run(chat.index_pdf(workers, doc_path=path, domain="hr", source=source))
+    finally:
+        workers.shutdown(wait=True)
+    assert calls == ["process_pages"] and idx["num_added"] == 2
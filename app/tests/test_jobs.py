@@ -0,0 +1,157 @@
+import asyncio
+import os
+import sqlite3
+import subprocess
+import sys
+
+import pytest
+
+from utils.jobs import IngestJobRunner, IngestJobStore, JobLeaseLost, JobStatus
+
+
+class InlineWorkers:
+    async def run_io(self, fn, *args, **kwargs):
+        return fn(*args, **kwargs)
+
+
+def make_store(tmp_path) -> IngestJobStore:
+    store = IngestJobStore(db_path=str(tmp_path / "jobs.sql"))
+    store.create_schema()
+    return store
+
+
+def test_claim_hands_out_a_new_lease(tmp_path):
+    store = make_store(tmp_path)
+    job_id = store.enqueue("/tmp/x.pdf", "x.pdf", None)
+    job = store.claim(stale_after=600)
+    assert job["id"] == job_id and job["lease"]
+    assert store.get(job_id)["status"] == JobStatus.RUNNING.value
+    assert store.claim(stale_after=600) is None
+
+
+def test_reclaimed_job_refuses_the_old_lease(tmp_path):
+    store = make_store(tmp_path)
+    store.enqueue("/tmp/x.pdf", "x.pdf", None)
+    first = store.claim(stale_after=600)
+    second = store.claim(stale_after=-1)
+    assert second["id"] == first["id"] and second["lease"] != first["lease"]
+    assert not store.heartbeat(first["id"], first["lease"])
+    assert not store.update(first["id"], lease=first["lease"], status=JobStatus.SUCCEEDED)
+    assert store.update(second["id"], lease=second["lease"], status=JobStatus.SUCCEEDED)
+    assert store.get(first["id"])["attempts"] == 2
+
+
+def test_heartbeat_keeps_a_long_job_claimed(tmp_path):
+    store = make_store(tmp_path)
+    store.enqueue("/tmp/x.pdf", "x.pdf", None)
+    runner = IngestJobRunner(
+        store,
+        chat=None,
+        workers=InlineWorkers(),
+        concurrency=1,
+        stale_after=0.2,
+        heartbeat_interval=0.05,
+    )
+
+    async def long_job():
+        job = store.claim(stale_after=runner.stale_after)
+        heartbeat = asyncio.create_task(runner._heartbeat(job))
+        # a parse longer than the stale timeout
+        await asyncio.sleep(0.5)
+        reclaimed = store.claim(stale_after=runner.stale_after)
+        heartbeat.cancel()
+        return reclaimed
+
+    assert asyncio.run(long_job()) is None
+
+
+def test_track_progress_stops_once_the_lease_is_lost(tmp_path):
+    store = make_store(tmp_path)
+    store.enqueue("/tmp/x.pdf", "x.pdf", None)
+    runner = IngestJobRunner(store, chat=None, workers=InlineWorkers(), concurrency=1)
+    job = store.claim(stale_after=600)
+    store.claim(stale_after=-1)
+    with pytest.raises(JobLeaseLost):
+        list(runner._track_progress(job, iter([]), every=1))
+
+
+def test_jobs_abandoned_too_often_fail_instead_of_being_reclaimed(tmp_path):
+    store = make_store(tmp_path)
+    job_id = store.enqueue("/tmp/x.pdf", "x.pdf", None)
+    for _ in range(2):
+        assert store.claim(stale_after=-1, max_attempts=2)["id"] == job_id
+    assert store.claim(stale_after=-1, max_attempts=2) is None
+    [failed] = store.fail_exhausted(stale_after=-1, max_attempts=2)
+    job = store.get(job_id)
+    assert failed["id"] == job_id and job["status"] == JobStatus.FAILED.value
+    assert job["error"] == "Abandoned after 2 attempts"
+
+
+class FailingChat:
+    loader = chunker = None
+
+    @staticmethod
+    def upload_source(filename, domain):
+        return f"docs/{domain}/{filename}"
+
+    def find_upload(self, sha256, source, domain):
+        raise RuntimeError("broken PDF")
+
+
+def test_failed_job_removes_its_spool_file(tmp_path):
+    store = make_store(tmp_path)
+    spool_path = tmp_path / "x.pdf"
+    spool_path.write_bytes(b"%PDF")
+    store.enqueue(str(spool_path), "x.pdf", "hr")
+    runner = IngestJobRunner(store, chat=FailingChat(), workers=InlineWorkers(), concurrency=1)
+    job = store.claim(stale_after=600)
+    asyncio.run(runner._process(job))
+    assert store.get(job["id"])["error"] == "broken PDF"
+    assert not spool_path.exists()
+
+
+def test_restart_requeues_jobs_of_gone_processes_on_this_host(tmp_path):
+    store = make_store(tmp_path)
+    finished = subprocess.run(
+        [sys.executable, "-c", "import os; print(os.getpid())"], capture_output=True, text=True
+    )
+    owners = [
+        f"host:{finished.stdout.strip()}",
+        f"host:{os.getpid()}",
+        f"host:{os.getppid()}",
+        f"other:{finished.stdout.strip()}",
+    ]
+    jobs = []
+    for owner in owners:
+        store.enqueue("/tmp/x.pdf", "x.pdf", None)
+        jobs.append(store.claim(stale_after=600, owner=owner)["id"])
+    assert store.release_orphans("host") == 2
+    statuses = [store.get(job_id)["status"] for job_id in jobs]
+    assert statuses == ["queued", "queued", "running", "running"]
+
+
+def test_consumer_survives_store_errors(tmp_path):
+    store = make_store(tmp_path)
+    store.enqueue(str(tmp_path / "x.pdf"), "x.pdf", "hr")
+    claim = store.claim
+    errors = [sqlite3.OperationalError("database is locked")]
+
+    def flaky_claim(*args, **kwargs):
+        if errors:
+            raise errors.pop()
+        return claim(*args, **kwargs)
+
+    store.claim = flaky_claim
+    runner = IngestJobRunner(
+        store, chat=FailingChat(), workers=InlineWorkers(), concurrency=1, poll_interval=0.01
+    )
+
+    async def consume():
+        consumer = asyncio.create_task(runner._consume())
+        await asyncio.sleep(0.2)
+        alive = not consumer.done()
+        consumer.cancel()
+        return alive
+
+    assert asyncio.run(consume())
+    assert store.count(JobStatus.FAILED) == 1
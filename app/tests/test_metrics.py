@@ -0,0 +1,67 @@
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+
+from utils import metrics as metrics_module
+from utils.metrics import (
+    LLM_TOKENS_TOTAL,
+    LLMMetricsCallback,
+    MetricsRegistry,
+    Span,
+    timed_iter,
+)
+
+
+def test_render_prometheus_text():
+    registry = MetricsRegistry()
+    latency = registry.histogram("latency_seconds", "Latency", ["route"], buckets=(0.1, 1.0))
+    chunks = registry.counter("chunks_total", "Chunks", ["result"])
+    latency.observe(0.05, route="/a")
+    latency.observe(0.5, route="/a")
+    chunks.inc(3, result='new "x"')
+    registry.add_collector(lambda: ["cache_hits 7"])
+    assert registry.render().splitlines() == [
+        "# HELP latency_seconds Latency",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{route="/a",le="0.1"} 1',
+        'latency_seconds_bucket{route="/a",le="1.0"} 2',
+        'latency_seconds_bucket{route="/a",le="+Inf"} 2',
+        'latency_seconds_sum{route="/a"} 0.55',
+        'latency_seconds_count{route="/a"} 2',
+        "# HELP chunks_total Chunks",
+        "# TYPE chunks_total counter",
+        'chunks_total{result="new \\"x\\""} 3',
+        "cache_hits 7",
+    ]
+
+
+def test_nested_spans_record_exclusive_time(monkeypatch):
+    clock = iter([0.0, 1.0, 3.0, 10.0])
+    monkeypatch.setattr(metrics_module.time, "perf_counter", lambda: next(clock))
+    with Span("outer", observe=False) as outer:
+        with Span("inner", observe=False) as inner:
+            pass
+    assert (outer.seconds, inner.seconds) == (8.0, 2.0)
+
+
+def test_timed_iter_records_production_time_once(monkeypatch):
+    observed = []
+    monkeypatch.setattr(
+        metrics_module.STAGE_SECONDS,
+        "observe",
+        lambda seconds, stage: observed.append(stage),
+    )
+    assert list(timed_iter(iter([1, 2, 3]), "load")) == [1, 2, 3]
+    assert observed == ["load"]
+
+
+def test_llm_tokens_are_estimated_without_usage_metadata():
+    before = dict(LLM_TOKENS_TOTAL._values)
+    llm = GenericFakeChatModel(
+        messages=iter([AIMessage(content="12345678")]),
+        callbacks=[LLMMetricsCallback(chars_per_token=4)],
+    )
+    llm.invoke("1234567890123456")
+    counted = {
+        key: value - before.get(key, 0) for key, value in LLM_TOKENS_TOTAL._values.items()
+    }
+    assert counted == {("input",): 4, ("output",): 2}
@@ -0,0 +1,54 @@
+import pytest
+from sqlalchemy import event, text
+
+from services.record_managers import _MAX_PARAMS, PooledSQLRecordManager
+
+
+@pytest.fixture
+def record_manager(tmp_path) -> PooledSQLRecordManager:
+    record_manager = PooledSQLRecordManager(
+        namespace="test", db_url=f"sqlite:///{tmp_path / 'records.sql'}", pool_size=2
+    )
+    record_manager.create_schema()
+    yield record_manager
+    record_manager.engine.dispose()
+
+
+def count_statements(record_manager, prefix: str):
+    statements = []
+
+    @event.listens_for(record_manager.engine, "before_cursor_execute")
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(prefix):
+            statements.append(len(parameters))
+
+    return statements
+
+
+def test_upserts_are_split_within_the_parameter_limit(record_manager):
+    keys = [f"key{i}" for i in range(1000)]
+    inserts = count_statements(record_manager, "INSERT")
+    record_manager.update(keys, group_ids=["docs/a.pdf"] * len(keys))
+    # 5 parameters per record, the generated uuid included
+    assert len(inserts) == 6 and max(inserts) <= _MAX_PARAMS
+    record_manager.update(keys[:10], group_ids=["docs/b.pdf"] * 10)
+    assert sorted(record_manager.list_keys(group_ids=["docs/b.pdf"])) == sorted(keys[:10])
+    assert len(record_manager.list_keys(group_ids=["docs/a.pdf"])) == 990
+
+
+def test_lookups_and_deletes_over_the_parameter_limit(record_manager):
+    keys = [f"key{i}" for i in range(2 * _MAX_PARAMS)]
+    record_manager.update(keys)
+    assert record_manager.exists(keys + ["missing"]) == [True] * len(keys) + [False]
+    record_manager.delete_keys(keys[1:])
+    assert record_manager.list_keys() == ["key0"]
+
+
+def test_update_rejects_mismatched_group_ids(record_manager):
+    with pytest.raises(ValueError):
+        record_manager.update(["a", "b"], group_ids=["docs/a.pdf"])
+
+
+def test_sqlite_runs_in_wal_mode(record_manager):
+    with record_manager.engine.connect() as connection:
+        assert connection.execute(text("PRAGMA journal_mode")).scalar() == "wal"
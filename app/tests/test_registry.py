@@ -0,0 +1,84 @@
+import os
+import subprocess
+import sys
+from types import SimpleNamespace
+
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from utils.enums import VectorStores
+from utils.registry import ProviderRegistry
+
+
+class CountingEmbeddingsProvider:
+    created = 0
+
+    @classmethod
+    def get_embeddings(cls) -> DeterministicFakeEmbedding:
+        cls.created += 1
+        return DeterministicFakeEmbedding(size=8)
+
+
+def make_registry(path) -> ProviderRegistry:
+    settings = {
+        "EMBEDDINGS": SimpleNamespace(provider=CountingEmbeddingsProvider),
+        "VECTOR_STORE": VectorStores.FAISS,
+    }
+    return ProviderRegistry(settings, vector_db_path=str(path / "vectors"))
+
+
+def test_handles_are_created_once_and_shared(tmp_path):
+    CountingEmbeddingsProvider.created = 0
+    registry = make_registry(tmp_path)
+    embeddings = registry.get_embeddings()
+    vector_store = registry.get_vector_store()
+    assert registry.get_embeddings() is embeddings
+    assert registry.get_vector_store(VectorStores.FAISS) is vector_store
+    assert vector_store.embeddings is embeddings
+    assert CountingEmbeddingsProvider.created == 1
+    registry.shutdown()
+    assert registry.get_embeddings() is not embeddings
+
+
+def test_vector_store_is_refreshed_after_another_worker_writes(tmp_path):
+    worker, other = make_registry(tmp_path), make_registry(tmp_path)
+    vector_store = worker.get_vector_store()
+    refreshes = []
+    vector_store.refresh = lambda: refreshes.append(True)
+    # its own writes are already in its handle
+    worker.bump_index_version()
+    assert worker.get_vector_store() is vector_store and not refreshes
+    other.bump_index_version()
+    assert worker.get_vector_store() is vector_store and refreshes == [True]
+    worker.get_vector_store()
+    assert refreshes == [True]
+
+
+def test_importing_the_app_loads_no_provider_sdk():
+    # a fresh interpreter, the test session has imported most providers already
+    modules = [
+        "langchain.chains",
+        "langchain_google_genai",
+        "sentence_transformers",
+        "chromadb",
+        "torch",
+        "services.llms",
+        "services.embeddings",
+        "services.record_managers",
+    ]
+    script = f"import sys, main; print([m for m in {modules!r} if m in sys.modules])"
+    app_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run(
+        [sys.executable, "-c", script],
+        cwd=app_dir,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert result.stdout.strip().splitlines()[-1] == "[]"
+
+
+def test_provider_enums_resolve_their_class_on_first_use():
+    from services.vectordbs import FAISSVectorStore
+
+    assert VectorStores.FAISS.value == "services.vectordbs:FAISSVectorStore"
+    assert VectorStores.FAISS.provider is FAISSVectorStore
@@ -0,0 +1,129 @@
+import asyncio
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from services.embedding_cache import QueryLRUEmbeddings
+from services.retrievers import FanOutRetriever, reciprocal_rank_fusion
+from utils.caches import LRUCache
+from utils.models import RetrievalFilter
+
+
+def doc(text: str) -> Document:
+    return Document(page_content=text)
+
+
+class CountingEmbeddings(Embeddings):
+    """Records every call, vectors encode the text length"""
+
+    def __init__(self):
+        self.calls = []
+
+    def embed_documents(self, texts):
+        self.calls.append(("documents", list(texts)))
+        return [[float(len(text))] for text in texts]
+
+    def embed_query(self, text):
+        self.calls.append(("query", [text]))
+        return [float(len(text))]
+
+    def embed_queries(self, texts):
+        self.calls.append(("queries", list(texts)))
+        return [[float(len(text))] for text in texts]
+
+
+class RecordingStore:
+    def __init__(self):
+        self.vectors = []
+        self.filters = []
+
+    def search_by_vector(self, vector, k, filters=None):
+        self.vectors.append(vector)
+        self.filters.append(filters)
+        return [doc(f"chunk {vector[0]:.0f}")]
+
+
+def make_retriever(embeddings, store):
+    return FanOutRetriever(
+        llm=None,
+        embeddings=embeddings,
+        vector_store=lambda: store,
+        cache=LRUCache(max_size=100),
+        index_version=lambda: "v1",
+        num_queries=0,
+        k=4,
+    )
+
+
+def test_rrf_ranks_chunks_found_by_several_lists_first():
+    a, b, c = doc("a"), doc("b"), doc("c")
+    fused = reciprocal_rank_fusion([[a, b], [c, b], [b]])
+    assert [d.page_content for d in fused] == ["b", "a", "c"]
+
+
+def test_rrf_deduplicates_by_content():
+    fused = reciprocal_rank_fusion([[doc("same")], [doc("same"), doc("other")]])
+    assert [d.page_content for d in fused] == ["same", "other"]
+
+
+def test_rrf_weights_favour_heavier_lists():
+    a, b = doc("a"), doc("b")
+    assert reciprocal_rank_fusion([[a], [b]], weights=[1.0, 2.0])[0] is b
+    assert reciprocal_rank_fusion([[a], [b]], weights=[2.0, 1.0])[0] is a
+
+
+def test_query_lru_embeds_only_misses_in_one_batch():
+    model = CountingEmbeddings()
+    embeddings = QueryLRUEmbeddings(model, LRUCache(max_size=10))
+    embeddings.embed_query("first")
+    vectors = embeddings.embed_queries(["First ", "second", "third"])
+    assert vectors == [[5.0], [6.0], [5.0]]
+    assert model.calls == [("queries", ["first"]), ("queries", ["second", "third"])]
+
+
+def test_retrieve_reuses_the_given_query_embedding():
+    model = CountingEmbeddings()
+    store = RecordingStore()
+    retriever = make_retriever(QueryLRUEmbeddings(model, LRUCache(max_size=10)), store)
+    docs = asyncio.run(
+        retriever.aretrieve("question", rephrase=False, query_embedding=[42.0])
+    )
+    assert model.calls == []
+    assert store.vectors == [[42.0]]
+    assert [d.page_content for d in docs] == ["chunk 42"]
+
+
+def test_retrieve_embeds_through_the_query_path():
+    model = CountingEmbeddings()
+    retriever = make_retriever(
+        QueryLRUEmbeddings(model, LRUCache(max_size=10)), RecordingStore()
+    )
+    asyncio.run(retriever.aretrieve("question", rephrase=False))
+    asyncio.run(retriever.aretrieve("question", rephrase=False, k=2))
+    assert model.calls == [("queries", ["question"])]
+
+
+def test_retrieval_cache_is_keyed_on_the_index_version():
+    store = RecordingStore()
+    retriever = make_retriever(
+        QueryLRUEmbeddings(CountingEmbeddings(), LRUCache(max_size=10)), store
+    )
+    version = ["v1"]
+    retriever.index_version = lambda: version[0]
+    asyncio.run(retriever.aretrieve("question", rephrase=False))
+    asyncio.run(retriever.aretrieve("Question ", rephrase=False))
+    assert len(store.vectors) == 1
+    version[0] = "v2"
+    asyncio.run(retriever.aretrieve("question", rephrase=False))
+    assert len(store.vectors) == 2
+
+
+def test_filters_reach_the_store_and_scope_the_retrieval_cache():
+    store = RecordingStore()
+    retriever = make_retriever(
+        QueryLRUEmbeddings(CountingEmbeddings(), LRUCache(max_size=10)), store
+    )
+    hr, ops = RetrievalFilter(domain="hr"), RetrievalFilter(domain="ops")
+    for filters in (hr, ops, hr):
+        asyncio.run(retriever.aretrieve("question", rephrase=False, filters=filters))
+    assert store.filters == [hr, ops]
@@ -0,0 +1,98 @@
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from services.sparse_index import BM25Index, SparseIndexingVDB, tokenize
+from utils.models import RetrievalFilter
+
+
+def chunk(text: str, source: str = "docs/a.pdf", domain: str = "hr", page: int = 1):
+    return Document(
+        page_content=text, metadata={"source": source, "domain": domain, "page": page}
+    )
+
+
+def make_index(tmp_path, **kwargs) -> BM25Index:
+    return BM25Index(db_path=str(tmp_path / "bm25.sql"), **kwargs)
+
+
+CORPUS = {
+    "1": chunk("the pump AB-1234 must be inspected"),
+    "2": chunk("the valve is replaced when it leaks", source="docs/b.pdf", page=2),
+    "3": chunk("the pump pressure is checked daily", domain="ops", page=3),
+    "4": chunk("the report is filed monthly", source="docs/b.pdf", page=4),
+}
+
+
+def filled_index(tmp_path, **kwargs) -> BM25Index:
+    index = make_index(tmp_path, **kwargs)
+    index.add(list(CORPUS), list(CORPUS.values()))
+    return index
+
+
+def test_tokenize_keeps_and_splits_identifiers():
+    assert tokenize("Check AB-1234.") == ["check", "ab-1234", "ab", "1234"]
+
+
+def test_search_ranks_matching_chunks(tmp_path):
+    index = filled_index(tmp_path)
+    assert index.count() == 4
+    assert [doc_id for doc_id, _ in index.search("AB-1234", k=4)] == ["1"]
+    assert {doc_id for doc_id, _ in index.search("pump", k=4)} == {"1", "3"}
+
+
+def test_search_applies_filters(tmp_path):
+    index = filled_index(tmp_path)
+    hits = index.search("pump", k=4, filters=RetrievalFilter(domain="ops"))
+    assert [doc_id for doc_id, _ in hits] == ["3"]
+    hits = index.search("the", k=4, filters=RetrievalFilter(page_start=2, page_end=3))
+    assert {doc_id for doc_id, _ in hits} == {"2", "3"}
+
+
+def test_common_terms_are_skipped(tmp_path):
+    index = filled_index(tmp_path, max_df_ratio=0.5, min_docs_for_df_cutoff=4)
+    # "the" is in every chunk, only "valve" is searched
+    assert [doc_id for doc_id, _ in index.search("the valve", k=4)] == ["2"]
+    # a query of common terms only still searches the rarest one
+    assert len(index.search("the", k=4)) == 4
+
+
+def test_small_indexes_search_every_term(tmp_path):
+    # "the" and "pump" are both in more than a quarter of the four chunks
+    index = filled_index(tmp_path, max_df_ratio=0.25, min_docs_for_df_cutoff=5)
+    assert len(index.search("the pump", k=4)) == 4
+    index.add(["5"], [chunk("the pump AB-1234 failed")])
+    assert {doc_id for doc_id, _ in index.search("the pump", k=5)} == {"1", "3", "5"}
+
+
+def test_postings_are_capped_per_term(tmp_path):
+    index = make_index(tmp_path, max_postings=2)
+    docs = [chunk("pump " * tf) for tf in range(1, 6)]
+    index.add([str(tf) for tf in range(1, 6)], docs)
+    index.add(["x"], [chunk("unrelated text")])
+    assert [doc_id for doc_id, _ in index.search("pump", k=5)] == ["5", "4"]
+
+
+def test_delete_and_replace(tmp_path):
+    index = filled_index(tmp_path)
+    assert index.delete(["1", "missing"]) == 1
+    assert index.count() == 3
+    assert index.search("AB-1234", k=4) == []
+    index.add(["2"], [chunk("the valve AB-1234 is replaced")])
+    assert index.count() == 3
+    assert [doc_id for doc_id, _ in index.search("AB-1234", k=4)] == ["2"]
+    assert index.search("leaks", k=4) == []
+
+
+def test_sparse_indexing_vdb_from_texts(tmp_path):
+    index = make_index(tmp_path)
+    vdb = SparseIndexingVDB.from_texts(
+        ["pump inspection", "valve replacement"],
+        DeterministicFakeEmbedding(size=8),
+        metadatas=[{"source": "docs/a.pdf"}, {"source": "docs/b.pdf"}],
+        vdb_class=FAISS,
+        sparse_index=index,
+        ids=["a", "b"],
+    )
+    assert isinstance(vdb.vdb, FAISS) and vdb.vdb.index.ntotal == 2
+    assert [doc_id for doc_id, _ in index.search("valve", k=2)] == ["b"]
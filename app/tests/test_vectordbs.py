@@ -0,0 +1,163 @@
+import fcntl
+import os
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from services.vectordbs import FAISSVectorStore, ShardedFAISSVectorStore, ShardedVDB
+from utils.models import RetrievalFilter
+
+
+def make_store(path) -> FAISSVectorStore:
+    return FAISSVectorStore(
+        embeddings=DeterministicFakeEmbedding(size=8),
+        vector_db_path=str(path),
+        index_factory="Flat",
+        mmap_serving=False,
+    )
+
+
+def chunk(text: str) -> Document:
+    return Document(page_content=text, metadata={"source": f"docs/{text}.pdf"})
+
+
+def test_write_lock_reloads_generations_published_by_other_workers(tmp_path):
+    first, second = make_store(tmp_path), make_store(tmp_path)
+    first.get_vdb()
+    with second.write_lock():
+        second.get_vdb().add_documents([chunk("second")], ids=["b"])
+        second.persist()
+    with first.write_lock():
+        first.get_vdb().add_documents([chunk("first")], ids=["a"])
+        first.persist()
+    assert {"a", "b"} <= set(make_store(tmp_path).list_records())
+
+
+def test_write_lock_excludes_other_processes(tmp_path):
+    store = make_store(tmp_path)
+    with store.write_lock():
+        with open(os.path.join(tmp_path, "WRITE.lock"), "a") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                locked = True
+            else:
+                locked = False
+    assert locked
+
+
+def test_sharded_store_routes_and_merges_by_domain(tmp_path):
+    embeddings = DeterministicFakeEmbedding(size=8)
+    store = ShardedFAISSVectorStore(
+        embeddings=embeddings, vector_db_path=str(tmp_path), shard_by="domain"
+    )
+    texts = ["pump inspection", "valve replacement", "pump pressure"]
+    metadatas = [
+        {"source": "docs/a.pdf", "domain": "hr"},
+        {"source": "docs/b.pdf", "domain": "ops"},
+        {"source": "docs/c.pdf", "domain": "ops"},
+    ]
+    ShardedVDB.from_texts(
+        texts, embeddings, metadatas=metadatas, store=store, ids=["a", "b", "c"]
+    )
+    store.persist()
+    assert set(store.shards()) == {"hr", "ops"}
+
+    vector = embeddings.embed_query("valve replacement")
+    assert [d.page_content for d in store.search_by_vector(vector, k=1)] == [
+        "valve replacement"
+    ]
+    hits = store.search_by_vector(vector, k=3, filters=RetrievalFilter(domain="hr"))
+    assert [d.metadata["source"] for d in hits] == ["docs/a.pdf"]
+    assert [d.page_content if d else None for d in store.get_documents(["c", "x"])] == [
+        "pump pressure",
+        None,
+    ]
+
+
+def trained_store(path, factory: str, texts) -> FAISSVectorStore:
+    store = make_store(path)
+    store.get_vdb().add_documents([chunk(text) for text in texts], ids=list(texts))
+    store.compact()
+    store.train_index(factory)
+    return store
+
+
+def nearest_ids(store: FAISSVectorStore, texts, k: int = 1):
+    embed = store.embeddings.embed_query
+    return [
+        [doc.metadata["source"] for doc, _ in store.search_by_vector_with_score(embed(text), k)]
+        for text in texts
+    ]
+
+
+def test_ivf_delete_removes_vectors_in_place_and_keeps_positions(tmp_path):
+    texts = [f"chunk{i}" for i in range(40)]
+    store = trained_store(tmp_path, "IVF4,Flat", texts)
+    vdb = store.get_vdb()
+    index = vdb.index
+    deleted = ["chunk0", "chunk7", "chunk38"]
+    assert store.delete_ids(deleted) == 3
+    # no rebuild, and ids stay positional for the next add
+    assert vdb.index is index and index.ntotal == 37
+    assert sorted(vdb.index_to_docstore_id) == list(range(37))
+    vdb.add_documents([chunk("new")], ids=["new"])
+    kept = [text for text in texts if text not in deleted] + ["new"]
+    assert nearest_ids(store, kept) == [[f"docs/{text}.pdf"] for text in kept]
+    assert not set(store.list_records()) & set(deleted)
+
+
+def test_hnsw_delete_leaves_tombstones_out_of_searches_until_compaction(tmp_path):
+    texts = [f"chunk{i}" for i in range(20)]
+    store = trained_store(tmp_path, "HNSW8", texts)
+    vdb = store.get_vdb()
+    vdb.max_tombstone_ratio = 0.2
+    index = vdb.index
+    store.delete_ids(["chunk3", "chunk4"])
+    assert vdb.index is index and index.ntotal == 20 and store.count() == 18
+    vdb.add_documents([chunk("new")], ids=["new"])
+    assert vdb.index_to_docstore_id[20] == "new"
+    hits = {source for row in nearest_ids(store, texts, k=21) for source in row}
+    assert "docs/chunk3.pdf" not in hits and "docs/new.pdf" in hits
+    assert "docs/chunk4.pdf" not in {
+        doc.metadata["source"] for doc in vdb.similarity_search("chunk4", k=21)
+    }
+    # 5 tombstones in 21 vectors cross the ratio and rebuild the index
+    store.delete_ids(["chunk5", "chunk6", "chunk7"])
+    assert vdb.index is not index and vdb.index.ntotal == store.count() == 16
+    assert nearest_ids(store, ["new", "chunk8"]) == [["docs/new.pdf"], ["docs/chunk8.pdf"]]
+
+
+def test_filters_are_applied_before_the_nearest_neighbours_are_picked(tmp_path):
+    store = make_store(tmp_path)
+    texts = [f"page{page}" for page in range(1, 31)]
+    store.get_vdb().add_documents(
+        [
+            Document(
+                page_content=text,
+                metadata={
+                    "source": "docs/hr/a.pdf" if page <= 20 else "docs/ops/b.pdf",
+                    "domain": "hr" if page <= 20 else "ops",
+                    "page": page,
+                },
+            )
+            for page, text in enumerate(texts, start=1)
+        ],
+        ids=texts,
+    )
+    # the query is nearest to hr chunks, the ops ones are still found
+    vector = store.embeddings.embed_query("page3")
+    hits = store.search_by_vector(vector, k=4, filters=RetrievalFilter(domain="ops"))
+    assert len(hits) == 4 and {d.metadata["domain"] for d in hits} == {"ops"}
+    hits = store.search_by_vector(
+        vector,
+        k=10,
+        filters=RetrievalFilter(source="docs/hr/a.pdf", page_start=5, page_end=7),
+    )
+    assert sorted(d.metadata["page"] for d in hits) == [5, 6, 7]
+    no_match = RetrievalFilter(domain="ops", page_start=1, page_end=20)
+    assert store.search_by_vector(vector, k=4, filters=no_match) == []
+    # writes invalidate the metadata allowlists
+    store.delete_ids(["page21", "page22"])
+    hits = store.search_by_vector(vector, k=10, filters=RetrievalFilter(domain="ops"))
+    assert sorted(d.metadata["page"] for d in hits) == list(range(23, 31))
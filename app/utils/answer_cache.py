@@ -0,0 +1,239 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from utils.loggers import logger
+
+
+class SemanticAnswerCache:
+    """
+    Cache of final chat answers, looked up by query-embedding similarity.
+    Entries live in SQLite so every worker shares them; each worker keeps an in-memory
+    matrix of the normalized query vectors and reloads it when the table generation changes.
+    """
+
+    def __init__(
+        self, db_path: str, threshold: float, max_entries: int, ttl_seconds: float
+    ):
+        """
+        :param db_path: Path of the SQLite file holding the cache
+        :param threshold: minimum cosine similarity for a cached answer to be served
+        :param max_entries: maximum number of cached answers, least recently hit are evicted
+        :param ttl_seconds: maximum age of a cached answer
+        """
+        self.db_path = db_path
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._generation: Optional[int] = None
+        self._ids = np.empty(0, dtype=np.int64)
+        self._created_at = np.empty(0, dtype=np.float64)
+        self._matrix: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+        self._schema_ready = False
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._schema_ready:
+            self.create_schema()
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def create_schema(self) -> None:
+        """
+        Create the cache tables if they do not exist yet.
+        :return: None
+        """
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        with sqlite3.connect(self.db_path, timeout=30) as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS answer_cache (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    query TEXT NOT NULL,
+                    embedding BLOB NOT NULL,
+                    answer TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_hit REAL NOT NULL
+                )
+                """
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS answer_cache_sources "
+                "(entry_id INTEGER NOT NULL, source TEXT NOT NULL)"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS ix_answer_cache_sources_source "
+                "ON answer_cache_sources (source)"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS answer_cache_meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)"
+            )
+            connection.execute(
+                "INSERT OR IGNORE INTO answer_cache_meta (name, value) VALUES ('generation', 0)"
+            )
+        self._schema_ready = True
+
+    @staticmethod
+    def _bump_generation(connection: sqlite3.Connection) -> None:
+        connection.execute(
+            "UPDATE answer_cache_meta SET value = value + 1 WHERE name = 'generation'"
+        )
+
+    def _sync(self, connection: sqlite3.Connection) -> None:
+        """
+        Reload the in-memory vector matrix if any worker changed the table since the last load
+        """
+        generation = connection.execute(
+            "SELECT value FROM answer_cache_meta WHERE name = 'generation'"
+        ).fetchone()[0]
+        if generation == self._generation:
+            return
+        rows = connection.execute(
+            "SELECT id, embedding, created_at FROM answer_cache"
+        ).fetchall()
+        self._ids = np.array([row[0] for row in rows], dtype=np.int64)
+        self._created_at = np.array([row[2] for row in rows], dtype=np.float64)
+        self._matrix = (
+            np.vstack([np.frombuffer(row[1], dtype=np.float32) for row in rows])
+            if rows
+            else None
+        )
+        self._generation = generation
+
+    @staticmethod
+    def _normalize(vector: List[float]) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, embedding: List[float]) -> Optional[Dict[str, Any]]:
+        """
+        :param embedding: embedding of the incoming query
+        :return: the cached answer of the most similar query above the threshold, or None
+        """
+        query_vector = self._normalize(embedding)
+        with self._lock, self._connect() as connection:
+            self._sync(connection)
+            if self._matrix is None or self._matrix.shape[1] != query_vector.shape[0]:
+                self.misses += 1
+                return None
+            scores = self._matrix @ query_vector
+            scores[self._created_at < time.time() - self.ttl_seconds] = -1.0
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                self.misses += 1
+                return None
+            entry_id = int(self._ids[best])
+            row = connection.execute(
+                "SELECT answer FROM answer_cache WHERE id = ?", (entry_id,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            connection.execute(
+                "UPDATE answer_cache SET last_hit = ? WHERE id = ?",
+                (time.time(), entry_id),
+            )
+            self.hits += 1
+            logger.info(f"Answer cache hit with similarity {scores[best]:.4f}")
+            return json.loads(row[0])
+
+    def put(
+        self,
+        query: str,
+        embedding: List[float],
+        answer: Dict[str, Any],
+        sources: Iterable[str],
+    ) -> None:
+        """
+        Store an answer, then evict expired and least recently hit entries beyond max_entries.
+        Answers citing no source are not stored: no ingest could ever invalidate them,
+        although a new document may well answer the query.
+        :param query: query text, kept for inspection
+        :param embedding: embedding of the query
+        :param answer: final response with resolved citations
+        :param sources: sources cited by the answer, used for invalidation
+        :return: None
+        """
+        sources = set(sources)
+        if not sources:
+            return
+        now = time.time()
+        with self._lock, self._connect() as connection:
+            cursor = connection.execute(
+                "INSERT INTO answer_cache (query, embedding, answer, created_at, last_hit) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (
+                    query,
+                    self._normalize(embedding).tobytes(),
+                    json.dumps(answer),
+                    now,
+                    now,
+                ),
+            )
+            connection.executemany(
+                "INSERT INTO answer_cache_sources (entry_id, source) VALUES (?, ?)",
+                [(cursor.lastrowid, source) for source in sources],
+            )
+            connection.execute(
+                "DELETE FROM answer_cache WHERE created_at < ? OR id IN ("
+                "SELECT id FROM answer_cache ORDER BY last_hit DESC LIMIT -1 OFFSET ?)",
+                (now - self.ttl_seconds, self.max_entries),
+            )
+            connection.execute(
+                "DELETE FROM answer_cache_sources WHERE entry_id NOT IN (SELECT id FROM answer_cache)"
+            )
+            self._bump_generation(connection)
+
+    def invalidate_sources(self, sources: Iterable[str]) -> int:
+        """
+        Drop every cached answer citing one of the given sources.
+        :param sources: re-ingested sources
+        :return: number of dropped answers
+        """
+        sources = list(set(sources))
+        if not sources:
+            return 0
+        placeholders = ",".join("?" * len(sources))
+        with self._lock, self._connect() as connection:
+            entry_ids = [
+                row[0]
+                for row in connection.execute(
+                    f"SELECT DISTINCT entry_id FROM answer_cache_sources WHERE source IN ({placeholders})",
+                    sources,
+                ).fetchall()
+            ]
+            if not entry_ids:
+                return 0
+            id_placeholders = ",".join("?" * len(entry_ids))
+            connection.execute(
+                f"DELETE FROM answer_cache WHERE id IN ({id_placeholders})", entry_ids
+            )
+            connection.execute(
+                f"DELETE FROM answer_cache_sources WHERE entry_id IN ({id_placeholders})",
+                entry_ids,
+            )
+            self._bump_generation(connection)
+        logger.info(f"Invalidated {len(entry_ids)} cached answers")
+        return len(entry_ids)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        :return: size, hit / miss counters and hit ratio of this worker
+        """
+        total = self.hits + self.misses
+        return {
+            "size": int(self._ids.shape[0]),
+            "max_size": self.max_entries,
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+        }
@@ -0,0 +1,288 @@
+import asyncio
+import hashlib
+import os
+import posixpath
+import uuid
+import zipfile
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+from utils.helpers import ChatService
+from utils.loggers import logger
+from utils.metrics import stage
+from utils.variables import UPLOAD_CHUNK_SIZE
+from utils.workers import WorkerPool, iter_queue
+
+
+@dataclass
+class BulkFile:
+    """One PDF of a bulk upload, either uploaded directly or extracted from a ZIP archive."""
+
+    filename: str
+    domain: Optional[str]
+    path: Optional[str] = None
+    sha256: Optional[str] = None
+    status: str = "pending"
+    num_chunks: int = 0
+    error: Optional[str] = None
+
+    @property
+    def source(self) -> str:
+        # same rule as single uploads, ZIP members keep their folder
+        return ChatService.upload_source(self.filename, self.domain)
+
+
+def member_name(name: str) -> Optional[str]:
+    """
+    :param name: path of a ZIP archive member
+    :return: normalised relative path, None for folders, non PDF files and macOS metadata
+    """
+    name = posixpath.normpath(name.replace("\\", "/")).lstrip("/")
+    if (
+        name.startswith(("..", "__MACOSX/"))
+        or posixpath.basename(name).startswith(".")
+        or not name.lower().endswith(".pdf")
+    ):
+        return None
+    return name
+
+
+class BulkIngestor:
+    """
+    Ingests many PDFs in one request.
+    Uploads and ZIP members are spooled under unique names while their SHA-256 is computed,
+    files repeating the content of an earlier file of the batch or of the file already
+    indexed under the same source and domain are skipped before parsing, as are files
+    whose source (domain and path) an earlier file of the batch already has,
+    the rest are loaded and chunked concurrently in the process pool (at most `concurrency`
+    files at a time) and all chunks go through a single index() run committing
+    `batch_size` chunks per batch, so the vector store is persisted once per request.
+    """
+
+    def __init__(
+        self,
+        chat: ChatService,
+        workers: WorkerPool,
+        spool_dir: str,
+        concurrency: int,
+        batch_size: int,
+        max_files: int,
+        max_uncompressed_bytes: int,
+    ):
+        """
+        :param chat: ChatService used to parse and index the files
+        :param workers: worker pool running parsing and indexing
+        :param spool_dir: directory holding the uploads while they are processed
+        :param concurrency: maximum number of files parsed at the same time
+        :param batch_size: number of chunks embedded and committed per batch
+        :param max_files: maximum number of PDFs per request, ZIP members included
+        :param max_uncompressed_bytes: maximum total size of the PDFs extracted from
+            the ZIP archives of a request
+        """
+        self.chat = chat
+        self.workers = workers
+        self.spool_dir = spool_dir
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.max_files = max_files
+        self.max_uncompressed_bytes = max_uncompressed_bytes
+
+    def _spool_path(self) -> str:
+        os.makedirs(self.spool_dir, exist_ok=True)
+        return os.path.join(self.spool_dir, f"{uuid.uuid4().hex}.pdf")
+
+    def unpack_zip(
+        self, zip_path: str, limit: int, max_bytes: int
+    ) -> List[Tuple[str, str, str]]:
+        """
+        Extract the PDFs of a ZIP archive to unique spool files, member names are never
+        used as paths. The declared sizes are checked before extracting and the bytes
+        actually written while extracting, as archive headers can understate them.
+        :param limit: maximum number of PDFs accepted from the archive
+        :param max_bytes: maximum total uncompressed size of the PDFs
+        :raises ValueError: when the archive holds more than `limit` PDFs or more than
+            `max_bytes` bytes, nothing is kept
+        :return: (member name, spool path, SHA-256 hex digest) per PDF
+        """
+        extracted = []
+        too_large = ValueError(
+            f"Bulk upload is limited to {self.max_uncompressed_bytes} uncompressed bytes"
+        )
+        with zipfile.ZipFile(zip_path) as archive:
+            members = [
+                (name, info)
+                for info in archive.infolist()
+                if not info.is_dir() and (name := member_name(info.filename))
+            ]
+            if len(members) > limit:
+                raise ValueError(f"Bulk upload is limited to {self.max_files} PDFs")
+            if sum(info.file_size for _, info in members) > max_bytes:
+                raise too_large
+            written = 0
+            try:
+                for name, info in members:
+                    path, digest = self._spool_path(), hashlib.sha256()
+                    extracted.append((name, path, None))
+                    with archive.open(info) as member, open(path, "wb") as spool_file:
+                        while chunk := member.read(UPLOAD_CHUNK_SIZE):
+                            written += len(chunk)
+                            if written > max_bytes:
+                                raise too_large
+                            digest.update(chunk)
+                            spool_file.write(chunk)
+                    extracted[-1] = (name, path, digest.hexdigest())
+            except Exception:
+                for _, path, _ in extracted:
+                    if os.path.exists(path):
+                        os.remove(path)
+                raise
+        return extracted
+
+    async def spool(
+        self,
+        files: list,
+        domains: Dict[str, str],
+        default_domain: Optional[str],
+    ) -> List[BulkFile]:
+        """
+        Spool uploaded PDFs and ZIP archives, marking repeated content as duplicate
+        :param files: UploadFiles, PDFs or ZIP archives of PDFs
+        :param domains: file name or ZIP member path -> domain
+        :param default_domain: domain of files missing in `domains`
+        :raises ValueError: when the request holds more than `max_files` PDFs
+        :return: one BulkFile per PDF, in upload order
+        """
+        bulk_files: List[BulkFile] = []
+        seen: Dict[str, str] = {}
+        sources = set()
+        unpacked_bytes = 0
+
+        def add(filename: str, path: str, sha256: str) -> None:
+            if len(bulk_files) >= self.max_files:
+                os.remove(path)
+                raise ValueError(f"Bulk upload is limited to {self.max_files} PDFs")
+            bulk_file = BulkFile(
+                filename=filename,
+                domain=domains.get(filename, default_domain),
+                path=path,
+                sha256=sha256,
+            )
+            if sha256 in seen:
+                bulk_file.status = "duplicate"
+                bulk_file.error = f"Same content as {seen[sha256]}"
+            elif bulk_file.source in sources:
+                # cleanup of one index() run would keep the chunks of only one of them
+                bulk_file.status = "failed"
+                bulk_file.error = f"Another file of the upload is indexed as {bulk_file.source}"
+            else:
+                seen[sha256] = filename
+                sources.add(bulk_file.source)
+            bulk_files.append(bulk_file)
+
+        try:
+            for file in files:
+                path, sha256 = await self.chat.spool_upload(file, spool_dir=self.spool_dir)
+                if not zipfile.is_zipfile(path):
+                    add(os.path.basename(file.filename), path, sha256)
+                    continue
+                try:
+                    members = await self.workers.run_io(
+                        self.unpack_zip,
+                        path,
+                        limit=self.max_files - len(bulk_files),
+                        max_bytes=self.max_uncompressed_bytes - unpacked_bytes,
+                    )
+                finally:
+                    os.remove(path)
+                for member in members:
+                    unpacked_bytes += os.path.getsize(member[1])
+                    add(*member)
+
+            # exact re-uploads of already indexed files are not parsed again
+            for bulk_file in bulk_files:
+                if bulk_file.status == "pending" and await self.workers.run_io(
+                    self.chat.find_upload,
+                    bulk_file.sha256,
+                    bulk_file.source,
+                    bulk_file.domain,
+                ):
+                    bulk_file.status, bulk_file.error = "duplicate", "Already uploaded"
+        except Exception:
+            self.cleanup(bulk_files)
+            raise
+        return bulk_files
+
+    async def ingest(self, bulk_files: List[BulkFile]) -> Dict[str, int]:
+        """
+        Parse the new files concurrently and index all their chunks in one index() run.
+        Files failing to parse are reported and skipped, the others are still indexed.
+        :param bulk_files: spooled files, statuses are updated in place
+        :return: index counts -> num_added, num_updated, num_skipped, num_deleted
+        """
+        loop = asyncio.get_running_loop()
+        parsed: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        # filled while parsing, recorded by index_docs once every chunk is indexed
+        uploads: Dict[str, str] = {}
+
+        async def parse(bulk_file: BulkFile) -> None:
+            async with semaphore:
+                try:
+                    # load and chunk run together in a worker process
+                    with stage("load_chunk"):
+                        docs = await self.workers.run_cpu(
+                            ChatService.process_pdfs,
+                            doc_path=bulk_file.path,
+                            source=bulk_file.source,
+                            loader=self.chat.loader,
+                            chunker=self.chat.chunker,
+                        )
+                except Exception as e:
+                    logger.error(f"Bulk upload failed to parse {bulk_file.filename}: {e}")
+                    bulk_file.status, bulk_file.error = "failed", str(e)
+                    return
+            for doc in docs:
+                doc.metadata["domain"] = bulk_file.domain
+            bulk_file.status, bulk_file.num_chunks = "indexed", len(docs)
+            uploads[bulk_file.source] = bulk_file.sha256
+            await parsed.put(docs)
+
+        async def produce() -> None:
+            await asyncio.gather(
+                *(parse(f) for f in bulk_files if f.status == "pending")
+            )
+            await parsed.put(None)
+
+        def chunks() -> Iterator[Document]:
+            # runs in the indexing thread, pulls parsed files as they complete
+            for docs in iter_queue(parsed, loop):
+                yield from docs
+
+        producer = asyncio.ensure_future(produce())
+        try:
+            return await self.workers.run_io(
+                self.chat.index_docs,
+                docs=chunks(),
+                batch_size=self.batch_size,
+                uploads=uploads,
+            )
+        finally:
+            # only still running when indexing failed or the request was cancelled,
+            # in which case the indexing thread is told to stop as well
+            if not producer.done():
+                producer.cancel()
+                while not parsed.empty():
+                    parsed.get_nowait()
+                parsed.put_nowait(RuntimeError("Bulk upload cancelled"))
+
+    @staticmethod
+    def cleanup(bulk_files: List[BulkFile]) -> None:
+        """
+        Remove the spool files of a bulk upload
+        :return: None
+        """
+        for bulk_file in bulk_files:
+            if bulk_file.path and os.path.exists(bulk_file.path):
+                os.remove(bulk_file.path)
@@ -0,0 +1,117 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+
+def normalize_query(query: str) -> str:
+    """
+    Normalize a user query for cache keys: case-folded, whitespace collapsed
+    :param query: raw query
+    :return: normalized query
+    """
+    return " ".join(query.split()).casefold()
+
+
+class LRUCache:
+    """
+    Thread-safe in-process LRU cache with an optional time-to-live per entry.
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: Optional[float] = None):
+        """
+        :param max_size: maximum number of entries, least recently used are evicted first
+        :param ttl_seconds: entry lifetime, None keeps entries until evicted
+        """
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        :return: cached value, or None on a miss or an expired entry
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (
+                self.ttl_seconds is None or time.monotonic() - entry[1] < self.ttl_seconds
+            ):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        :return: size, hit / miss counters and hit ratio
+        """
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+class IndexVersion:
+    """
+    Version of the vector index shared by all worker processes through a small file.
+    Ingest bumps it after every write, so cache entries keyed on an older version are never served.
+    """
+
+    def __init__(self, path: str):
+        """
+        :param path: file holding the current version
+        """
+        self.path = path
+        self._mtime_ns: Optional[int] = None
+        self._version = "0"
+
+    def current(self) -> str:
+        """
+        :return: current index version, re-read only when the file changed
+        """
+        try:
+            mtime_ns = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return self._version
+        if mtime_ns != self._mtime_ns:
+            with open(self.path) as version_file:
+                self._version = version_file.read().strip() or "0"
+            self._mtime_ns = mtime_ns
+        return self._version
+
+    def bump(self, version: Optional[str] = None) -> str:
+        """
+        Publish a new index version atomically.
+        :param version: version to publish, defaults to the current time in nanoseconds
+        :return: the new version
+        """
+        version = version or str(time.time_ns())
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(temp_path, "w") as version_file:
+            version_file.write(version)
+        os.replace(temp_path, self.path)
+        self._version = version
+        return version
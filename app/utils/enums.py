@@ -1,25 +1,70 @@
 from enum import Enum
+from functools import lru_cache
+from importlib import import_module
 
-# define custom services
-from services.embeddings import HFEmbeddings
-from services.llms import GeminiLLMProvider
-from services.vectordbs import ChromaVectorStore, FAISSVectorStore
 
+@lru_cache(maxsize=None)
+def import_provider(path: str) -> type:
+    """
+    :param path: "<module>:<class>" import path of a provider class
+    :return: the provider class, its module is imported on first use
+    """
+    module, _, name = path.partition(":")
+    return getattr(import_module(module), name)
+
+
+class ProviderEnum(Enum):
+    """
+    Provider enums hold import paths instead of classes, so importing the settings does not
+    import every backend (and its SDK) - only the configured providers are loaded, when
+    `provider` is first resolved.
+    """
+
+    @property
+    def provider(self) -> type:
+        return import_provider(self.value)
 
-class LLMModels(Enum):
+
+# define custom services
+class LLMModels(ProviderEnum):
     """LLM Model Providers"""
 
-    GEMINI = GeminiLLMProvider
+    GEMINI = "services.llms:GeminiLLMProvider"
 
 
-class VectorStores(Enum):
+class VectorStores(ProviderEnum):
     """Vector Store Providers"""
 
-    CHROMA = ChromaVectorStore
-    FAISS = FAISSVectorStore
+    CHROMA = "services.vectordbs:ChromaVectorStore"
+    FAISS = "services.vectordbs:FAISSVectorStore"
+    SHARDED_CHROMA = "services.vectordbs:ShardedChromaVectorStore"
+    SHARDED_FAISS = "services.vectordbs:ShardedFAISSVectorStore"
 
 
-class Embeddings(Enum):
+class Embeddings(ProviderEnum):
     """Embedding Model Providers"""
 
-    HUGGINGFACE = HFEmbeddings
+    HUGGINGFACE = "services.embeddings:HFEmbeddings"
+
+
+class Loaders(ProviderEnum):
+    """Document Loader Providers"""
+
+    PDF = "services.loaders:PDFLoader"
+    SHARDED_PDF = "services.loaders:ShardedPDFLoader"
+
+
+class Rerankers(ProviderEnum):
+    """Reranker Providers"""
+
+    CROSS_ENCODER = "services.rerankers:CrossEncoderReranker"
+    NONE = "services.rerankers:PassthroughReranker"
+
+
+class Chunkers(ProviderEnum):
+    """Document Chunker Providers"""
+
+    RECURSIVE = "services.chunkers:RTChunker"
+    TOKEN = "services.chunkers:TokenChunker"
+    SENTENCE = "services.chunkers:SentenceChunker"
+    SEMANTIC = "services.chunkers:SemanticChunker"
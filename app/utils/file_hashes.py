@@ -0,0 +1,134 @@
+import hashlib
+import os
+import sqlite3
+import time
+from typing import Any, Dict, Iterable, Optional
+
+from utils.variables import UPLOAD_CHUNK_SIZE
+
+
+def file_sha256(path: str, chunk_size: int = UPLOAD_CHUNK_SIZE) -> str:
+    """
+    :param path: file to hash, read in fixed-size chunks
+    :return: SHA-256 hex digest of the file content
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        while chunk := file.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class FileHashStore:
+    """
+    SQLite table of the uploaded file currently indexed under each source and domain.
+    An upload whose content hash, source and domain match the recorded ones would only
+    produce chunks index() skips, so it is rejected before any parsing or embedding.
+    Rows follow the index: a source re-uploaded to the same domain with other content
+    replaces its row, and sources dropped from the vector store are forgotten.
+    """
+
+    def __init__(self, db_path: str):
+        """
+        :param db_path: Path of the SQLite file holding the hash table
+        """
+        self.db_path = db_path
+        self._schema_ready = False
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._schema_ready:
+            self.create_schema()
+        connection = sqlite3.connect(self.db_path, timeout=30)
+        connection.row_factory = sqlite3.Row
+        return connection
+
+    def create_schema(self) -> None:
+        """
+        Create the hash table if it does not exist yet, rows are unique per source and domain.
+        :return: None
+        """
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        with sqlite3.connect(self.db_path, timeout=30) as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            primary_key = [
+                row[1]
+                for row in connection.execute("PRAGMA table_info(file_hashes)")
+                if row[5]
+            ]
+            if primary_key == ["source"]:
+                # tables created before rows were keyed by domain as well
+                connection.execute("ALTER TABLE file_hashes RENAME TO file_hashes_by_source")
+            connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS file_hashes (
+                    source TEXT NOT NULL,
+                    sha256 TEXT NOT NULL,
+                    domain TEXT,
+                    num_chunks INTEGER NOT NULL,
+                    uploaded_at REAL NOT NULL
+                )
+                """
+            )
+            # the domain may be NULL, which a plain unique index would never match
+            connection.execute(
+                "CREATE UNIQUE INDEX IF NOT EXISTS ux_file_hashes_source_domain "
+                "ON file_hashes (source, IFNULL(domain, ''))"
+            )
+            if primary_key == ["source"]:
+                connection.execute(
+                    "INSERT INTO file_hashes SELECT source, sha256, domain, num_chunks, "
+                    "uploaded_at FROM file_hashes_by_source"
+                )
+                connection.execute("DROP TABLE file_hashes_by_source")
+        self._schema_ready = True
+
+    def find(
+        self, sha256: str, source: str, domain: Optional[str]
+    ) -> Optional[Dict[str, Any]]:
+        """
+        :return: the recorded upload of the same content under the same source and domain,
+            or None
+        """
+        with self._connect() as connection:
+            row = connection.execute(
+                "SELECT * FROM file_hashes WHERE source = ? AND sha256 = ? AND domain IS ?",
+                (source, sha256, domain),
+            ).fetchone()
+        return dict(row) if row else None
+
+    def record(self, uploads: Iterable[Dict[str, Any]], replace_all: bool = False) -> None:
+        """
+        Record the files just indexed, replacing earlier uploads of the same sources and domains
+        :param uploads: dicts with sha256, source, domain and num_chunks
+        :param replace_all: forget every other source first, after a "full" index cleanup
+        :return: None
+        """
+        now = time.time()
+        with self._connect() as connection:
+            if replace_all:
+                connection.execute("DELETE FROM file_hashes")
+            connection.executemany(
+                "INSERT OR REPLACE INTO file_hashes (source, sha256, domain, num_chunks, "
+                "uploaded_at) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (
+                        upload["source"],
+                        upload["sha256"],
+                        upload["domain"],
+                        upload["num_chunks"],
+                        now,
+                    )
+                    for upload in uploads
+                ],
+            )
+
+    def forget(self, sources: Iterable[str]) -> int:
+        """
+        :param sources: sources removed from the vector store
+        :return: number of forgotten uploads
+        """
+        with self._connect() as connection:
+            return connection.executemany(
+                "DELETE FROM file_hashes WHERE source = ?",
+                [(source,) for source in set(sources)],
+            ).rowcount
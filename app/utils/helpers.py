@@ -1,75 +1,393 @@
+import asyncio
+import hashlib
 import os
-from typing import Any, List
+import posixpath
+import threading
+import uuid
+from collections import Counter, deque
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Type
+from urllib.parse import quote
 
-from langchain.indexes import SQLRecordManager, index
 from langchain_core.documents import Document
+from langchain_core.indexing import index
+from langchain_core.utils.json import parse_partial_json
 
-from services.chunkers import RTChunker
-from services.embeddings import HFEmbeddings
-from services.loaders import PDFLoader
-from services.vectordbs import ChromaVectorStore, FAISSVectorStore
-from utils.variables import SQL_MANAGER_NAMESPACE, SQLITE_DB_URL, VECTOR_DB_PATH
+from services.chunkers import BaseChunker, RTChunker
+from services.loaders import BaseLoader, PDFLoader
+from services.sparse_index import SparseIndexingVDB
+from services.vectordbs import BaseVectorStore, ShardedVectorStore
+from utils.metrics import CHUNKS_TOTAL, stage
+from utils.models import ChatResponse
+from utils.registry import ProviderRegistry
+from utils.variables import (
+    CONTEXT_CHARS_PER_TOKEN,
+    CONTEXT_TOKEN_BUDGET,
+    INDEX_CLEANUP_MODE,
+    INGEST_BATCH_SIZE,
+    PDF_SHARD_PAGES,
+    UPLOAD_CHUNK_SIZE,
+)
+from utils.workers import WorkerPool, iter_queue
+
+if TYPE_CHECKING:
+    from services.record_managers import PooledSQLRecordManager
 
 
 class ChatService:
-    def __init__(self, llm, embeddings, vectorstore):
+    def __init__(
+        self,
+        llm,
+        embeddings,
+        vectorstore,
+        registry: ProviderRegistry,
+        loader=None,
+        chunker=None,
+    ):
         self.llm = llm
         self.embeddings = embeddings
         self.vectorstore = vectorstore
+        self.loader = loader.provider if loader else PDFLoader
+        self.chunker = chunker.provider if chunker else RTChunker
+        self.registry = registry
+        self._write_lock = threading.Lock()
+
+    def get_record_manager(self) -> "PooledSQLRecordManager":
+        """
+        Returns the application-scoped record manager held by the provider registry
+        :return: PooledSQLRecordManager instance
+        """
+        return self.registry.get_record_manager()
 
     @staticmethod
-    def instantiate_record_manager() -> SQLRecordManager:
+    async def spool_upload(
+        file, spool_dir: str, chunk_size: int = UPLOAD_CHUNK_SIZE
+    ) -> Tuple[str, str]:
         """
-        Initializes and creates the schema for SQLRecordManager
-        :return: Initialized SQLRecordManager instance
+        Streams the uploaded file to a unique spool file in fixed-size chunks while hashing it,
+        so memory per upload stays bounded and uploads with the same name never collide.
+        :param spool_dir: directory of the spool file, persistent for background jobs
+        :param chunk_size: bytes read and written per step
+        :return: (spool path, SHA-256 hex digest of the content)
         """
-        record_manager = SQLRecordManager(
-            namespace=SQL_MANAGER_NAMESPACE, db_url=SQLITE_DB_URL
-        )
-        record_manager.create_schema()
-        return record_manager
+        os.makedirs(spool_dir, exist_ok=True)
+        spool_path = os.path.join(spool_dir, f"{uuid.uuid4().hex}.pdf")
+        digest = hashlib.sha256()
+        try:
+            with open(spool_path, "wb") as spool_file:
+                while chunk := await file.read(chunk_size):
+                    digest.update(chunk)
+                    spool_file.write(chunk)
+        except Exception:
+            os.remove(spool_path)
+            raise
+        return spool_path, digest.hexdigest()
 
-    async def handle_temp_dir(self, file) -> str:
+    @staticmethod
+    def upload_source(filename: str, domain: Optional[str]) -> str:
         """
-        Handles saving the uploaded file to a temporary directory.
-        :return: The path where the file is saved
+        index() cleanup, the file hash table and answer cache invalidation all group chunks
+        by source, so files of the same name uploaded to different domains, or in different
+        folders of a ZIP archive, must not share one -> "docs/<domain>/<relative path>",
+        the domain percent-encoded and "_" when missing
+        :param filename: name of the uploaded file, or path of a ZIP archive member
+        :param domain: domain of the upload
+        :return: source stored in the metadata of the file's chunks
         """
-        os.makedirs("docs", exist_ok=True)
-        os.makedirs(os.path.dirname(VECTOR_DB_PATH), exist_ok=True)
-        with open(f"docs/{file.filename}", "wb") as temp_file:
-            temp_file.write(await file.read())
-        return f"docs/{file.filename}"
+        folder = quote(domain, safe="") if domain else "_"
+        parts = [
+            part
+            for part in filename.replace("\\", "/").split("/")
+            if part not in ("", ".", "..")
+        ]
+        return posixpath.join("docs", folder, *parts)
+
+    def find_upload(
+        self, sha256: str, source: str, domain: Optional[str]
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Checks whether the exact same file is already indexed under this source and domain
+        :return: the recorded upload, or None when the file has to be indexed
+        """
+        return self.registry.file_hashes.find(sha256, source=source, domain=domain)
 
     @staticmethod
-    def process_pdfs(doc_path: str):
+    def process_pdfs(
+        doc_path: str,
+        source: Optional[str] = None,
+        loader: Type[BaseLoader] = PDFLoader,
+        chunker: Type[BaseChunker] = RTChunker,
+    ):
         """
         Processes the PDF document: loads and chunks the document
         :param doc_path: The path to the PDF file
+        :param source: Optional source name overriding doc_path in chunk metadata
+        :param loader: BaseLoader implementation used to load the pages
+        :param chunker: BaseChunker implementation used to split the pages
         :return: Chunked document list
         """
-        docs = PDFLoader.get_docs(doc_path=doc_path)
-        return RTChunker(docs=docs).split_docs()
+        docs = loader.get_docs(doc_path=doc_path)
+        chunks = chunker(docs=docs).split_docs()
+        if source:
+            for chunk in chunks:
+                chunk.metadata["source"] = source
+        return chunks
 
-    def get_vector_store(self) -> ChromaVectorStore:
-        # todo : add from settings / class instantiated methods
+    @staticmethod
+    def process_pages(
+        doc_path: str,
+        start: int,
+        end: Optional[int],
+        source: str,
+        domain: Optional[str],
+        loader: Type[BaseLoader] = PDFLoader,
+        chunker: Type[BaseChunker] = RTChunker,
+    ) -> List[Document]:
+        """
+        Loads and chunks the pages [start, end) of a PDF, run in a worker process
+        :param doc_path: The path to the PDF file
+        :param start: first page of the range
+        :param end: page after the range, None for the rest of the document
+        :param source: source name stored in chunk metadata
+        :param domain: domain stored in chunk metadata
+        :param loader: BaseLoader implementation used to load the pages
+        :param chunker: BaseChunker implementation used to split the pages
+        :return: annotated chunks of the page range
         """
-        Returns a FAISSVectorStore object with embeddings
-        :return: FAISSVectorStore instance
+        chunks = list(chunker().split_stream(loader.iter_pages(doc_path, start, end)))
+        for chunk in chunks:
+            chunk.metadata["source"] = source
+            chunk.metadata["domain"] = domain
+        return chunks
+
+    async def index_pdf(
+        self,
+        workers: WorkerPool,
+        doc_path: str,
+        domain: Optional[str],
+        source: str,
+        uploads: Optional[Dict[str, str]] = None,
+        progress: Optional[Callable[[Iterator[Document]], Iterator[Document]]] = None,
+        shard_pages: int = PDF_SHARD_PAGES,
+    ) -> Dict[str, int]:
+        """
+        Streaming ingest pipeline: page ranges of `shard_pages` pages are loaded and chunked
+        in the process pool, at most one range per worker process in flight, and their chunks
+        are handed over in page order to index_docs running in the thread pool.
+        Parsing never runs in the indexing thread under the write locks, the first range is
+        parsed before they are taken, and the whole document is never held in memory.
+        :param workers: worker pool running parsing and indexing
+        :param doc_path: The path to the PDF file
+        :param domain: domain stored in every chunk's metadata
+        :param source: source name stored in every chunk's metadata
+        :param uploads: source -> SHA-256 of the uploaded file, see index_docs
+        :param progress: optional wrapper of the chunk stream run in the indexing thread,
+            e.g. job progress reporting
+        :param shard_pages: number of pages per range
+        :return: index counts -> num_added, num_updated, num_skipped, num_deleted
         """
-        return ChromaVectorStore(
-            embeddings=HFEmbeddings.get_embeddings(), vector_db_path=VECTOR_DB_PATH
+        num_pages = await workers.run_io(self.loader.num_pages, doc_path)
+        ranges = (
+            [
+                (start, min(start + shard_pages, num_pages))
+                for start in range(0, num_pages, shard_pages)
+            ]
+            if num_pages is not None
+            # loaders without page ranges parse the whole document in one worker process
+            else [(0, None)]
         )
+        loop = asyncio.get_running_loop()
+        parsed: asyncio.Queue = asyncio.Queue(maxsize=workers.process_workers)
+
+        async def parse(start: int, end: Optional[int]) -> List[Document]:
+            with stage("load_chunk"):
+                return await workers.run_cpu(
+                    ChatService.process_pages,
+                    doc_path,
+                    start,
+                    end,
+                    source=source,
+                    domain=domain,
+                    loader=self.loader,
+                    chunker=self.chunker,
+                )
+
+        async def produce() -> None:
+            pending = deque()
+            try:
+                for start, end in ranges:
+                    pending.append(asyncio.ensure_future(parse(start, end)))
+                    if len(pending) >= workers.process_workers:
+                        await parsed.put(await pending.popleft())
+                while pending:
+                    await parsed.put(await pending.popleft())
+                await parsed.put(None)
+            except Exception as e:
+                await parsed.put(e)
+            finally:
+                for future in pending:
+                    future.cancel()
+
+        producer = asyncio.ensure_future(produce())
+        try:
+            first = await parsed.get()
+            if isinstance(first, Exception):
+                raise first
+
+            def chunks() -> Iterator[Document]:
+                # runs in the indexing thread, pulls parsed page ranges in page order
+                if first is None:
+                    return
+                yield from first
+                for docs in iter_queue(parsed, loop):
+                    yield from docs
+
+            docs = chunks()
+            return await workers.run_io(
+                self.index_docs, docs=progress(docs) if progress else docs, uploads=uploads
+            )
+        finally:
+            # only still running when indexing failed or the request was cancelled,
+            # in which case the indexing thread is told to stop as well
+            if not producer.done():
+                producer.cancel()
+                while not parsed.empty():
+                    parsed.get_nowait()
+                parsed.put_nowait(RuntimeError("Ingest cancelled"))
+
+    def get_vector_store(self) -> BaseVectorStore:
+        """
+        Returns the shared vector store handle configured in settings
+        :return: BaseVectorStore instance
+        """
+        return self.registry.get_vector_store(self.vectorstore)
+
+    def index_docs(
+        self,
+        docs: Iterable[Document],
+        cleanup: Optional[str] = INDEX_CLEANUP_MODE,
+        batch_size: int = INGEST_BATCH_SIZE,
+        uploads: Optional[Dict[str, str]] = None,
+    ) -> Dict[str, int]:
+        """
+        Single write path for ingest: the record manager decides which chunks are new,
+        only those are embedded and written to the vector store, then the store is persisted.
+        With cleanup="scoped_full", stale chunks of the re-uploaded sources are deleted once
+        every batch is written, so a failed stream never leaves a document half deleted
+        ("incremental" cleans up after each batch, deleting chunks later batches rewrite).
+        Chunks are consumed lazily and committed in micro-batches of `batch_size`; after a
+        partial failure, re-indexing skips every batch the record manager already holds.
+        :param docs: List or stream of chunked documents
+        :param cleanup: langchain index cleanup mode
+            (None | "scoped_full" | "incremental" | "full")
+        :param batch_size: number of chunks embedded and committed per batch
+        :param uploads: source -> SHA-256 of the uploaded files, recorded once indexed so
+            exact re-uploads are rejected before parsing (read after the chunks are consumed)
+        :return: index counts -> num_added, num_updated, num_skipped, num_deleted
+        """
+        vector_store = self.get_vector_store()
+        sources = Counter()
+        domains = {}
+
+        def track_sources(chunks: Iterable[Document]) -> Iterator[Document]:
+            for chunk in chunks:
+                source = chunk.metadata.get("source")
+                sources[source] += 1
+                domains[source] = chunk.metadata.get("domain")
+                yield chunk
+
+        # vector store handles are shared across worker threads -> serialize writes,
+        # the store's file lock serializes them with the other uvicorn workers
+        with self._write_lock, vector_store.write_lock():
+            # chunks are written to the BM25 index together with the vector store
+            vdb = SparseIndexingVDB(
+                vdb=vector_store.get_vdb(), sparse_index=self.registry.sparse_index
+            )
+            # record manager bookkeeping, nested load / chunk / embed / write stages excluded
+            with stage("index"):
+                idx = index(
+                    docs_source=track_sources(docs),
+                    record_manager=self.get_record_manager(),
+                    vector_store=vdb,
+                    cleanup=cleanup,
+                    source_id_key="source",
+                    batch_size=batch_size,
+                )
+            for result in ("added", "updated", "skipped", "deleted"):
+                CHUNKS_TOTAL.inc(idx[f"num_{result}"], result=result)
+            if idx["num_added"] or idx["num_updated"] or idx["num_deleted"]:
+                with stage("persist"):
+                    vector_store.persist()
+                # invalidates cached retrieval results and stale handles in every worker
+                self.registry.bump_index_version(self.vectorstore)
+                self.registry.answer_cache.invalidate_sources(sources)
+            if uploads or cleanup == "full":
+                self.registry.file_hashes.record(
+                    [
+                        {
+                            "sha256": sha256,
+                            "source": source,
+                            "domain": domains[source],
+                            "num_chunks": sources[source],
+                        }
+                        for source, sha256 in (uploads or {}).items()
+                        if source in sources
+                    ],
+                    replace_all=cleanup == "full",
+                )
+        return idx
+
+    def get_sharded_store(self) -> ShardedVectorStore:
+        """
+        Returns the configured vector store for shard administration
+        :raises ValueError: if the configured vector store is not sharded
+        :return: ShardedVectorStore instance
+        """
+        vector_store = self.get_vector_store()
+        if not isinstance(vector_store, ShardedVectorStore):
+            raise ValueError(f"Vector store {self.vectorstore.name} is not sharded")
+        return vector_store
+
+    def compact_shard(self, name: str) -> int:
+        """
+        Compacts one shard, other shards are not touched
+        :param name: shard name
+        :return: number of vectors in the shard after compaction
+        """
+        vector_store = self.get_sharded_store()
+        with self._write_lock, vector_store.write_lock():
+            num_vectors = vector_store.compact_shard(name)
+            self.registry.bump_index_version(self.vectorstore)
+        return num_vectors
+
+    def drop_shard(self, name: str) -> int:
+        """
+        Drops one shard and forgets its chunks in the record manager,
+        so re-uploading one of its documents indexes it again
+        :param name: shard name
+        :return: number of dropped chunks
+        """
+        vector_store = self.get_sharded_store()
+        with self._write_lock, vector_store.write_lock():
+            records = vector_store.drop_shard(name)
+            self.get_record_manager().delete_keys(list(records))
+            if self.registry.sparse_index is not None:
+                self.registry.sparse_index.delete(records)
+            self.registry.bump_index_version(self.vectorstore)
+            # the shard placeholder document has no source
+            sources = [source for source in records.values() if source]
+            self.registry.answer_cache.invalidate_sources(sources)
+            self.registry.file_hashes.forget(sources)
+        return len(sources)
 
     @staticmethod
-    def process_duplicate_doc(idx: index, docs: List[Document]) -> (bool, str):
+    def process_duplicate_doc(idx: index) -> (bool, str):
         """
         Custom logic to check if the document is a duplicate
         :param idx: The index object
-        :param docs: List of documents
         :return: (Boolean indicating if the document is a duplicate, Document Upload Response)
         """
 
-        if idx["num_skipped"] == len(docs):
+        if not (idx["num_added"] or idx["num_updated"] or idx["num_deleted"]):
             return (True, "Document already uploaded")
         return (False, "PDF Uploaded and Processed Sucessfully")
 
@@ -109,3 +427,88 @@ def convert_docs_to_text(docs: List[Document]):
         f"Source: {doc.metadata.get('source', 'Unknown')}\n{doc.page_content}"
         for doc in docs
     )
+
+
+def build_context(
+    docs: List[Document],
+    token_budget: int = CONTEXT_TOKEN_BUDGET,
+    chars_per_token: float = CONTEXT_CHARS_PER_TOKEN,
+) -> (Dict[int, Dict[str, Any]], str):
+    """
+    Pack ranked documents into the prompt within a token budget, one compact numbered
+    entry per document -> "[1] file.pdf p.3: content"
+    Documents that do not fit are skipped, only the first one is truncated instead
+    -> the numbers of the packed documents map back to their metadata to resolve citations
+
+    :param docs: documents, most relevant first
+    :param token_budget: maximum estimated tokens of the documents section
+    :param chars_per_token: characters per token of the estimate
+    :return: (parsed documents by id, numbered documents text)
+    """
+    remaining = int(token_budget * chars_per_token)
+    parsed_docs = {}
+    entries = []
+    for doc in docs:
+        doc_id = len(parsed_docs) + 1
+        header = f"[{doc_id}] {os.path.basename(str(doc.metadata.get('source', 'Unknown')))}"
+        if doc.metadata.get("page") is not None:
+            header += f" p.{doc.metadata['page']}"
+        entry = f"{header}: {' '.join(doc.page_content.split())}"
+        if len(entry) + 1 > remaining:
+            if entries:
+                continue
+            entry = entry[: max(remaining - 1, 0)]
+        parsed_docs[doc_id] = {"content": doc.page_content, "metadata": doc.metadata}
+        entries.append(entry)
+        remaining -= len(entry) + 1
+    return parsed_docs, "\n".join(entries)
+
+
+def resolve_citations(
+    chat_response: ChatResponse, parsed_docs: Dict[int, Dict[str, Any]]
+) -> List[Dict[str, str]]:
+    """
+    Map the document ids cited by the LLM back to unique source / domain citations
+
+    :param chat_response:
+    :param parsed_docs:
+    :return: List of {"source", "domain"}
+    """
+    citations = {}
+
+    for doc_id in chat_response.doc_ids:
+        if doc_id not in parsed_docs:
+            raise ValueError("Invalid Response of Unique ID")
+
+        parsed_doc = parsed_docs[doc_id]
+        # the placeholder document seeding a new vector store carries no metadata
+        source = parsed_doc["metadata"].get("source", "Unknown")
+        domain = parsed_doc["metadata"].get("domain", "Unknown")
+
+        if source not in citations:
+            citations[source] = domain
+
+    return [
+        {"source": citation, "domain": citations[citation]} for citation in citations
+    ]
+
+
+def extract_partial_response(buffer: str) -> str:
+    """
+    Extract the `response` field from a partially generated ChatResponse JSON
+    -> lets the answer text be streamed before the JSON is complete
+
+    :param buffer: LLM output generated so far
+    :return: response text generated so far
+    """
+    text = buffer.strip()
+    if text.startswith("```"):
+        text = text.split("\n", 1)[1] if "\n" in text else ""
+    text = text.rstrip("`")
+    try:
+        parsed = parse_partial_json(text)
+    except Exception:
+        return ""
+    if isinstance(parsed, dict) and isinstance(parsed.get("response"), str):
+        return parsed["response"]
+    return ""
@@ -0,0 +1,546 @@
+import asyncio
+import json
+import os
+import socket
+import sqlite3
+import time
+import uuid
+from enum import Enum
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from langchain_core.documents import Document
+
+from utils.file_hashes import file_sha256
+from utils.loggers import logger
+from utils.metrics import stage
+
+
+class JobStatus(str, Enum):
+    """Lifecycle of a background ingestion job"""
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
+class JobStage(str, Enum):
+    """Pipeline stage a background ingestion job is currently in"""
+
+    QUEUED = "queued"
+    LOADING = "loading"
+    INDEXING = "indexing"
+    DONE = "done"
+
+
+class JobLeaseLost(Exception):
+    """The job was reclaimed by another worker, this worker must stop processing it"""
+
+
+def _process_alive(pid: str) -> bool:
+    """
+    :param pid: process id of a job owner on this host
+    :return: whether that process still runs; this process owns no job before it claims one
+    """
+    if not pid.isdigit() or int(pid) == os.getpid():
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class IngestJobStore:
+    """
+    SQLite persisted queue of ingestion jobs.
+    Lives next to the record manager database so queued and interrupted jobs survive restarts.
+    Every claim hands out a new lease token; heartbeats and updates made with an older
+    token are refused, so a worker whose job was reclaimed cannot also complete it.
+    """
+
+    def __init__(self, db_path: str):
+        """
+        :param db_path: Path of the SQLite file holding the job table
+        """
+        self.db_path = db_path
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        connection.row_factory = sqlite3.Row
+        return connection
+
+    def create_schema(self) -> None:
+        """
+        Create the job table if it does not exist yet.
+        :return: None
+        """
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        with self._connect() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS ingest_jobs (
+                    id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    stage TEXT NOT NULL,
+                    file_path TEXT NOT NULL,
+                    filename TEXT NOT NULL,
+                    domain TEXT,
+                    pages_processed INTEGER NOT NULL DEFAULT 0,
+                    chunks_processed INTEGER NOT NULL DEFAULT 0,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    lease TEXT,
+                    owner TEXT,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    updated_at REAL NOT NULL,
+                    finished_at REAL
+                )
+                """
+            )
+            columns = {
+                row["name"]
+                for row in connection.execute("PRAGMA table_info(ingest_jobs)")
+            }
+            if "lease" not in columns:
+                # job tables created before leases were introduced
+                connection.execute("ALTER TABLE ingest_jobs ADD COLUMN lease TEXT")
+            if "owner" not in columns:
+                connection.execute("ALTER TABLE ingest_jobs ADD COLUMN owner TEXT")
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS ix_ingest_jobs_status "
+                "ON ingest_jobs (status, created_at)"
+            )
+
+    def enqueue(self, file_path: str, filename: str, domain: Optional[str]) -> str:
+        """
+        Add a job for an already spooled PDF file.
+        :return: id of the new job
+        """
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._connect() as connection:
+            connection.execute(
+                "INSERT INTO ingest_jobs (id, status, stage, file_path, filename, domain, "
+                "created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    job_id,
+                    JobStatus.QUEUED.value,
+                    JobStage.QUEUED.value,
+                    file_path,
+                    filename,
+                    domain,
+                    now,
+                    now,
+                ),
+            )
+        return job_id
+
+    def count(self, status: JobStatus) -> int:
+        """
+        :return: number of jobs in the given status
+        """
+        with self._connect() as connection:
+            row = connection.execute(
+                "SELECT COUNT(*) FROM ingest_jobs WHERE status = ?", (status.value,)
+            ).fetchone()
+        return row[0]
+
+    def claim(
+        self,
+        stale_after: float,
+        max_attempts: Optional[int] = None,
+        owner: Optional[str] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Atomically claim the oldest runnable job under a new lease.
+        Running jobs without a heartbeat for `stale_after` seconds belong to a dead
+        worker and are claimed again, which is how interrupted jobs resume after a restart.
+        :param stale_after: seconds after which a running job is considered abandoned
+        :param max_attempts: abandoned jobs claimed that often already are left to
+            fail_exhausted, None retries them forever
+        :param owner: "<host>:<pid>" of the claiming process, see release_orphans
+        :return: claimed job row with its `lease` token, or None when the queue is empty
+        """
+        now = time.time()
+        lease = uuid.uuid4().hex
+        connection = self._connect()
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            row = connection.execute(
+                "SELECT * FROM ingest_jobs WHERE status = ? "
+                "OR (status = ? AND updated_at < ? AND attempts < ?) "
+                "ORDER BY created_at LIMIT 1",
+                (
+                    JobStatus.QUEUED.value,
+                    JobStatus.RUNNING.value,
+                    now - stale_after,
+                    max_attempts if max_attempts is not None else 2**62,
+                ),
+            ).fetchone()
+            if row is None:
+                connection.execute("COMMIT")
+                return None
+            connection.execute(
+                "UPDATE ingest_jobs SET status = ?, attempts = attempts + 1, lease = ?, "
+                "owner = ?, started_at = COALESCE(started_at, ?), updated_at = ? WHERE id = ?",
+                (JobStatus.RUNNING.value, lease, owner, now, now, row["id"]),
+            )
+            connection.execute("COMMIT")
+            return {**dict(row), "lease": lease, "owner": owner}
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        finally:
+            connection.close()
+
+    def release_orphans(self, host: str) -> int:
+        """
+        Requeue the running jobs claimed on this host by processes that are gone, e.g. the
+        workers of the previous run after a restart, instead of letting them wait for
+        `stale_after`. Jobs of other hosts are still reclaimed once stale.
+        :param host: host name of this machine
+        :return: number of requeued jobs
+        """
+        prefix = f"{host}:"
+        with self._connect() as connection:
+            rows = connection.execute(
+                "SELECT id, owner FROM ingest_jobs WHERE status = ? "
+                "AND substr(owner, 1, ?) = ?",
+                (JobStatus.RUNNING.value, len(prefix), prefix),
+            ).fetchall()
+            orphans = [
+                (JobStatus.QUEUED.value, time.time(), row["id"], row["owner"])
+                for row in rows
+                if not _process_alive(row["owner"][len(prefix) :])
+            ]
+            # the owner condition skips jobs claimed again in the meantime
+            connection.executemany(
+                "UPDATE ingest_jobs SET status = ?, lease = NULL, owner = NULL, "
+                "updated_at = ? WHERE id = ? AND owner = ?",
+                orphans,
+            )
+        return len(orphans)
+
+    def fail_exhausted(self, stale_after: float, max_attempts: int) -> List[Dict[str, Any]]:
+        """
+        Fail abandoned jobs that were claimed `max_attempts` times already, e.g. PDFs
+        crashing every worker that parses them, instead of reclaiming them forever.
+        :param stale_after: seconds after which a running job is considered abandoned
+        :param max_attempts: number of claims after which an abandoned job fails
+        :return: the failed job rows, whose spool files the caller removes
+        """
+        now = time.time()
+        connection = self._connect()
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            rows = connection.execute(
+                "SELECT * FROM ingest_jobs WHERE status = ? AND updated_at < ? "
+                "AND attempts >= ?",
+                (JobStatus.RUNNING.value, now - stale_after, max_attempts),
+            ).fetchall()
+            connection.executemany(
+                "UPDATE ingest_jobs SET status = ?, error = ?, lease = NULL, "
+                "updated_at = ?, finished_at = ? WHERE id = ?",
+                [
+                    (
+                        JobStatus.FAILED.value,
+                        f"Abandoned after {row['attempts']} attempts",
+                        now,
+                        now,
+                        row["id"],
+                    )
+                    for row in rows
+                ],
+            )
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        finally:
+            connection.close()
+        return [dict(row) for row in rows]
+
+    def update(self, job_id: str, lease: Optional[str] = None, **fields) -> bool:
+        """
+        Update job columns and refresh its heartbeat.
+        :param job_id: id of the job
+        :param lease: lease token of the claim, the update is refused once the job was
+            claimed again; None updates unconditionally
+        :param fields: column values, enums and dict results are serialized
+        :return: False if the lease was lost and nothing was updated
+        """
+        fields["updated_at"] = time.time()
+        values = []
+        for value in fields.values():
+            if isinstance(value, Enum):
+                value = value.value
+            elif isinstance(value, dict):
+                value = json.dumps(value)
+            values.append(value)
+        assignments = ", ".join(f"{column} = ?" for column in fields)
+        query = f"UPDATE ingest_jobs SET {assignments} WHERE id = ?"
+        params = [*values, job_id]
+        if lease is not None:
+            query += " AND lease = ?"
+            params.append(lease)
+        with self._connect() as connection:
+            return connection.execute(query, params).rowcount > 0
+
+    def heartbeat(self, job_id: str, lease: str) -> bool:
+        """
+        Keep a running job from being reclaimed as stale.
+        :return: False if the job was claimed by another worker in the meantime
+        """
+        return self.update(job_id, lease=lease)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        :return: job row with decoded result, or None if the job does not exist
+        """
+        with self._connect() as connection:
+            row = connection.execute(
+                "SELECT * FROM ingest_jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+
+class IngestJobRunner:
+    """
+    Local pool of asyncio consumers processing queued ingestion jobs.
+    Each consumer claims a job, loads and chunks it in the process pool and indexes it
+    in the thread pool, reporting stage and progress to the job store as it goes.
+    A heartbeat task refreshes the claim for the whole job, including long parses.
+    """
+
+    def __init__(
+        self,
+        store: IngestJobStore,
+        chat,
+        workers,
+        concurrency: int,
+        poll_interval: float = 1.0,
+        stale_after: float = 600.0,
+        streaming: bool = True,
+        heartbeat_interval: Optional[float] = None,
+        max_attempts: int = 3,
+    ):
+        """
+        :param store: persisted job queue
+        :param chat: ChatService used for processing and indexing
+        :param workers: WorkerPool running the blocking stages
+        :param concurrency: number of jobs processed at the same time
+        :param poll_interval: seconds to sleep when the queue is empty
+        :param stale_after: heartbeat timeout after which a running job is reclaimed
+        :param streaming: stream the chunks of page ranges parsed in the process pool into
+            the index instead of loading the whole document first
+        :param heartbeat_interval: seconds between heartbeats of a running job,
+            defaults to a quarter of `stale_after`
+        :param max_attempts: number of claims after which an abandoned job is failed
+        """
+        self.store = store
+        self.chat = chat
+        self.workers = workers
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after
+        self.streaming = streaming
+        self.heartbeat_interval = heartbeat_interval or stale_after / 4
+        self.max_attempts = max_attempts
+        self.host = socket.gethostname()
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self) -> None:
+        """
+        Start the consumer tasks on the running event loop.
+        :return: None
+        """
+        await self.workers.run_io(self.store.create_schema)
+        released = await self.workers.run_io(self.store.release_orphans, self.host)
+        if released:
+            logger.info(f"Requeued {released} ingest jobs interrupted by a restart")
+        self._tasks = [
+            asyncio.create_task(self._consume()) for _ in range(self.concurrency)
+        ]
+        logger.info(f"Ingest job runner started with {self.concurrency} consumers")
+
+    async def stop(self) -> None:
+        """
+        Cancel the consumers. Interrupted jobs stay `running` and are reclaimed later.
+        :return: None
+        """
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _claim(self) -> Optional[Dict[str, Any]]:
+        """
+        Fail the jobs abandoned too often, then claim the next job
+        :return: claimed job, or None when the queue is empty
+        """
+        exhausted = await self.workers.run_io(
+            self.store.fail_exhausted, self.stale_after, self.max_attempts
+        )
+        for job in exhausted:
+            logger.error(
+                f"Ingest job {job['id']} failed, abandoned after {job['attempts']} attempts"
+            )
+            self._remove_spool_file(job)
+        return await self.workers.run_io(
+            self.store.claim,
+            self.stale_after,
+            self.max_attempts,
+            owner=f"{self.host}:{os.getpid()}",
+        )
+
+    async def _consume(self) -> None:
+        while True:
+            try:
+                job = await self._claim()
+                if job is not None:
+                    await self._process(job)
+                    continue
+            except Exception as e:
+                # e.g. a busy database, a job left running is reclaimed once stale
+                logger.error(f"Ingest job consumer error: {str(e)}")
+            await asyncio.sleep(self.poll_interval)
+
+    async def _heartbeat(self, job: Dict[str, Any]) -> None:
+        """
+        Refresh the claim of a job until cancelled or until the lease is lost
+        """
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            alive = await self.workers.run_io(
+                self.store.heartbeat, job["id"], job["lease"]
+            )
+            if not alive:
+                logger.warning(f"Ingest job {job['id']} was reclaimed by another worker")
+                return
+
+    def _update(self, job: Dict[str, Any], **fields) -> None:
+        """
+        Update a job under its lease.
+        :raises JobLeaseLost: if the job was claimed by another worker
+        """
+        if not self.store.update(job["id"], lease=job["lease"], **fields):
+            raise JobLeaseLost(job["id"])
+
+    def _track_progress(
+        self, job: Dict[str, Any], docs: Iterable[Document], every: int = 100
+    ) -> Iterator[Document]:
+        """
+        Pass chunks through to index() while recording how many chunks and pages were handed over.
+        Raising JobLeaseLost aborts index() once the job was reclaimed.
+        :return: the same chunks
+        """
+        count = 0
+        pages = set()
+        for doc in docs:
+            yield doc
+            count += 1
+            pages.add(doc.metadata.get("page"))
+            if count % every == 0:
+                self._update(job, chunks_processed=count, pages_processed=len(pages))
+        self._update(job, chunks_processed=count, pages_processed=len(pages))
+
+    async def _index(self, job: Dict[str, Any], source: str, sha256: str) -> Dict[str, int]:
+        """
+        Load, chunk and index the spooled file of a job
+        :return: index counts -> num_added, num_updated, num_skipped, num_deleted
+        """
+        if self.streaming:
+            self._update(job, stage=JobStage.INDEXING)
+            # re-running a resumed job is safe: the record manager skips committed chunks
+            return await self.chat.index_pdf(
+                self.workers,
+                doc_path=job["file_path"],
+                domain=job["domain"],
+                source=source,
+                uploads={source: sha256},
+                progress=lambda docs: self._track_progress(job, docs),
+            )
+
+        self._update(job, stage=JobStage.LOADING)
+        with stage("load_chunk"):
+            docs = await self.workers.run_cpu(
+                self.chat.process_pdfs,
+                doc_path=job["file_path"],
+                source=source,
+                loader=self.chat.loader,
+                chunker=self.chat.chunker,
+            )
+        for doc in docs:
+            doc.metadata["domain"] = job["domain"]
+        self._update(job, stage=JobStage.INDEXING)
+        return await self.workers.run_io(
+            self.chat.index_docs,
+            docs=self._track_progress(job, docs),
+            uploads={source: sha256},
+        )
+
+    async def _process(self, job: Dict[str, Any]) -> None:
+        job_id = job["id"]
+        logger.info(f"Processing ingest job {job_id} (attempt {job['attempts'] + 1})")
+        heartbeat = asyncio.create_task(self._heartbeat(job))
+        try:
+            source = self.chat.upload_source(job["filename"], job["domain"])
+            sha256 = await self.workers.run_io(file_sha256, job["file_path"])
+            known = await self.workers.run_io(
+                self.chat.find_upload, sha256, source, job["domain"]
+            )
+            if known:
+                # exact re-upload: every chunk is indexed already, nothing is parsed
+                idx = {
+                    "num_added": 0,
+                    "num_updated": 0,
+                    "num_skipped": known["num_chunks"],
+                    "num_deleted": 0,
+                }
+            else:
+                idx = await self._index(job, source=source, sha256=sha256)
+            _, message = self.chat.process_duplicate_doc(idx)
+            self._update(
+                job,
+                status=JobStatus.SUCCEEDED,
+                stage=JobStage.DONE,
+                result={"message": message, **idx},
+                finished_at=time.time(),
+            )
+            logger.info(f"Ingest job {job_id} finished")
+        except asyncio.CancelledError:
+            raise
+        except JobLeaseLost:
+            # the worker holding the new lease completes the job and owns its spool file
+            logger.warning(f"Ingest job {job_id} abandoned, it was claimed again")
+            return
+        except Exception as e:
+            logger.error(f"Ingest job {job_id} failed: {str(e)}")
+            if self.store.update(
+                job_id,
+                lease=job["lease"],
+                status=JobStatus.FAILED,
+                error=str(e),
+                finished_at=time.time(),
+            ):
+                self._remove_spool_file(job)
+        else:
+            self._remove_spool_file(job)
+        finally:
+            heartbeat.cancel()
+
+    @staticmethod
+    def _remove_spool_file(job: Dict[str, Any]) -> None:
+        # finished jobs are never claimed again, their spool file is not needed anymore
+        if os.path.exists(job["file_path"]):
+            os.remove(job["file_path"])
@@ -1,3 +1,26 @@
 import logging
+import os
+from contextvars import ContextVar
+
+# trace id of the request being served, "-" outside of requests
+trace_id: ContextVar[str] = ContextVar("trace_id", default="-")
+
+
+class TraceIdFilter(logging.Filter):
+    """Adds the current request's trace id to every log record."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.trace_id = trace_id.get()
+        return True
+
 
 logger = logging.getLogger(__name__)
+logger.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+logger.addFilter(TraceIdFilter())
+
+_handler = logging.StreamHandler()
+_handler.setFormatter(
+    logging.Formatter("%(asctime)s %(levelname)s [trace=%(trace_id)s] %(message)s")
+)
+logger.addHandler(_handler)
+logger.propagate = False
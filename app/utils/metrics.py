@@ -0,0 +1,324 @@
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import LLMResult
+
+from utils.loggers import logger
+from utils.variables import CONTEXT_CHARS_PER_TOKEN
+
+# latency buckets in seconds, from sub-millisecond searches to minute-long ingests
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0
+)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter per label combination."""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} counter",
+        ]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labelnames, key)} {_number(value)}")
+        return lines
+
+
+class Gauge:
+    """Last set value per label combination."""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def set(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = value
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} gauge",
+        ]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labelnames, key)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    """Cumulative bucket histogram per label combination."""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        # label values -> (count per bucket, [sum])
+        self._values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            counts, total = self._values.setdefault(
+                key, ([0] * len(self.buckets), [0.0])
+            )
+            counts[bisect_left(self.buckets, value)] += 1
+            total[0] += value
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} histogram",
+        ]
+        with self._lock:
+            for key, (counts, total) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    labels = _labels(self.labelnames, key, f'le="{_number(bound)}"')
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _labels(self.labelnames, key)
+                lines.append(f"{self.name}_sum{labels} {_number(total[0])}")
+                lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Process-local metrics rendered in the Prometheus text exposition format.
+    Collectors add gauges / counters read at scrape time, e.g. the cache statistics.
+    """
+
+    def __init__(self):
+        self._metrics: List = []
+        self._collectors: List[Callable[[], Iterable[str]]] = []
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        metric = Gauge(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable[[], Iterable[str]]) -> None:
+        """
+        :param collector: returns exposition lines, called on every render
+        """
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            lines.extend(collector())
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+REQUEST_SECONDS = metrics.histogram(
+    "chatpdf_request_duration_seconds",
+    "HTTP request latency by route and status code",
+    ["route", "method", "status"],
+)
+STAGE_SECONDS = metrics.histogram(
+    "chatpdf_stage_duration_seconds",
+    "Time spent in a pipeline stage itself, nested stages excluded",
+    ["stage"],
+)
+CHUNKS_TOTAL = metrics.counter(
+    "chatpdf_chunks_total",
+    "Ingested chunks by index result (added, updated, skipped, deleted)",
+    ["result"],
+)
+LLM_TOKENS_TOTAL = metrics.counter(
+    "chatpdf_llm_tokens_total",
+    "LLM tokens by direction, reported by the provider or estimated from characters",
+    ["direction"],
+)
+STARTUP_SECONDS = metrics.gauge(
+    "chatpdf_startup_seconds",
+    "Cold start cost of this worker: application import and each warm-up phase",
+    ["phase"],
+)
+
+
+### Timing spans ###
+
+_active_span: ContextVar[Optional["Span"]] = ContextVar("active_span", default=None)
+_span_lock = threading.Lock()
+
+
+class Span:
+    """
+    Times one pipeline stage. Spans nest through a context variable, which asyncio tasks
+    and asyncio.to_thread inherit: the time of nested spans is subtracted from their
+    parent, so the stages of one request add up to its latency instead of overlapping.
+    """
+
+    def __init__(self, stage: str, observe: bool = True):
+        """
+        :param stage: stage label of the chatpdf_stage_duration_seconds histogram
+        :param observe: record the span in the histogram when it ends
+        """
+        self.stage = stage
+        self.observe = observe
+        self.seconds = 0.0
+        self._child_seconds = 0.0
+
+    def __enter__(self) -> "Span":
+        self._parent = _active_span.get()
+        self._token = _active_span.set(self)
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        elapsed = time.perf_counter() - self._start
+        _active_span.reset(self._token)
+        if self._parent is not None:
+            with _span_lock:
+                self._parent._child_seconds += elapsed
+        # concurrent children may overlap, the exclusive time never goes below zero
+        self.seconds = max(elapsed - self._child_seconds, 0.0)
+        if self.observe:
+            STAGE_SECONDS.observe(self.seconds, stage=self.stage)
+            logger.debug(f"Stage {self.stage} took {self.seconds * 1000:.1f} ms")
+
+
+def stage(name: str) -> Span:
+    """
+    with stage("retrieve"): ...
+    :param name: pipeline stage, e.g. load, chunk, embed, index, retrieve, rerank, generate
+    :return: Span recording its exclusive time on exit
+    """
+    return Span(name)
+
+
+def timed_iter(iterable: Iterable, name: str) -> Iterator:
+    """
+    Attribute the time spent producing the items of a lazy iterable (e.g. PDF pages
+    loaded on demand) to one stage, recorded once when the iteration ends
+    :param iterable: iterable whose production time is measured
+    :param name: pipeline stage
+    :return: iterator over the same items
+    """
+    iterator, seconds = iter(iterable), 0.0
+    try:
+        while True:
+            with Span(name, observe=False) as span:
+                item = next(iterator, _DONE)
+            seconds += span.seconds
+            if item is _DONE:
+                return
+            yield item
+    finally:
+        STAGE_SECONDS.observe(seconds, stage=name)
+
+
+_DONE = object()
+
+
+class LLMMetricsCallback(BaseCallbackHandler):
+    """
+    Counts LLM tokens of every call, from the provider's usage metadata when it
+    reports one, otherwise estimated at `chars_per_token` characters per token.
+    """
+
+    def __init__(self, chars_per_token: float = CONTEXT_CHARS_PER_TOKEN):
+        self.chars_per_token = chars_per_token
+        self._input_chars: Dict[UUID, int] = {}
+
+    def on_chat_model_start(
+        self, serialized: Dict[str, Any], messages: List[List[BaseMessage]], *, run_id: UUID, **kwargs: Any
+    ) -> None:
+        self._input_chars[run_id] = sum(
+            len(str(message.content)) for batch in messages for message in batch
+        )
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        input_chars = self._input_chars.pop(run_id, 0)
+        input_tokens = output_tokens = 0
+        output_chars = 0
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if usage:
+                    input_tokens += usage.get("input_tokens", 0)
+                    output_tokens += usage.get("output_tokens", 0)
+                else:
+                    output_chars += len(generation.text)
+        LLM_TOKENS_TOTAL.inc(
+            input_tokens or round(input_chars / self.chars_per_token), direction="input"
+        )
+        LLM_TOKENS_TOTAL.inc(
+            output_tokens or round(output_chars / self.chars_per_token), direction="output"
+        )
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._input_chars.pop(run_id, None)
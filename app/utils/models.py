@@ -1,6 +1,24 @@
 from typing import List, Optional
 from pydantic import BaseModel, field_validator, Field
 
+############# Request models ##############
+
+
+class RetrievalFilter(BaseModel):
+    """
+    Pydantic Model for Metadata Filters pushed down into vector store retrieval
+
+    """
+
+    domain: Optional[str] = None
+    source: Optional[str] = None
+    page_start: Optional[int] = None
+    page_end: Optional[int] = None
+
+    def is_empty(self) -> bool:
+        return all(value is None for value in self.model_dump().values())
+
+
 ############# Response models ##############
 
 
@@ -11,6 +29,79 @@ class PDFUploadResponse(BaseModel):
     """
 
     message: str
+    num_added: int = 0
+    num_updated: int = 0
+    num_skipped: int = 0
+    num_deleted: int = 0
+
+
+class BulkFileResult(BaseModel):
+    """
+    Pydantic Model for Validating the Result of one File of a Bulk Upload
+
+    """
+
+    filename: str
+    domain: Optional[str] = None
+    sha256: str
+    status: str
+    num_chunks: int = 0
+    error: Optional[str] = None
+
+
+class BulkUploadResponse(BaseModel):
+    """
+    Pydantic Model for Validating Bulk PDF Upload Response
+
+    """
+
+    message: str
+    num_files: int = 0
+    num_added: int = 0
+    num_updated: int = 0
+    num_skipped: int = 0
+    num_deleted: int = 0
+    files: List[BulkFileResult] = []
+
+
+class IngestJobResponse(BaseModel):
+    """
+    Pydantic Model for Validating Background Ingestion Job Status
+
+    """
+
+    job_id: str
+    status: str
+    stage: str
+    filename: str
+    domain: Optional[str] = None
+    pages_processed: int = 0
+    chunks_processed: int = 0
+    attempts: int = 0
+    elapsed_seconds: float = 0.0
+    error: Optional[str] = None
+    result: Optional[PDFUploadResponse] = None
+
+
+class ShardInfo(BaseModel):
+    """
+    Pydantic Model for Validating Vector Store Shard Details
+
+    """
+
+    name: str
+    path: str
+    num_vectors: int
+
+
+class ShardDropResponse(BaseModel):
+    """
+    Pydantic Model for Validating Vector Store Shard Drop Response
+
+    """
+
+    name: str
+    num_deleted: int
 
 
 class LLMResponse(BaseModel):
@@ -1,5 +1,5 @@
 query_retriever_prompt = """You are an AI language model assistant. Your task is 
-    to generate 5 different versions of the given user 
+    to generate {num_queries} different versions of the given user 
     question to retrieve relevant documents from a vector  database. 
     By generating multiple perspectives on the user question, 
     your goal is to help the user overcome some of the limitations 
@@ -12,7 +12,7 @@ response_prompt_template = """
     For the given query:
     {query}
 
-    From the following documents:
+    From the following numbered documents, one per line as "[document ID] source page: content":
     {documents}
 
     Follow these strict rules:
@@ -0,0 +1,326 @@
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, List, Optional
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import BaseChatModel
+
+from services.embedding_cache import QueryLRUEmbeddings
+from services.rerankers import BaseReranker, PassthroughReranker
+from services.retrievers import FanOutRetriever
+from services.sparse_index import BM25Index, backfill
+from services.vectordbs import BaseVectorStore
+from utils.answer_cache import SemanticAnswerCache
+from utils.caches import IndexVersion, LRUCache
+from utils.enums import VectorStores
+from utils.file_hashes import FileHashStore
+from utils.loggers import logger
+from utils.metrics import STARTUP_SECONDS, LLMMetricsCallback
+from utils.variables import (
+    ANSWER_CACHE_DB_PATH,
+    ANSWER_CACHE_MAX_ENTRIES,
+    ANSWER_CACHE_THRESHOLD,
+    ANSWER_CACHE_TTL_SECONDS,
+    BM25_MAX_DF_RATIO,
+    BM25_MAX_POSTINGS,
+    BM25_MIN_DOCS_FOR_DF_CUTOFF,
+    FILE_HASH_DB_PATH,
+    HYBRID_RETRIEVAL,
+    NUM_QUERY_REPHRASINGS,
+    QUERY_CACHE_SIZE,
+    QUERY_CACHE_TTL_SECONDS,
+    RECORD_MANAGER_POOL_SIZE,
+    RETRIEVAL_CACHE_SIZE,
+    RETRIEVAL_CACHE_TTL_SECONDS,
+    RETRIEVAL_K,
+    RRF_K,
+    SPARSE_INDEX_DB_PATH,
+    SPARSE_WEIGHT,
+    SQL_MANAGER_NAMESPACE,
+    SQLITE_DB_URL,
+    VECTOR_DB_PATH,
+)
+
+# text of the dummy embedding and rerank run while warming up
+WARMUP_TEXT = "warm up"
+
+if TYPE_CHECKING:
+    # langchain.indexes pulls in langchain.chains, it is imported with the first record manager
+    from services.record_managers import PooledSQLRecordManager
+
+
+class ProviderRegistry:
+    """
+    Process-wide registry of warm provider handles.
+    Built once at application startup from the `settings` dict and shared by all requests,
+    so the embedding model is loaded once and each vector store is opened once per backend.
+    """
+
+    def __init__(
+        self,
+        settings: Dict,
+        vector_db_path: str = VECTOR_DB_PATH,
+        run_io: Optional[Callable[..., Awaitable[Any]]] = None,
+    ):
+        """
+        :param settings: application settings holding the LLM / EMBEDDINGS / VECTOR_STORE enums
+        :param vector_db_path: Path where the vector database is stored
+        :param run_io: runs blocking retrieval calls off the event loop, e.g. WorkerPool.run_io
+        """
+        self.settings = settings
+        self.vector_db_path = vector_db_path
+        self.run_io = run_io
+        self._llm: Optional[BaseChatModel] = None
+        self._embeddings: Optional[Embeddings] = None
+        self._reranker: Optional[BaseReranker] = None
+        self._record_manager: Optional["PooledSQLRecordManager"] = None
+        self._vector_stores: Dict[VectorStores, BaseVectorStore] = {}
+        self._loaded_versions: Dict[VectorStores, str] = {}
+        self._retrievers: Dict[VectorStores, FanOutRetriever] = {}
+        self._lock = threading.RLock()
+        self.warmup_seconds: Dict[str, float] = {}
+
+        self.query_cache = LRUCache(
+            max_size=QUERY_CACHE_SIZE, ttl_seconds=QUERY_CACHE_TTL_SECONDS
+        )
+        self.retrieval_cache = LRUCache(
+            max_size=RETRIEVAL_CACHE_SIZE, ttl_seconds=RETRIEVAL_CACHE_TTL_SECONDS
+        )
+        self.answer_cache = SemanticAnswerCache(
+            db_path=ANSWER_CACHE_DB_PATH,
+            threshold=ANSWER_CACHE_THRESHOLD,
+            max_entries=ANSWER_CACHE_MAX_ENTRIES,
+            ttl_seconds=ANSWER_CACHE_TTL_SECONDS,
+        )
+        self.file_hashes = FileHashStore(db_path=FILE_HASH_DB_PATH)
+        self.sparse_index: Optional[BM25Index] = (
+            BM25Index(
+                db_path=SPARSE_INDEX_DB_PATH,
+                max_df_ratio=BM25_MAX_DF_RATIO,
+                min_docs_for_df_cutoff=BM25_MIN_DOCS_FOR_DF_CUTOFF,
+                max_postings=BM25_MAX_POSTINGS,
+            )
+            if HYBRID_RETRIEVAL
+            else None
+        )
+        # kept next to (not inside) the vector store folder, whose emptiness marks a new store
+        self.index_version = IndexVersion(
+            path=f"{vector_db_path.rstrip('/')}.version"
+        )
+
+    def startup(self) -> None:
+        """
+        Warm-up phase run before the worker reports ready: load the configured embedding
+        model and run a dummy embedding through it, open the record manager and the
+        configured vector store, load the reranker and create the LLM client.
+        Chunks ingested before hybrid retrieval was enabled are added to the BM25 index.
+        The time of every phase is kept in `warmup_seconds`.
+        :return: None
+        """
+        logger.info("Warming up provider registry")
+        self._warm_up("embeddings", self.get_embeddings)
+        self._warm_up("embed", self._embed_dummy)
+        self._warm_up("record_manager", self.get_record_manager)
+        vector_store = self._warm_up("vector_store", self.get_vector_store)
+        if self.sparse_index is not None and not self.sparse_index.count():
+            if self._warm_up(
+                "sparse_backfill",
+                lambda: backfill(self.sparse_index, vector_store.iter_documents()),
+            ):
+                self.bump_index_version()
+        self._warm_up("reranker", self._rerank_dummy)
+        self._warm_up("llm", self.get_llm)
+        logger.info(
+            f"Provider registry warmed up in {sum(self.warmup_seconds.values()):.2f}s: "
+            + ", ".join(f"{phase} {seconds:.2f}s" for phase, seconds in self.warmup_seconds.items())
+        )
+
+    def _warm_up(self, phase: str, load: Callable[[], Any]) -> Any:
+        start = time.perf_counter()
+        result = load()
+        self.warmup_seconds[phase] = time.perf_counter() - start
+        STARTUP_SECONDS.set(self.warmup_seconds[phase], phase=phase)
+        return result
+
+    def _embed_dummy(self) -> None:
+        # bypass the query and disk caches, so the model itself runs once
+        embeddings = self.get_embeddings()
+        while isinstance(getattr(embeddings, "embeddings", None), Embeddings):
+            embeddings = embeddings.embeddings
+        embeddings.embed_documents([WARMUP_TEXT])
+
+    def _rerank_dummy(self) -> None:
+        self.get_reranker().rerank(WARMUP_TEXT, [Document(page_content=WARMUP_TEXT)])
+
+    def shutdown(self) -> None:
+        """
+        Release every handle held by the registry.
+        :return: None
+        """
+        with self._lock:
+            self._vector_stores.clear()
+            self._retrievers.clear()
+            self._embeddings = None
+            self._reranker = None
+            self._llm = None
+            if self._record_manager is not None:
+                self._record_manager.engine.dispose()
+                self._record_manager = None
+            self.query_cache.clear()
+            self.retrieval_cache.clear()
+
+    def get_llm(self) -> BaseChatModel:
+        """
+        :return: shared LLM client of the configured provider
+        """
+        with self._lock:
+            if self._llm is None:
+                self._llm = self.settings["LLM"].provider.get_llm()
+                self._llm.callbacks = [*(self._llm.callbacks or []), LLMMetricsCallback()]
+            return self._llm
+
+    def get_embeddings(self) -> Embeddings:
+        """
+        :return: shared embedding model of the configured provider, behind the query cache
+        """
+        with self._lock:
+            if self._embeddings is None:
+                self._embeddings = QueryLRUEmbeddings(
+                    embeddings=self.settings["EMBEDDINGS"].provider.get_embeddings(),
+                    cache=self.query_cache,
+                )
+            return self._embeddings
+
+    def get_record_manager(self) -> "PooledSQLRecordManager":
+        """
+        :return: shared record manager, its schema is created on first use
+        """
+        with self._lock:
+            if self._record_manager is None:
+                from services.record_managers import PooledSQLRecordManager
+
+                record_manager = PooledSQLRecordManager(
+                    namespace=SQL_MANAGER_NAMESPACE,
+                    db_url=SQLITE_DB_URL,
+                    pool_size=RECORD_MANAGER_POOL_SIZE,
+                )
+                record_manager.create_schema()
+                self._record_manager = record_manager
+            return self._record_manager
+
+    def get_reranker(self) -> BaseReranker:
+        """
+        :return: shared reranker of the configured provider, passthrough when none is configured
+        """
+        with self._lock:
+            if self._reranker is None:
+                provider = self.settings.get("RERANKER")
+                self._reranker = (
+                    provider.provider if provider else PassthroughReranker
+                ).get_reranker()
+            return self._reranker
+
+    def get_vector_store(
+        self, backend: Optional[VectorStores] = None
+    ) -> BaseVectorStore:
+        """
+        :param backend: vector store backend, defaults to settings["VECTOR_STORE"]
+        :return: shared vector store handle of that backend, re-opened when another
+            worker has published a newer index version
+        """
+        backend = backend or self.settings["VECTOR_STORE"]
+        version = self.index_version.current()
+        with self._lock:
+            if backend not in self._vector_stores:
+                self._vector_stores[backend] = backend.provider(
+                    embeddings=self.get_embeddings(),
+                    vector_db_path=self.vector_db_path,
+                )
+            elif self._loaded_versions.get(backend) != version:
+                self._vector_stores[backend].refresh()
+            self._loaded_versions[backend] = version
+            return self._vector_stores[backend]
+
+    def get_retriever(self, backend: Optional[VectorStores] = None) -> FanOutRetriever:
+        """
+        :param backend: vector store backend, defaults to settings["VECTOR_STORE"]
+        :return: shared multi-query fan-out retriever of the vector store
+        """
+        backend = backend or self.settings["VECTOR_STORE"]
+        with self._lock:
+            if backend not in self._retrievers:
+                self._retrievers[backend] = FanOutRetriever(
+                    llm=self.get_llm(),
+                    embeddings=self.get_embeddings(),
+                    vector_store=lambda: self.get_vector_store(backend),
+                    cache=self.retrieval_cache,
+                    index_version=self.index_version.current,
+                    num_queries=NUM_QUERY_REPHRASINGS,
+                    k=RETRIEVAL_K,
+                    rrf_k=RRF_K,
+                    sparse_index=self.sparse_index,
+                    sparse_weight=SPARSE_WEIGHT,
+                    run_io=self.run_io,
+                )
+            return self._retrievers[backend]
+
+    def stats(self) -> Dict:
+        """
+        :return: hit / miss counters of every cache held by the registry
+        """
+        stats = {
+            "index_version": self.index_version.current(),
+            "retrieval": self.retrieval_cache.stats(),
+            "answers": self.answer_cache.stats(),
+        }
+        stats.update(self.get_embeddings().stats())
+        return stats
+
+    def cache_metrics(self) -> List[str]:
+        """
+        :return: hit / miss counters of the registry caches in the Prometheus text format
+        """
+        caches = {
+            "query_embeddings": self.query_cache.stats(),
+            "retrieval": self.retrieval_cache.stats(),
+            "answers": self.answer_cache.stats(),
+        }
+        embeddings = self._embeddings
+        if embeddings is not None and "disk" in embeddings.stats():
+            caches["disk_embeddings"] = embeddings.stats()["disk"]
+        lines = []
+        for result in ("hits", "misses"):
+            name = f"chatpdf_cache_{result}_total"
+            lines += [f"# HELP {name} Cache {result} by cache", f"# TYPE {name} counter"]
+            lines += [
+                f'{name}{{cache="{cache}"}} {stats[result]}'
+                for cache, stats in caches.items()
+            ]
+        return lines
+
+    def bump_index_version(self, backend: Optional[VectorStores] = None) -> str:
+        """
+        Publish a new index version after this worker wrote to a backend.
+        Its own handle already holds the write, so only other workers re-open theirs.
+        :param backend: vector store backend, defaults to settings["VECTOR_STORE"]
+        :return: the new version
+        """
+        backend = backend or self.settings["VECTOR_STORE"]
+        with self._lock:
+            version = self.index_version.bump()
+            self._loaded_versions[backend] = version
+        return version
+
+    def refresh_vector_store(
+        self, backend: Optional[VectorStores] = None
+    ) -> BaseVectorStore:
+        """
+        Re-open the vector store handle of a backend after writes.
+        :param backend: vector store backend, defaults to settings["VECTOR_STORE"]
+        :return: refreshed vector store handle
+        """
+        vector_store = self.get_vector_store(backend)
+        with self._lock:
+            vector_store.refresh()
+        return vector_store
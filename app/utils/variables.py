@@ -10,4 +10,158 @@ GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 SQL_MANAGER_NAMESPACE = f"PDFChat"
 
 SQLITE_DB_URL = os.getenv("SQLITE_DB_URL", "sqlite:////data/sqlite/chatpdf_sqlmanager.sql")
-VECTOR_DB_PATH = os.getenv("VECTOR_DB_PATH", "/data/vector_store")
\ No newline at end of file
+# connections of the shared record manager engine
+RECORD_MANAGER_POOL_SIZE = int(os.getenv("RECORD_MANAGER_POOL_SIZE", "8"))
+VECTOR_DB_PATH = os.getenv("VECTOR_DB_PATH", "/data/vector_store")
+
+### Observability configurations ######
+
+# per-request trace ids, taken from TRACE_ID_HEADER when sent and tagged on every log line
+REQUEST_TRACING = os.getenv("REQUEST_TRACING", "true").lower() == "true"
+TRACE_ID_HEADER = os.getenv("TRACE_ID_HEADER", "X-Request-ID")
+
+### Embedding configurations ######
+
+EMBEDDING_MODEL_NAME = os.getenv(
+    "EMBEDDING_MODEL_NAME", "sentence-transformers/all-mpnet-base-v2"
+)
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+EMBEDDING_NORMALIZE = os.getenv("EMBEDDING_NORMALIZE", "false").lower() == "true"
+# empty value disables the on-disk embedding cache
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", "/data/embedding_cache")
+
+### Query caches ######
+
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "2048"))
+QUERY_CACHE_TTL_SECONDS = float(os.getenv("QUERY_CACHE_TTL_SECONDS", "3600"))
+RETRIEVAL_CACHE_SIZE = int(os.getenv("RETRIEVAL_CACHE_SIZE", "1024"))
+RETRIEVAL_CACHE_TTL_SECONDS = float(os.getenv("RETRIEVAL_CACHE_TTL_SECONDS", "600"))
+
+# langchain index() cleanup mode -> None | scoped_full | incremental | full
+# scoped_full deletes stale chunks of the ingested sources once the whole stream is written
+INDEX_CLEANUP_MODE = os.getenv("INDEX_CLEANUP_MODE", "scoped_full") or None
+# parse page ranges of PDF_SHARD_PAGES pages in the process pool and stream their chunks
+# into the vector store in micro-batches of INGEST_BATCH_SIZE chunks
+STREAMING_INGEST = os.getenv("STREAMING_INGEST", "true").lower() == "true"
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "64"))
+
+### Concurrency configurations ######
+
+INGEST_PROCESS_WORKERS = int(os.getenv("INGEST_PROCESS_WORKERS", "2"))
+IO_THREAD_WORKERS = int(os.getenv("IO_THREAD_WORKERS", "8"))
+MAX_PENDING_REQUESTS = int(os.getenv("MAX_PENDING_REQUESTS", "32"))
+
+### Background ingestion job configurations ######
+
+SQLITE_DB_DIR = os.path.dirname(SQLITE_DB_URL.replace("sqlite:///", "", 1))
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH", os.path.join(SQLITE_DB_DIR, "ingest_jobs.sql"))
+JOBS_SPOOL_DIR = os.getenv("JOBS_SPOOL_DIR", os.path.join(SQLITE_DB_DIR, "ingest_spool"))
+INGEST_JOB_WORKERS = int(os.getenv("INGEST_JOB_WORKERS", "2"))
+MAX_QUEUED_JOBS = int(os.getenv("MAX_QUEUED_JOBS", "1000"))
+JOB_STALE_SECONDS = float(os.getenv("JOB_STALE_SECONDS", "600"))
+# abandoned jobs, e.g. PDFs crashing the worker, fail after this many attempts
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+
+### Upload spooling configurations ######
+
+# uploads are streamed to unique spool files in chunks of this many bytes
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+UPLOAD_SPOOL_DIR = os.getenv("UPLOAD_SPOOL_DIR", os.path.join(SQLITE_DB_DIR, "upload_spool"))
+# content hash of the file indexed under each source, exact re-uploads are rejected before parsing
+FILE_HASH_DB_PATH = os.getenv(
+    "FILE_HASH_DB_PATH", os.path.join(SQLITE_DB_DIR, "file_hashes.sql")
+)
+
+### Bulk upload configurations ######
+
+BULK_SPOOL_DIR = os.getenv("BULK_SPOOL_DIR", os.path.join(SQLITE_DB_DIR, "bulk_spool"))
+# files of one bulk upload loaded and chunked at the same time
+BULK_INGEST_CONCURRENCY = int(os.getenv("BULK_INGEST_CONCURRENCY", "4"))
+# chunks embedded and committed per index() batch of a bulk upload
+BULK_INGEST_BATCH_SIZE = int(os.getenv("BULK_INGEST_BATCH_SIZE", "512"))
+BULK_MAX_FILES = int(os.getenv("BULK_MAX_FILES", "5000"))
+# total size of the PDFs extracted from the ZIP archives of one bulk upload
+BULK_MAX_UNCOMPRESSED_BYTES = int(
+    os.getenv("BULK_MAX_UNCOMPRESSED_BYTES", str(2 * 1024**3))
+)
+
+### PDF loader configurations ######
+
+PDF_LOADER_WORKERS = int(os.getenv("PDF_LOADER_WORKERS", "4"))
+PDF_SHARD_PAGES = int(os.getenv("PDF_SHARD_PAGES", "50"))
+PDF_SHARDING_MIN_PAGES = int(os.getenv("PDF_SHARDING_MIN_PAGES", "100"))
+
+### Retrieval configurations ######
+
+NUM_QUERY_REPHRASINGS = int(os.getenv("NUM_QUERY_REPHRASINGS", "5"))
+RETRIEVAL_K = int(os.getenv("RETRIEVAL_K", "4"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+# default of the chat endpoints' rephrase field, hybrid retrieval covers exact-term queries
+REPHRASE_QUERIES_DEFAULT = os.getenv("REPHRASE_QUERIES_DEFAULT", "false").lower() == "true"
+# BM25 inverted index searched next to the vector store
+HYBRID_RETRIEVAL = os.getenv("HYBRID_RETRIEVAL", "true").lower() == "true"
+SPARSE_INDEX_DB_PATH = os.getenv(
+    "SPARSE_INDEX_DB_PATH", os.path.join(SQLITE_DB_DIR, "bm25_index.sql")
+)
+SPARSE_WEIGHT = float(os.getenv("SPARSE_WEIGHT", "1.0"))
+# query terms in more than this fraction of the chunks are skipped, they barely rank
+BM25_MAX_DF_RATIO = float(os.getenv("BM25_MAX_DF_RATIO", "0.5"))
+# ... once the index holds this many chunks, smaller ones search every query term
+BM25_MIN_DOCS_FOR_DF_CUTOFF = int(os.getenv("BM25_MIN_DOCS_FOR_DF_CUTOFF", "1000"))
+# postings read per query term, highest term frequency first
+BM25_MAX_POSTINGS = int(os.getenv("BM25_MAX_POSTINGS", "2000"))
+
+### Semantic answer cache ######
+
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+ANSWER_CACHE_DB_PATH = os.getenv(
+    "ANSWER_CACHE_DB_PATH", os.path.join(SQLITE_DB_DIR, "answer_cache.sql")
+)
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000"))
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "86400"))
+
+### Sharded vector store ######
+
+# shard key of the SHARDED_* vector stores -> domain | hash (of the source)
+VECTOR_SHARD_BY = os.getenv("VECTOR_SHARD_BY", "domain")
+VECTOR_SHARD_BUCKETS = int(os.getenv("VECTOR_SHARD_BUCKETS", "16"))
+SHARD_SEARCH_WORKERS = int(os.getenv("SHARD_SEARCH_WORKERS", "8"))
+
+### FAISS index configurations ######
+
+# faiss.index_factory description -> Flat | IVF<nlist>,Flat | IVF<nlist>,PQ<m> | HNSW<M>
+FAISS_INDEX_FACTORY = os.getenv("FAISS_INDEX_FACTORY", "Flat")
+# flat indexes are converted to FAISS_INDEX_FACTORY once they hold this many vectors
+FAISS_TRAIN_MIN_VECTORS = int(os.getenv("FAISS_TRAIN_MIN_VECTORS", "50000"))
+FAISS_TRAIN_SAMPLE_SIZE = int(os.getenv("FAISS_TRAIN_SAMPLE_SIZE", "100000"))
+FAISS_NPROBE = int(os.getenv("FAISS_NPROBE", "16"))
+FAISS_EF_SEARCH = int(os.getenv("FAISS_EF_SEARCH", "64"))
+# HNSW keeps deleted vectors as tombstones until they are this share of the index
+FAISS_MAX_TOMBSTONE_RATIO = float(os.getenv("FAISS_MAX_TOMBSTONE_RATIO", "0.2"))
+# search a memory-mapped, read-only handle of the current FAISS generation
+FAISS_MMAP_SERVING = os.getenv("FAISS_MMAP_SERVING", "true").lower() == "true"
+FAISS_KEEP_GENERATIONS = int(os.getenv("FAISS_KEEP_GENERATIONS", "2"))
+
+### Reranking and prompt context ######
+
+RERANK_MODEL_NAME = os.getenv("RERANK_MODEL_NAME", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "32"))
+RERANK_MAX_CANDIDATES = int(os.getenv("RERANK_MAX_CANDIDATES", "50"))
+# maximum size of the documents section of the response prompt
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+# token estimate used by the context builder, ~4 characters per token for English text
+CONTEXT_CHARS_PER_TOKEN = float(os.getenv("CONTEXT_CHARS_PER_TOKEN", "4"))
+
+### Chunker configurations ######
+
+# TokenChunker -> chunk size / overlap in tokens of the embedding model
+CHUNK_SIZE_TOKENS = int(os.getenv("CHUNK_SIZE_TOKENS", "256"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "32"))
+# SentenceChunker / SemanticChunker -> maximum chunk size in characters
+CHUNK_MAX_CHARS = int(os.getenv("CHUNK_MAX_CHARS", "1000"))
+CHUNK_EMBEDDING_MODEL_NAME = os.getenv(
+    "CHUNK_EMBEDDING_MODEL_NAME", "sentence-transformers/all-MiniLM-L6-v2"
+)
+# SemanticChunker breaks where the neighbour distance is above this percentile
+SEMANTIC_BREAKPOINT_PERCENTILE = float(os.getenv("SEMANTIC_BREAKPOINT_PERCENTILE", "90"))
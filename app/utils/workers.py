@@ -0,0 +1,141 @@
+import asyncio
+import contextvars
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
+from importlib import import_module
+from typing import Any, Callable, Iterator, Optional
+
+from utils.loggers import logger
+
+
+def _import_modules(modules) -> None:
+    for module in modules:
+        import_module(module)
+
+
+def iter_queue(queue: asyncio.Queue, loop: asyncio.AbstractEventLoop) -> Iterator[Any]:
+    """
+    Consume an asyncio queue filled on the event loop from a worker thread,
+    e.g. hand parsed chunks over to an index() run in the thread pool.
+    :param queue: queue of items, None ends the iteration and exceptions are raised
+    :param loop: event loop the queue belongs to
+    :return: Iterator of the queued items
+    """
+    while True:
+        item = asyncio.run_coroutine_threadsafe(queue.get(), loop).result()
+        if item is None:
+            return
+        if isinstance(item, Exception):
+            raise item
+        yield item
+
+
+class QueueFullError(Exception):
+    """Raised when the worker pool has no free admission slot left."""
+
+
+class WorkerPool:
+    """
+    Keeps blocking work off the asyncio event loop.
+    CPU-bound ingest (PDF parsing, chunking) runs in a bounded process pool,
+    blocking I/O and native-extension work (embedding, vector store writes) in a thread pool.
+    Admission is bounded by `max_pending`, above which callers get a QueueFullError.
+    """
+
+    def __init__(self, process_workers: int, thread_workers: int, max_pending: int):
+        """
+        :param process_workers: size of the process pool for CPU-bound work
+        :param thread_workers: size of the thread pool for blocking I/O
+        :param max_pending: maximum number of admitted requests in flight
+        """
+        self.process_workers = process_workers
+        self.thread_workers = thread_workers
+        self.max_pending = max_pending
+        self._pending = 0
+        self._processes: Optional[ProcessPoolExecutor] = None
+        self._threads: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def startup(self) -> None:
+        """
+        Create the process and thread pools.
+        spawn is used so children never inherit torch / tokenizer threads from the parent.
+        :return: None
+        """
+        self._processes = ProcessPoolExecutor(
+            max_workers=self.process_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+        self._threads = ThreadPoolExecutor(
+            max_workers=self.thread_workers, thread_name_prefix="io-worker"
+        )
+        logger.info(
+            f"Worker pool started: {self.process_workers} processes, "
+            f"{self.thread_workers} threads, {self.max_pending} max pending"
+        )
+
+    async def warm_up(self, *modules: str) -> None:
+        """
+        Start every worker process and import `modules` in it, so the first CPU-bound task
+        pays neither the interpreter start nor the imports.
+        :param modules: modules of the callables later run in the process pool
+        :return: None
+        """
+        await asyncio.gather(
+            *(self.run_cpu(_import_modules, modules) for _ in range(self.process_workers))
+        )
+
+    def shutdown(self, wait: bool = False) -> None:
+        """
+        Stop both pools, dropping work that has not started yet.
+        :param wait: block until running work finished and the worker processes exited
+        :return: None
+        """
+        for executor in (self._processes, self._threads):
+            if executor is not None:
+                executor.shutdown(wait=wait, cancel_futures=True)
+        self._processes = None
+        self._threads = None
+
+    @asynccontextmanager
+    async def admit(self):
+        """
+        Reserve an admission slot for the duration of a request.
+        :raises QueueFullError: when `max_pending` requests are already in flight
+        """
+        if self._pending >= self.max_pending:
+            raise QueueFullError(
+                f"Server busy: {self._pending} requests already in flight"
+            )
+        self._pending += 1
+        try:
+            yield
+        finally:
+            self._pending -= 1
+
+    async def run_cpu(self, fn: Callable, *args, **kwargs) -> Any:
+        """
+        Run a picklable, CPU-bound callable in the process pool.
+        :return: result of fn(*args, **kwargs)
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._processes, partial(fn, *args, **kwargs)
+        )
+
+    async def run_io(self, fn: Callable, *args, **kwargs) -> Any:
+        """
+        Run a blocking callable in the thread pool, inside a copy of the caller's context
+        so trace ids and timing spans carry over.
+        :return: result of fn(*args, **kwargs)
+        """
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(
+            self._threads, partial(context.run, fn, *args, **kwargs)
+        )